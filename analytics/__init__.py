@@ -0,0 +1,6 @@
+"""
+Local analytics over extracted match data, without going through Azure SQL.
+
+Run from the repository root, e.g.:
+    python -m analytics.parquet_export OUTPUT_FILES... --output parquet/
+"""
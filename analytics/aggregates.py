@@ -0,0 +1,306 @@
+"""
+Player / manager / league aggregates in pandas, mirroring the dbt marts.
+
+    agg_player.sql   -> player_aggregates(frames)
+    agg_manager.sql  -> manager_aggregates(frames)
+    agg_League.sql   -> league_aggregates(frames)
+
+Frames come from extracted match files (frames_from_match_files) or from a
+parquet_export directory (frames_from_parquet). Each aggregate is a vectorised
+group-by over the flattened columns instead of row-by-row CASE expressions,
+so fresh numbers don't need a warehouse rebuild.
+
+Surrogate ids from the dim_* models don't exist here; rows are keyed by
+player / manager / team name instead, which is what cross_check joins on.
+
+Usage (from the repository root):
+    python -m analytics.aggregates SOURCES... [--output-dir DIR]
+        [--sql-url URL --sql-schema dbo]    # cross-check against the dbt tables
+"""
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from analytics.parquet_export import flatten_matches, iter_match_files, level_name
+
+# Same mapping as fact_player_match.sql. 'Did Not Play' maps to 'Sqaud' there
+# while agg_player.sql sums role = 'Squad', so the *_When_Squad columns are
+# always zero in the warehouse; kept as-is so the two can be cross-checked.
+PLAYER_MATCH_ROLES = {
+    "Played Full Game": "Starter",
+    "Played Subbed Off": "Starter",
+    "Played Subbed On": "Sub",
+    "Played Subbed On and Subbed Off": "Sub",
+    "Did Not Play": "Sqaud",
+}
+ROLES = (("Starter", "When_Started"), ("Sub", "When_Sub"), ("Squad", "When_Squad"))
+
+
+def frames_from_match_files(sources):
+    """{level: DataFrame} for the match files under `sources`."""
+    tables = flatten_matches(iter_match_files(sources))
+    return {level_name(table): pd.DataFrame(rows) for table, rows in tables.items()}
+
+
+def frames_from_parquet(parquet_dir, levels=("match", "team_line", "player_appearance")):
+    """{level: DataFrame} read back from a parquet_export directory."""
+    return {level: pd.read_parquet(os.path.join(parquet_dir, level)) for level in levels}
+
+
+def _split_league(league):
+    """dim_teams: country is the first word of the league, short name the rest."""
+    parts = league.fillna("").str.partition(" ")
+    country = parts[0].where(parts[0] != "")
+    short = parts[2].str.strip().where(parts[1] != "")
+    return country, short
+
+
+def _results(frames):
+    """match_results.sql: one row per match that wasn't postponed, home and away side by side."""
+    matches = frames["match"]
+    matches = matches[~matches["was_game_postponed"].astype(bool)]
+    lines = frames["team_line"]
+    home = lines[lines["playing_as"] == "home"].set_index(["file_name", "match_id"])
+    away = lines[lines["playing_as"] == "away"].set_index(["file_name", "match_id"])
+    results = matches.set_index(["file_name", "match_id"])[["league_name", "played_on"]]
+    results = results.join(home[["team_name", "manager", "score"]], how="left")
+    results = results.join(away[["team_name", "manager", "score"]], how="left", rsuffix="_away")
+    results.columns = [
+        "league_name", "played_on",
+        "home_team_name", "home_team_manager", "home_team_score",
+        "away_team_name", "away_team_manager", "away_team_score",
+    ]
+    # dim_match keys on the BBC id, so a match exported twice counts once
+    return results.reset_index().drop_duplicates("match_id", keep="last")
+
+
+def _team_leagues(results):
+    """dim_teams: (team_name, league_name, country_name, short_name)."""
+    teams = pd.concat([
+        results[["home_team_name", "league_name"]].set_axis(["team_name", "league_name"], axis=1),
+        results[["away_team_name", "league_name"]].set_axis(["team_name", "league_name"], axis=1),
+    ]).drop_duplicates()
+    teams["country_name"], teams["short_name"] = _split_league(teams["league_name"])
+    return teams
+
+
+def player_aggregates(frames):
+    """agg_player.sql, one row per (player, team)."""
+    players = frames["player_appearance"].copy()
+    players["YellowCards"] = players["yellow_cards"].fillna(0).astype(int)
+    players["RedCards"] = players["red_cards"].fillna(0).astype(int)
+    players["Goals"] = players["goals_count"].astype(int)
+    players["Assists"] = players["assists_count"].astype(int)
+    # CAST(minutes AS INTEGER) truncates
+    players["MinutesPlayed"] = np.trunc(players["minutes_played"].fillna(0)).astype(int)
+    role = players["player_status"].map(PLAYER_MATCH_ROLES).fillna("Unknow")
+    results = _results(frames)
+    # GAME_ID comes from dim_match, which only has matches that were played,
+    # so appearances in postponed matches add to the sums but not the counts
+    players["game_id"] = players["match_id"].where(players["match_id"].isin(results["match_id"]))
+
+    metrics = ["YellowCards", "RedCards", "Goals", "Assists", "MinutesPlayed"]
+    for role_name, suffix in ROLES:
+        in_role = (role == role_name).to_numpy()
+        for metric in metrics:
+            players[f"{metric}_{suffix}"] = np.where(in_role, players[metric], 0)
+    players["involved_match"] = players["game_id"].where(role.isin(["Starter", "Sub"]))
+    players["started_match"] = players["game_id"].where(role == "Starter")
+    players["sub_match"] = players["game_id"].where(role == "Sub")
+    players["squad_match"] = players["game_id"].where(role == "Squad")
+
+    keys = ["player_name", "team_name"]
+    grouped = players.groupby(keys, sort=False, dropna=False)
+    sums = grouped[metrics + [f"{m}_{s}" for _r, s in ROLES for m in metrics]].sum()
+    counts = grouped.agg(
+        Total_Squads_Made=("game_id", "nunique"),
+        Total_Match_Involvements=("involved_match", "nunique"),
+        Matches_Started=("started_match", "nunique"),
+        Matches_As_Sub=("sub_match", "nunique"),
+        Matches_As_Squad=("squad_match", "nunique"),
+    )
+    agg = sums.join(counts)
+    agg = agg.rename(columns={m: f"Total_{m}" for m in metrics})
+
+    minutes = agg["Total_MinutesPlayed"].replace(0, np.nan)
+    goals = agg["Total_Goals"].replace(0, np.nan)
+    agg["Goals_Per_90"] = agg["Total_Goals"] * 90.0 / minutes
+    agg["Assists_Per_90"] = agg["Total_Assists"] * 90.0 / minutes
+    agg["Goal_Contribution_Per_90"] = (agg["Total_Goals"] + agg["Total_Assists"]) * 90.0 / minutes
+    agg["Cards_Per_90"] = (agg["Total_YellowCards"] + agg["Total_RedCards"]) * 90.0 / minutes
+    agg["Pct_Goals_When_Started"] = agg["Goals_When_Started"] * 100.0 / goals
+    agg["Pct_Goals_When_Sub"] = agg["Goals_When_Sub"] * 100.0 / goals
+    agg["Pct_Goals_When_Squad"] = agg["Goals_When_Squad"] * 100.0 / goals
+
+    agg = agg.reset_index()
+    teams = _team_leagues(results)
+    return agg.merge(teams, on="team_name", how="left")
+
+
+def manager_aggregates(frames):
+    """agg_manager.sql, one row per (manager, team)."""
+    results = _results(frames)
+    home_score = results["home_team_score"].to_numpy(dtype=float)
+    away_score = results["away_team_score"].to_numpy(dtype=float)
+    outcome = np.select(
+        [home_score > away_score, home_score < away_score, home_score == away_score],
+        ["home win", "away win", "draw"],
+        "unknown",
+    )
+    home_result = pd.Series(outcome).map({"home win": "win", "away win": "loss", "draw": "draw"}).fillna("unknown")
+    away_result = pd.Series(outcome).map({"away win": "win", "home win": "loss", "draw": "draw"}).fillna("unknown")
+
+    def side(prefix, game_role, result):
+        return pd.DataFrame({
+            "manager_name": results[f"{prefix}_team_manager"].str.replace("Manager: ", "", regex=False).to_numpy(),
+            "team_name": results[f"{prefix}_team_name"].to_numpy(),
+            "game_role": game_role,
+            "result": result.to_numpy(),
+        })
+
+    games = pd.concat([side("home", "home", home_result), side("away", "away", away_result)], ignore_index=True)
+    for role in ("home", "away"):
+        games[f"{role}_games_played"] = (games["game_role"] == role).astype(int)
+    for outcome_name in ("win", "loss", "draw"):
+        is_outcome = games["result"] == outcome_name
+        games[f"total_{outcome_name}"] = is_outcome.astype(int)
+        for role in ("home", "away"):
+            games[f"{role}_{outcome_name}"] = (is_outcome & (games["game_role"] == role)).astype(int)
+
+    grouped = games.groupby(["manager_name", "team_name"], sort=False, dropna=False)
+    agg = grouped.sum(numeric_only=True)
+    agg["total_games_played"] = grouped.size()
+
+    out = pd.DataFrame(index=agg.index)
+    out["total_games_played"] = agg["total_games_played"]
+    for outcome_name, label in (("win", "won"), ("loss", "lost"), ("draw", "drawn")):
+        out[f"games_{label}_pct"] = (agg[f"total_{outcome_name}"] * 100.0 / agg["total_games_played"]).round(2)
+    for role in ("home", "away"):
+        played = agg[f"{role}_games_played"]
+        out[f"{role}_games_played"] = played
+        for outcome_name, label in (("win", "won"), ("loss", "lost"), ("draw", "drawn")):
+            out[f"{role}_games_{label}_pct"] = (agg[f"{role}_{outcome_name}"] * 100.0 / played.replace(0, np.nan)).round(2)
+
+    out = out.reset_index()
+    return out.merge(_team_leagues(results), on="team_name", how="left")
+
+
+def league_aggregates(frames):
+    """agg_League.sql, one row per team."""
+    results = _results(frames)
+    home_score = results["home_team_score"].to_numpy(dtype=float)
+    away_score = results["away_team_score"].to_numpy(dtype=float)
+    home_points = np.select([home_score > away_score, home_score == away_score], [3, 1], 0)
+    away_points = np.select([home_score < away_score, home_score == away_score], [3, 1], 0)
+
+    games = pd.concat([
+        pd.DataFrame({"TEAM_NAME": results["home_team_name"].to_numpy(), "GameRole": 1,
+                      "scored": home_score, "conceeded": away_score, "Points": home_points}),
+        pd.DataFrame({"TEAM_NAME": results["away_team_name"].to_numpy(), "GameRole": 2,
+                      "scored": away_score, "conceeded": home_score, "Points": away_points}),
+    ], ignore_index=True)
+
+    columns = {"GamesPlayed": np.ones(len(games), dtype=int), "TotalPoints": games["Points"]}
+    columns["Wins"] = (games["Points"] == 3).astype(int)
+    columns["Losses"] = (games["Points"] == 0).astype(int)
+    columns["Draws"] = (games["Points"] == 1).astype(int)
+    columns["TotalScored"] = games["scored"]
+    columns["TotalConceded"] = games["conceeded"]
+    for role, prefix in ((1, "Home"), (2, "Away")):
+        in_role = (games["GameRole"] == role).to_numpy()
+        columns[f"{prefix}GamesPlayed"] = in_role.astype(int)
+        columns[f"{prefix}Wins"] = (in_role & (games["Points"] == 3)).astype(int)
+        columns[f"{prefix}Losses"] = (in_role & (games["Points"] == 0)).astype(int)
+        columns[f"{prefix}Draws"] = (in_role & (games["Points"] == 1)).astype(int)
+        columns[f"{prefix}Scored"] = np.where(in_role, games["scored"], 0)
+        columns[f"{prefix}Conceded"] = np.where(in_role, games["conceeded"], 0)
+        columns[f"{prefix}Points"] = np.where(in_role, games["Points"], 0)
+
+    agg = pd.DataFrame(columns).groupby(games["TEAM_NAME"], sort=False).sum().reset_index()
+    teams = _team_leagues(results).rename(columns={
+        "team_name": "TEAM_NAME",
+        "league_name": "Formal_League_Name",
+        "country_name": "COUNTRY_NAME",
+        "short_name": "short_League_Name",
+    })
+    return teams.merge(agg, on="TEAM_NAME", how="inner")
+
+
+AGGREGATES = {
+    # name: (builder, dbt table, key columns)
+    "agg_player": (player_aggregates, "agg_player", ["player_name", "team_name"]),
+    "agg_manager": (manager_aggregates, "agg_manager", ["manager_name", "team_name"]),
+    "agg_League": (league_aggregates, "agg_League", ["team_name"]),
+}
+
+
+def cross_check(local, warehouse, keys, rtol=1e-6):
+    """
+    Compares a local aggregate with the same dbt table read from SQL.
+
+    Columns are matched case-insensitively; only numeric columns present in
+    both are compared. Returns a list of human-readable differences.
+    """
+    local = local.rename(columns=str.lower)
+    warehouse = warehouse.rename(columns=str.lower)
+    warehouse = warehouse.loc[:, ~warehouse.columns.duplicated()]
+    merged = local.merge(warehouse, on=keys, how="outer", suffixes=("_local", "_sql"), indicator=True)
+
+    problems = []
+    only_local = merged[merged["_merge"] == "left_only"]
+    only_sql = merged[merged["_merge"] == "right_only"]
+    if len(only_local):
+        problems.append(f"{len(only_local)} row(s) only in the local aggregate")
+    if len(only_sql):
+        problems.append(f"{len(only_sql)} row(s) only in the warehouse")
+
+    both = merged[merged["_merge"] == "both"]
+    for column in local.columns:
+        if column in keys or f"{column}_sql" not in both.columns:
+            continue
+        left = pd.to_numeric(both[f"{column}_local"], errors="coerce")
+        right = pd.to_numeric(both[f"{column}_sql"], errors="coerce")
+        if left.isna().all() and right.isna().all():
+            continue
+        same = np.isclose(left.to_numpy(dtype=float), right.to_numpy(dtype=float), rtol=rtol, equal_nan=True)
+        if not same.all():
+            problems.append(f"{column}: {int((~same).sum())} row(s) differ")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the dbt mart aggregates locally with pandas.")
+    parser.add_argument("sources", nargs="+", help="Match output files, directories, or one parquet_export directory with --parquet")
+    parser.add_argument("--parquet", action="store_true", help="Read a parquet_export directory instead of match files")
+    parser.add_argument("--output-dir", help="Write each aggregate as <name>.parquet here")
+    parser.add_argument("--sql-url", help="SQLAlchemy URL; cross-check against the dbt tables there")
+    parser.add_argument("--sql-schema", default="dbo", help="Schema holding the dbt aggregate tables")
+    args = parser.parse_args(argv)
+
+    frames = frames_from_parquet(args.sources[0]) if args.parquet else frames_from_match_files(args.sources)
+    engine = None
+    if args.sql_url:
+        from sqlalchemy import create_engine
+        engine = create_engine(args.sql_url)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    failed = False
+    for name, (build, table, keys) in AGGREGATES.items():
+        result = build(frames)
+        print(f"{name}: {len(result)} rows")
+        if args.output_dir:
+            result.to_parquet(os.path.join(args.output_dir, f"{name}.parquet"), index=False)
+        if engine is not None:
+            warehouse = pd.read_sql_table(table, engine, schema=args.sql_schema)
+            problems = cross_check(result, warehouse, keys)
+            for problem in problems:
+                print(f"  {name} mismatch: {problem}")
+            failed = failed or bool(problems)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
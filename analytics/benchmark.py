@@ -0,0 +1,111 @@
+"""
+Compare the local Parquet/DuckDB path with the Azure SQL path for player aggregates.
+
+Both sides time the same step, building agg_player from per-player-match
+rows:
+
+  local  - PLAYER_AGGREGATE_SQL in DuckDB over the player_appearance Parquet
+           written by parquet_export (the export is timed and reported
+           separately)
+  sql    - the agg_player model's own SELECT (dbt/models/marts/aggregates/
+           agg_player.sql with its refs resolved to --sql-schema) run against
+           the dbt-built fact_player_match and dims, i.e. what `dbt run -s
+           agg_player` executes, minus writing the table. Optional; needs
+           --sql-url and sqlalchemy + pyodbc
+
+--sql-query replaces the SQL side with any other query, reported as such
+(e.g. "SELECT * FROM dbo.agg_player" for reading the materialized table).
+
+Usage (from the repository root):
+    python -m analytics.benchmark MATCH_FILES... [--repeat 5]
+        [--sql-url "mssql+pyodbc://..." [--sql-schema dbo] [--sql-query "..."]]
+"""
+import os
+import re
+import argparse
+import tempfile
+import time
+
+from analytics.parquet_export import export_parquet, iter_match_files
+from analytics.local_query import connect, PLAYER_AGGREGATE_SQL
+from extraction.benchmarks.corpus import summarise
+
+AGG_PLAYER_MODEL = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "dbt", "models", "marts", "aggregates", "agg_player.sql",
+)
+
+
+def agg_player_sql(schema="dbo", model_path=AGG_PLAYER_MODEL):
+    """The agg_player model's SELECT with {{ ref('x') }} resolved to schema.x and its config dropped."""
+    with open(model_path, encoding="utf-8") as f:
+        sql = f.read()
+    sql = re.sub(r"\{\{\s*config\(.*?\)\s*\}\}", "", sql, flags=re.DOTALL)
+    return re.sub(r"\{\{\s*ref\(\s*'(\w+)'\s*\)\s*\}\}", lambda m: f"{schema}.{m.group(1)}", sql)
+
+
+def _timed(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return samples, result
+
+
+def _report(label, samples, rows=None):
+    stats = summarise(samples)
+    suffix = f", {rows} rows" if rows is not None else ""
+    print(
+        f"{label:<44} mean {stats['mean_ms']:9.1f} ms  p50 {stats['p50_ms']:9.1f} ms  "
+        f"max {stats['max_ms']:9.1f} ms  (n={stats['n']}{suffix})"
+    )
+
+
+def run(sources, repeat, sql_url=None, sql_query=None, sql_schema="dbo"):
+    files = list(iter_match_files(sources))
+    if not files:
+        print("No match files found")
+        return 1
+    print(f"{len(files)} match file(s)")
+
+    with tempfile.TemporaryDirectory() as parquet_dir:
+        export_samples, _ = _timed(lambda: export_parquet(files, parquet_dir), repeat)
+        _report("export to parquet", export_samples)
+
+        def local_query():
+            return connect(parquet_dir).sql(PLAYER_AGGREGATE_SQL).fetchall()
+
+        query_samples, rows = _timed(local_query, repeat)
+        _report("duckdb agg_player from player_appearance", query_samples, len(rows))
+
+    if sql_url:
+        from sqlalchemy import create_engine, text
+
+        engine = create_engine(sql_url)
+        label = "custom sql query" if sql_query else "azure sql agg_player from fact_player_match"
+        query = text(sql_query or agg_player_sql(sql_schema))
+
+        def sql_path():
+            with engine.connect() as conn:
+                return conn.execute(query).fetchall()
+
+        sql_samples, sql_rows = _timed(sql_path, repeat)
+        _report(label, sql_samples, len(sql_rows))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark local Parquet analytics against the SQL path.")
+    parser.add_argument("sources", nargs="+", help="Match output files or directories of them")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sql-url", help="SQLAlchemy URL for the Azure SQL database (optional)")
+    parser.add_argument("--sql-schema", default=os.getenv("DB_SCHEMA", "dbo"), help="Schema holding the dbt marts (dbt profile: DB_SCHEMA)")
+    parser.add_argument("--sql-query", help="Time this query on the SQL path instead of the agg_player model")
+    args = parser.parse_args(argv)
+    return run(args.sources, args.repeat, args.sql_url, args.sql_query, args.sql_schema)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,118 @@
+"""
+DuckDB over the Parquet datasets written by parquet_export.
+
+    con = connect("parquet/")
+    con.sql(PLAYER_AGGREGATE_SQL).df()
+
+Each level is exposed as a view of the same name (match, team_line,
+player_appearance, goal_event, assist, card), with the league / season /
+month partition columns.
+"""
+import os
+
+import duckdb
+
+from analytics.aggregates import PLAYER_MATCH_ROLES, ROLES
+
+# Same role mapping as fact_player_match.sql, 'Sqaud' spelling included (see
+# aggregates.PLAYER_MATCH_ROLES), so the *_When_Squad columns stay zero as in
+# the warehouse
+PLAYER_MATCH_ROLE = (
+    "CASE player_status "
+    + " ".join(f"WHEN '{status}' THEN '{role}'" for status, role in PLAYER_MATCH_ROLES.items())
+    + " ELSE 'Unknow' END"
+)
+
+_METRICS = ("YellowCards", "RedCards", "Goals", "Assists", "MinutesPlayed")
+_ROLE_SUMS = ",\n    ".join(
+    f"SUM(CASE WHEN player_matchRole = '{role}' THEN {metric} ELSE 0 END) AS {metric}_{suffix}"
+    for role, suffix in ROLES
+    for metric in _METRICS
+)
+
+# Local equivalent of agg_player.sql with the same columns and semantics as
+# aggregates.player_aggregates: keyed by player and team name instead of the
+# dim_players / dim_teams surrogate keys; appearances in postponed matches add
+# to the sums but not the match counts (GAME_ID comes from dim_match, which
+# only has matches that were played); the team's league columns are joined on
+PLAYER_AGGREGATE_SQL = f"""
+WITH played AS (
+    -- dim_match: matches that weren't postponed
+    SELECT DISTINCT match_id FROM match WHERE NOT was_game_postponed
+),
+team_leagues AS (
+    -- dim_teams: first word of the league is the country, the rest its short name
+    SELECT DISTINCT
+        t.team_name,
+        m.league_name,
+        NULLIF(split_part(COALESCE(m.league_name, ''), ' ', 1), '') AS country_name,
+        CASE WHEN strpos(m.league_name, ' ') > 0
+             THEN trim(substr(m.league_name, strpos(m.league_name, ' ') + 1)) END AS short_name
+    FROM team_line AS t
+    JOIN match AS m ON m.file_name = t.file_name AND m.match_id = t.match_id
+    WHERE NOT m.was_game_postponed
+),
+player_match AS (
+    SELECT
+        p.player_name,
+        p.team_name,
+        CASE WHEN played.match_id IS NOT NULL THEN p.match_id END  AS game_id,
+        CAST(COALESCE(p.yellow_cards, 0) AS INTEGER)               AS YellowCards,
+        -- CAST(... AS INTEGER) in the warehouse truncates; DuckDB's rounds
+        CAST(trunc(COALESCE(p.red_cards, 0)) AS INTEGER)           AS RedCards,
+        p.goals_count                                              AS Goals,
+        p.assists_count                                            AS Assists,
+        CAST(trunc(COALESCE(p.minutes_played, 0)) AS INTEGER)      AS MinutesPlayed,
+        {PLAYER_MATCH_ROLE}                                        AS player_matchRole
+    FROM player_appearance AS p
+    LEFT JOIN played ON played.match_id = p.match_id
+),
+agg AS (
+    SELECT
+        player_name,
+        team_name,
+        SUM(YellowCards)   AS Total_YellowCards,
+        SUM(RedCards)      AS Total_RedCards,
+        SUM(Goals)         AS Total_Goals,
+        SUM(Assists)       AS Total_Assists,
+        SUM(MinutesPlayed) AS Total_MinutesPlayed,
+        {_ROLE_SUMS},
+        COUNT(DISTINCT game_id) AS Total_Squads_Made,
+        COUNT(DISTINCT CASE WHEN player_matchRole IN ('Starter', 'Sub') THEN game_id END) AS Total_Match_Involvements,
+        COUNT(DISTINCT CASE WHEN player_matchRole = 'Starter' THEN game_id END) AS Matches_Started,
+        COUNT(DISTINCT CASE WHEN player_matchRole = 'Sub' THEN game_id END)     AS Matches_As_Sub,
+        COUNT(DISTINCT CASE WHEN player_matchRole = 'Squad' THEN game_id END)   AS Matches_As_Squad
+    FROM player_match
+    GROUP BY player_name, team_name
+)
+SELECT
+    agg.*,
+    Total_Goals * 90.0 / NULLIF(Total_MinutesPlayed, 0)   AS Goals_Per_90,
+    Total_Assists * 90.0 / NULLIF(Total_MinutesPlayed, 0) AS Assists_Per_90,
+    (Total_Goals + Total_Assists) * 90.0 / NULLIF(Total_MinutesPlayed, 0) AS Goal_Contribution_Per_90,
+    (Total_YellowCards + Total_RedCards) * 90.0 / NULLIF(Total_MinutesPlayed, 0) AS Cards_Per_90,
+    Goals_When_Started * 100.0 / NULLIF(Total_Goals, 0) AS Pct_Goals_When_Started,
+    Goals_When_Sub * 100.0 / NULLIF(Total_Goals, 0)     AS Pct_Goals_When_Sub,
+    Goals_When_Squad * 100.0 / NULLIF(Total_Goals, 0)   AS Pct_Goals_When_Squad,
+    team_leagues.league_name,
+    team_leagues.country_name,
+    team_leagues.short_name
+FROM agg
+LEFT JOIN team_leagues USING (team_name)
+ORDER BY Total_Goals DESC, player_name
+"""
+
+
+def connect(parquet_dir, database=":memory:"):
+    """A DuckDB connection with one view per exported level under `parquet_dir`."""
+    con = duckdb.connect(database)
+    for level in sorted(os.listdir(parquet_dir)):
+        path = os.path.join(parquet_dir, level)
+        if not os.path.isdir(path):
+            continue
+        pattern = os.path.join(path, "**", "*.parquet").replace("'", "''")
+        con.execute(
+            f"CREATE OR REPLACE VIEW {level} AS "
+            f"SELECT * FROM read_parquet('{pattern}', hive_partitioning = true)"
+        )
+    return con
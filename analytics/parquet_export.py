@@ -0,0 +1,172 @@
+"""
+Flattens extracted match files into partitioned Parquet datasets.
+
+Input is any match output file the extractor writes (.json / .ndjson,
+optionally .gz), or directories of them. Rows come from loader/shred.py, the
+same shredding the loader uses for the stg.shred_* tables. Each level is
+written as its own hive-partitioned dataset:
+
+    OUTPUT/<level>/league=<League>/season=<2024_2025>/month=<2025-02>/part-*.parquet
+
+Levels: match, team_line, player_appearance, goal_event, assist, card.
+
+Re-exporting replaces the partitions it touches, so export whole
+league/months at a time.
+
+Usage:
+    python -m analytics.parquet_export SOURCE [SOURCE ...] --output DIR
+"""
+import os
+import re
+import json
+import time
+import logging
+import argparse
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from loader.shred import SHRED_TABLES, MATCH_FILE_SUFFIXES, decode_match_file, shred_match
+
+logger = logging.getLogger(__name__)
+
+PARTITION_COLUMNS = ("league", "season", "month")
+
+# Column types for the flattened levels; anything not listed is a string
+COLUMN_TYPES = {
+    "played_on": pa.date32(),
+    "attendance": pa.int32(),
+    "was_game_postponed": pa.bool_(),
+    "score": pa.float64(),
+    "possession": pa.float64(),
+    "shirt_number_int": pa.int32(),
+    "started_game": pa.bool_(),
+    "was_substituted": pa.bool_(),
+    "was_introduced": pa.bool_(),
+    "is_captain": pa.bool_(),
+    "yellow_cards": pa.int32(),
+    "red_cards": pa.float64(),
+    "goals_count": pa.int32(),
+    "assists_count": pa.int32(),
+    "minutes_played": pa.float64(),
+    "event_index": pa.int32(),
+}
+
+# "English Premiership_2025-02_2025-03-01_06-00-00" -> "2025-02"
+_FILE_PERIOD = re.compile(r"_(\d{4}-\d{2})_\d{4}-\d{2}-\d{2}")
+
+
+def level_name(table):
+    """'stg.shred_player_appearance' -> 'player_appearance'"""
+    return table.split(".shred_", 1)[1]
+
+
+def level_schema(table):
+    columns = SHRED_TABLES[table] + PARTITION_COLUMNS
+    return pa.schema([(c, COLUMN_TYPES.get(c, pa.string())) for c in columns])
+
+
+def season_for(year, month):
+    """Seasons run July to June: 2025-02 is in '2024_2025'."""
+    start = year if month >= 7 else year - 1
+    return f"{start}_{start + 1}"
+
+
+def match_partition(match_row, file_name):
+    """(league, season, month) for a shredded match row."""
+    league = match_row["league_name"] or "unknown"
+    played_on = match_row["played_on"]
+    if played_on is not None:
+        return league, season_for(played_on.year, played_on.month), played_on.strftime("%Y-%m")
+
+    # Postponed / unparsable dates fall back to the period in the file name
+    found = _FILE_PERIOD.search(os.path.basename(file_name or ""))
+    if found:
+        year, month = (int(p) for p in found.group(1).split("-"))
+        return league, season_for(year, month), found.group(1)
+    return league, "unknown", "unknown"
+
+
+def iter_match_files(sources):
+    """Expands files and directories into match output file paths."""
+    for source in sources:
+        if os.path.isdir(source):
+            for root, _dirs, files in os.walk(source):
+                for name in sorted(files):
+                    if name.endswith(MATCH_FILE_SUFFIXES):
+                        yield os.path.join(root, name)
+        else:
+            yield source
+
+
+def read_match_file(path):
+    with open(path, "rb") as f:
+        return json.loads(decode_match_file(path, f.read()))
+
+
+def flatten_matches(paths):
+    """Shreds every match in `paths` into {table: [rows]} with partition columns added."""
+    tables = {table: [] for table in SHRED_TABLES}
+    for path in paths:
+        file_name = os.path.basename(path)
+        for match in read_match_file(path):
+            if not isinstance(match, dict):
+                continue
+            rows = shred_match(match, file_name)
+            partition = dict(zip(PARTITION_COLUMNS, match_partition(rows["stg.shred_match"][0], file_name)))
+            for table, table_rows in rows.items():
+                for row in table_rows:
+                    row.update(partition)
+                tables[table].extend(table_rows)
+    return tables
+
+
+def write_parquet(tables, output_dir):
+    """Writes each level as a hive-partitioned dataset. Returns {level: row count}."""
+    counts = {}
+    for table, rows in tables.items():
+        level = level_name(table)
+        counts[level] = len(rows)
+        if not rows:
+            continue
+        schema = level_schema(table)
+        ds.write_dataset(
+            pa.Table.from_pylist(rows, schema=schema),
+            os.path.join(output_dir, level),
+            format="parquet",
+            partitioning=ds.partitioning(
+                pa.schema([(c, pa.string()) for c in PARTITION_COLUMNS]), flavor="hive"
+            ),
+            basename_template="part-{i}.parquet",
+            existing_data_behavior="delete_matching",
+        )
+    return counts
+
+
+def export_parquet(sources, output_dir):
+    """Flattens the match files under `sources` into Parquet under `output_dir`."""
+    started = time.perf_counter()
+    paths = list(iter_match_files(sources))
+    tables = flatten_matches(paths)
+    counts = write_parquet(tables, output_dir)
+    logger.info(
+        f"Exported {len(paths)} file(s) to {output_dir} in {time.perf_counter() - started:.2f}s: "
+        + ", ".join(f"{level}={n}" for level, n in counts.items())
+    )
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export extracted match files to partitioned Parquet.")
+    parser.add_argument("sources", nargs="+", help="Match output files or directories of them")
+    parser.add_argument("--output", required=True, help="Root directory for the Parquet datasets")
+    args = parser.parse_args(argv)
+
+    counts = export_parquet(args.sources, args.output)
+    for level, n in counts.items():
+        print(f"{level}: {n} rows")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
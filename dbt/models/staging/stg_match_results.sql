@@ -1,3 +1,43 @@
+{% if var('use_shredded_staging', false) %}
+
+-- Pre-shredded by the loader (loader/shred.py). Aggregated per MATCH_ID exactly
+-- like match_summary below, so a match found in more than one output file
+-- (e.g. after a reprocess) still gives one row.
+SELECT
+    t.match_id AS MATCH_ID,
+
+    -- Home team details
+    MAX(CASE WHEN t.playing_as = 'home' THEN t.team_name  END) AS HOME_TEAM_NAME,
+    MAX(CASE WHEN t.playing_as = 'home' THEN t.manager    END) AS HOME_TEAM_MANAGER,
+    MAX(CASE WHEN t.playing_as = 'home' THEN t.formation  END) AS HOME_TEAM_FORMATION,
+    MAX(CASE WHEN t.playing_as = 'home' THEN t.score      END) AS HOME_TEAM_SCORE,
+    MAX(CASE WHEN t.playing_as = 'home' THEN t.possession END) AS HOME_TEAM_POSSESSION,
+
+    -- Away team details
+    MAX(CASE WHEN t.playing_as = 'away' THEN t.team_name  END) AS AWAY_TEAM_NAME,
+    MAX(CASE WHEN t.playing_as = 'away' THEN t.manager    END) AS AWAY_TEAM_MANAGER,
+    MAX(CASE WHEN t.playing_as = 'away' THEN t.formation  END) AS AWAY_TEAM_FORMATION,
+    MAX(CASE WHEN t.playing_as = 'away' THEN t.score      END) AS AWAY_TEAM_SCORE,
+    MAX(CASE WHEN t.playing_as = 'away' THEN t.possession END) AS AWAY_TEAM_POSSESSION,
+
+    -- Was the game postponed? (any team with NULL score)
+    CASE
+        WHEN MAX(CASE WHEN t.score IS NULL THEN 1 ELSE 0 END) = 1
+            THEN CAST(1 AS bit)
+        ELSE CAST(0 AS bit)
+    END AS WAS_GAME_POSTPONED,
+
+    MAX(m.played_on)   AS PLAYED_ON,
+    MAX(m.league_name) AS LEAGUE_NAME,
+    MAX(m.venue)       AS VENUE,
+    MAX(m.attendance)  AS ATTENDANCE
+FROM {{ source('shredded_match', 'shred_team_line') }} AS t
+JOIN {{ source('shredded_match', 'shred_match') }} AS m
+    ON t.match_id = m.match_id
+GROUP BY t.match_id
+
+{% else %}
+
 WITH match_data AS (
     SELECT 
         JSON_VALUE(match_json.value, '$.match_id') AS MATCH_ID,
@@ -84,4 +124,6 @@ MAX(
 )
 
 SELECT *
-FROM match_summary;
+FROM match_summary
+
+{% endif %}
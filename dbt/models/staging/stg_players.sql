@@ -1,3 +1,35 @@
+{% if var('use_shredded_staging', false) %}
+
+-- Pre-shredded by the loader (loader/shred.py); the same rows as the OPENJSON
+-- path below, one per player per output file. goals_array already holds the
+-- goal objects' JSON text the way STRING_AGG builds GOALS_ARRAY there.
+SELECT
+    p.player_name          AS PLAYER_NAME,
+    p.match_id             AS MATCH_ID,
+    p.team_name            AS TEAM_NAME,
+    p.shirt_number         AS TEAM_NUMBER,
+    p.shirt_number_int     AS TEAM_NUMBER1,
+    p.started_game         AS STARTED_GAME,
+    p.was_substituted      AS WAS_SUBSTITUTED,
+    p.was_introduced       AS WAS_INTRODUCED,
+    p.is_captain           AS is_captain,
+    p.replaced_by          AS REPLACED_BY,
+    p.substitution_time    AS SubstitutionTime,
+    CAST(p.yellow_cards AS nvarchar(4000)) AS YELLOW_CARDS,  -- JSON_VALUE text below
+    p.yellow_card_minutes  AS YELLOW_CARD_MINUTES,
+    p.red_cards            AS RED_CARDS,
+    p.red_card_minutes     AS RED_CARD_MINUTES,
+    p.goals_count          AS GOALS_COUNT,
+    p.goals_array          AS GOALS_ARRAY,
+    p.assists_count        AS ASSISTS_COUNT,
+    p.assists_array        AS ASSISTS_ARRAY,
+    p.minutes_played       AS MINUTES_PLAYED,
+    p.playing_as           AS PLAYING_AS,
+    p.player_status        AS PLAYER_STATUS
+FROM {{ source('shredded_match', 'shred_player_appearance') }} AS p
+
+{% else %}
+
 WITH match_data AS (
     SELECT
         JSON_VALUE(match_json.value, '$.match_id') AS match_id,
@@ -175,4 +207,6 @@ away_players AS (
 
 SELECT * FROM home_players
 UNION ALL
-SELECT * FROM away_players;
+SELECT * FROM away_players
+
+{% endif %}
@@ -0,0 +1,24 @@
+"""
+BBC football scraper.
+
+The names below are re-exported for the Lambda entry point (extraction/app.py).
+They are imported on first access, so importing the package itself stays cheap
+on a cold start.
+"""
+import importlib
+
+_EXPORTS = {
+    "leagues": ".models",
+    "process_games_for_months": ".process_games",
+    "getYearMonthString": ".general_utils",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,321 @@
+"""
+Incrementally maintained player / team / manager / league totals.
+
+Rather than rebuilding aggregates from every match ever stored, each match is
+turned into a small set of deltas ("contributions") which are added to
+persisted accumulators in SQLite. The contributions applied for each match_id
+are kept too, so re-applying a re-scraped match first subtracts what it added
+last time: replay is idempotent and costs O(players in the match).
+
+Counting follows the dbt marts: player sums include every match, while games,
+results and points only count matches that weren't postponed.
+
+Where the database lives:
+  AGGREGATE_STORE_BLOB  - a blob (gzipped SQLite) in the function's storage
+                          account. It is loaded into memory on first use and
+                          uploaded again, ETag-conditioned, after every batch;
+                          a batch counts as applied only once that upload
+                          succeeded. This is what a deployed function uses:
+                          its local disk doesn't outlive the instance.
+  AGGREGATE_STORE_PATH  - a local SQLite file, for local runs and the
+                          command line only (the totals would silently start
+                          from zero on every new Functions/Lambda instance).
+
+Either one enables updates from process_games_for_months. Rebuild or backfill
+from match output files with:
+    python -m core_function.aggregate_store STORE.sqlite|blob:PATH FILES...
+"""
+import os
+import json
+import gzip
+import sqlite3
+import logging
+import argparse
+import threading
+
+from .azure_storage import download_bytes_with_etag, upload_bytes
+
+logger = logging.getLogger()
+
+AGGREGATE_STORE_BLOB = os.environ.get("AGGREGATE_STORE_BLOB", "")
+AGGREGATE_STORE_PATH = os.environ.get("AGGREGATE_STORE_PATH", "")
+
+# table: (key columns, accumulated columns)
+ACCUMULATORS = {
+    "player_totals": (
+        ("player_name", "team_name"),
+        ("squads_made", "matches_started", "matches_as_sub", "matches_as_squad",
+         "goals", "assists", "yellow_cards", "red_cards", "minutes_played",
+         "goals_when_started", "goals_when_sub", "minutes_when_started", "minutes_when_sub"),
+    ),
+    "team_totals": (
+        ("team_name",),
+        ("games_played", "wins", "draws", "losses", "points", "scored", "conceded",
+         "home_games_played", "home_wins", "home_draws", "home_losses", "home_points",
+         "away_games_played", "away_wins", "away_draws", "away_losses", "away_points"),
+    ),
+    "manager_totals": (
+        ("manager_name", "team_name"),
+        ("games_played", "wins", "draws", "losses",
+         "home_games_played", "home_wins", "home_draws", "home_losses",
+         "away_games_played", "away_wins", "away_draws", "away_losses"),
+    ),
+    "league_totals": (
+        ("league_name",),
+        ("matches", "postponed", "goals", "attendance", "matches_with_attendance"),
+    ),
+}
+
+# Same roles as fact_player_match.sql, keyed by stg_players' PLAYER_STATUS logic
+_ROLE_COLUMNS = {"Starter": "matches_started", "Sub": "matches_as_sub", "Squad": "matches_as_squad"}
+
+
+def _number(value):
+    try:
+        number = float(str(value).replace(",", "").replace("%", ""))
+    except (TypeError, ValueError):
+        return None
+    return int(number) if number.is_integer() else number
+
+
+def _player_role(player):
+    started = player.get("WasStarter")
+    substituted = player.get("WasSubstituted")
+    introduced = player.get("WasIntroduced")
+    if started is True and substituted in (True, False):
+        return "Starter"
+    if started is False and introduced is True and substituted in (True, False):
+        return "Sub"
+    if started is False and introduced is False:
+        return "Squad"
+    return None
+
+
+def _result(scored, conceded):
+    if scored > conceded:
+        return "wins", 3
+    if scored < conceded:
+        return "losses", 0
+    return "draws", 1
+
+
+def match_contributions(match):
+    """
+    The deltas one match adds: [(table, key, {column: amount})]. Pure function
+    of the match dict, so the same match always yields the same deltas.
+    """
+    contributions = []
+    league = match.get("League_Name")
+    home = match.get("home_team") or {}
+    away = match.get("away_team") or {}
+    home_score = _number(home.get("score"))
+    away_score = _number(away.get("score"))
+    played = home_score is not None and away_score is not None
+
+    for team in (home, away):
+        team_name = team.get("name")
+        for player_name, player in (team.get("players") or {}).items():
+            if not isinstance(player, dict):
+                continue
+            role = _player_role(player)
+            goals = len(player.get("Goals") or [])
+            minutes = int(_number(player.get("MinutesPlayed")) or 0)
+            deltas = {
+                "goals": goals,
+                "assists": len(player.get("Assists") or []),
+                "yellow_cards": int(_number(player.get("YellowCards")) or 0),
+                "red_cards": int(_number(player.get("RedCards")) or 0),
+                "minutes_played": minutes,
+            }
+            if role == "Starter":
+                deltas.update(goals_when_started=goals, minutes_when_started=minutes)
+            elif role == "Sub":
+                deltas.update(goals_when_sub=goals, minutes_when_sub=minutes)
+            if played:
+                deltas["squads_made"] = 1
+                if role:
+                    deltas[_ROLE_COLUMNS[role]] = 1
+            contributions.append(("player_totals", (player_name, team_name), deltas))
+
+    if not played:
+        contributions.append(("league_totals", (league,), {"postponed": 1}))
+        return contributions
+
+    for side, team, scored, conceded in (("home", home, home_score, away_score), ("away", away, away_score, home_score)):
+        outcome, points = _result(scored, conceded)
+        contributions.append(("team_totals", (team.get("name"),), {
+            "games_played": 1, outcome: 1, "points": points, "scored": scored, "conceded": conceded,
+            f"{side}_games_played": 1, f"{side}_{outcome}": 1, f"{side}_points": points,
+        }))
+        manager = (team.get("manager") or "").replace("Manager: ", "") or None
+        contributions.append(("manager_totals", (manager, team.get("name")), {
+            "games_played": 1, outcome: 1, f"{side}_games_played": 1, f"{side}_{outcome}": 1,
+        }))
+
+    attendance = _number(match.get("attendance"))
+    league_deltas = {"matches": 1, "goals": home_score + away_score}
+    if attendance is not None:
+        league_deltas.update(attendance=attendance, matches_with_attendance=1)
+    contributions.append(("league_totals", (league,), league_deltas))
+    return contributions
+
+
+class AggregateStore:
+    def __init__(self, path, data=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        if data:
+            self._db.deserialize(data)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS applied_matches ("
+                " match_id TEXT PRIMARY KEY, contributions TEXT NOT NULL)"
+            )
+            for table, (keys, columns) in ACCUMULATORS.items():
+                self._db.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} ("
+                    + ", ".join(f"{k} TEXT" for k in keys) + ", "
+                    + ", ".join(f"{c} NUMERIC NOT NULL DEFAULT 0" for c in columns)
+                    + f", PRIMARY KEY ({', '.join(keys)}))"
+                )
+
+    def close(self):
+        self._db.close()
+
+    def _add(self, contributions, sign):
+        for table, key, deltas in contributions:
+            keys, _columns = ACCUMULATORS[table]
+            columns = list(deltas)
+            # NULLs never conflict in SQLite, so missing names are stored as ''
+            key = ["" if k is None else str(k) for k in key]
+            self._db.execute(
+                f"INSERT INTO {table} ({', '.join(keys)}, {', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * (len(keys) + len(columns)))}) "
+                f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET "
+                + ", ".join(f"{c} = {c} + excluded.{c}" for c in columns),
+                [*key, *(sign * deltas[c] for c in columns)],
+            )
+
+    def apply_matches(self, matches):
+        """
+        Adds a batch of match dicts to the totals in one transaction. A match_id
+        seen before has its previous contributions reversed first.
+        Returns (new, replaced) counts.
+        """
+        with self._lock:
+            counts = self._apply_matches(matches)
+            self._persist()
+        return counts
+
+    def _persist(self):
+        pass
+
+    def _apply_matches(self, matches):
+        new = replaced = 0
+        with self._db:
+            for match in matches:
+                match_id = str(match.get("match_id"))
+                contributions = match_contributions(match)
+                previous = self._db.execute(
+                    "SELECT contributions FROM applied_matches WHERE match_id = ?", (match_id,)
+                ).fetchone()
+                if previous:
+                    self._add(json.loads(previous[0]), -1)
+                    replaced += 1
+                else:
+                    new += 1
+                self._add(contributions, 1)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO applied_matches (match_id, contributions) VALUES (?, ?)",
+                    (match_id, json.dumps(contributions)),
+                )
+        return new, replaced
+
+    def totals(self, table):
+        """All rows of one accumulator table as dicts."""
+        cursor = self._db.execute(f"SELECT * FROM {table}")
+        names = [d[0] for d in cursor.description]
+        return [dict(zip(names, row)) for row in cursor]
+
+
+class BlobAggregateStore(AggregateStore):
+    """
+    An in-memory AggregateStore saved to a blob after every batch. A failed
+    upload fails apply_matches; the batch stays in the in-memory copy, and
+    since re-applying a match replaces its contributions, the caller can simply
+    offer it again.
+    """
+
+    def __init__(self, blob_path):
+        data, self._etag = download_bytes_with_etag(blob_path)
+        super().__init__(":memory:", gzip.decompress(data) if data is not None else None)
+        self.blob_path = blob_path
+        logger.info(f"Loaded aggregate store from {blob_path}" if data is not None
+                    else f"Starting a new aggregate store at {blob_path}")
+
+    def _persist(self):
+        # Conditional on the version loaded, so a concurrent rebuild isn't overwritten
+        self._etag = upload_bytes(
+            self.blob_path, gzip.compress(self._db.serialize()), "application/gzip",
+            etag=self._etag, if_missing=self._etag is None,
+        )
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_aggregate_store():
+    """
+    The store at AGGREGATE_STORE_BLOB (or AGGREGATE_STORE_PATH), or None when
+    incremental aggregates are off. Raises if the blob can't be read; the next
+    call tries again.
+    """
+    global _store
+    if not (AGGREGATE_STORE_BLOB or AGGREGATE_STORE_PATH):
+        return None
+    # One connection (and one _lock) per process, however many units ask at once
+    with _store_lock:
+        if _store is None:
+            if AGGREGATE_STORE_BLOB:
+                _store = BlobAggregateStore(AGGREGATE_STORE_BLOB)
+            else:
+                if os.environ.get("FUNCTIONS_WORKER_RUNTIME") or os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
+                    logger.warning(
+                        "AGGREGATE_STORE_PATH is on this instance's local disk and is lost with it; "
+                        "set AGGREGATE_STORE_BLOB to keep the totals in blob storage"
+                    )
+                _store = AggregateStore(AGGREGATE_STORE_PATH)
+        return _store
+
+
+def _read_match_file(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        if ".ndjson" in path:
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply match output files to an incremental aggregate store.")
+    parser.add_argument("store", help="SQLite file holding the totals, or blob:PATH for one in blob storage")
+    parser.add_argument("files", nargs="+", help="Match output files (.json / .ndjson, optionally .gz)")
+    args = parser.parse_args(argv)
+
+    if args.store.startswith("blob:"):
+        store = BlobAggregateStore(args.store[len("blob:"):])
+    else:
+        store = AggregateStore(args.store)
+    for path in args.files:
+        new, replaced = store.apply_matches(_read_match_file(path))
+        print(f"{path}: {new} new, {replaced} replayed")
+    store.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
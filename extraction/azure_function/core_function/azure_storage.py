@@ -1,61 +1,282 @@
 # azure_storage.py
 import os
+import io
 import json
+import time
+import random
 import logging
-from azure.storage.blob import BlobServiceClient
+import threading
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
+from .match_output import output_content_type, output_extension, write_match_data, read_ndjson
+from .metrics import get_metrics, timed
+from .blob_store import CONTAINER_NAME, get_store
+
 load_dotenv()
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-ACCOUNT_URL = os.environ["AZURE_STORAGE_ACCOUNT_URL"]
-ACCOUNT_NAME = os.environ["AZURE_STORAGE_ACCOUNT_NAME"]
-ACCOUNT_KEY = os.environ["AZURE_STORAGE_ACCOUNT_KEY"]
-CONTAINER_NAME = os.environ.get("AZURE_CONTAINER_NAME", "raw")
+# Account / backend settings live in blob_store. Nothing here touches the azure
+# SDK at import time; its exceptions are imported where they are handled.
 BLOB_MATCH_ID_PATH = os.environ.get("MATCH_ID_BLOB_PATH", "KEYS/MATCH_ID.json")
 MATCH_DATA_FOLDER = os.environ.get("MATCH_DATA_FOLDER", "2025_2026")
+RUN_LOCK_BLOB_PATH = os.environ.get("RUN_LOCK_BLOB_PATH", "KEYS/RUN.lock")
+RUN_LOCK_LEASE_SECONDS = int(os.environ.get("RUN_LOCK_LEASE_SECONDS", "60"))
+RUN_LOCK_WAIT_SECONDS = float(os.environ.get("RUN_LOCK_WAIT_SECONDS", "0"))
+REGISTRY_UPDATE_RETRIES = int(os.environ.get("REGISTRY_UPDATE_RETRIES", "5"))
+UPLOAD_BLOCK_SIZE = int(os.environ.get("UPLOAD_BLOCK_SIZE", str(4 * 1024 * 1024)))
+
+def download_json(path):
+    """Returns the parsed JSON at `path`, or None if the blob doesn't exist. Other errors propagate."""
+    return download_json_with_etag(path)[0]
+
+def download_json_with_etag(path):
+    """Returns (parsed JSON, etag), or (None, None) if the blob doesn't exist."""
+    from azure.core.exceptions import ResourceNotFoundError
+
+    try:
+        data, etag = get_store().get(path)
+    except ResourceNotFoundError:
+        return None, None
+    return json.loads(data.decode("utf-8")), etag
+
+def download_json_many(paths):
+    """
+    The parsed JSON at each path, in order, downloaded concurrently. Missing
+    blobs come back as None; any other error propagates.
+    """
+    from azure.core.exceptions import ResourceNotFoundError
+
+    documents = []
+    for result in get_store().get_many(paths):
+        if isinstance(result, ResourceNotFoundError):
+            documents.append(None)
+        elif isinstance(result, Exception):
+            raise result
+        else:
+            documents.append(json.loads(result[0].decode("utf-8")))
+    return documents
+
+def upload_json(path, data, etag=None, if_missing=False):
+    """
+    Uploads `data` as compact JSON and returns the new etag.
+
+    With `etag`, the write only succeeds if the blob is unchanged since it was
+    read (ResourceModifiedError otherwise); with `if_missing`, only if it
+    doesn't exist yet (ResourceExistsError otherwise).
+    """
+    json_data = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return get_store().put(path, json_data, "application/json", etag=etag, if_missing=if_missing)
+
+def download_bytes_with_etag(path):
+    """Returns (bytes, etag), or (None, None) if the blob doesn't exist."""
+    from azure.core.exceptions import ResourceNotFoundError
+
+    try:
+        return get_store().get(path)
+    except ResourceNotFoundError:
+        return None, None
+
+def upload_bytes(path, data, content_type=None, etag=None, if_missing=False):
+    """Uploads `data` as-is and returns the new etag; `etag` / `if_missing` as in upload_json."""
+    return get_store().put(path, data, content_type, etag=etag, if_missing=if_missing)
+
+def list_blob_names(prefix):
+    return get_store().list(prefix)
+
+def delete_blob(path):
+    get_store().delete(path)
+
+def delete_blobs(paths):
+    """Deletes the blobs concurrently. Returns the paths that couldn't be deleted."""
+    paths = list(paths)
+    failed = []
+    for path, error in zip(paths, get_store().delete_many(paths)):
+        if error is not None:
+            logger.error(f"Error deleting {path}: {error}")
+            failed.append(path)
+    return failed
+
+class _BlockBlobWriter(io.RawIOBase):
+    """
+    Write-only stream that stages every UPLOAD_BLOCK_SIZE bytes as a block
+    and commits the block list on close. Blocks are staged concurrently (see
+    blob_store.BlockWriter); small payloads go up in one call.
+    """
+
+    def __init__(self, path, content_type, block_size=UPLOAD_BLOCK_SIZE):
+        self._path = path
+        self._content_type = content_type
+        self._block_size = block_size
+        self._buffer = bytearray()
+        self._blocks = None
+        self.bytes_written = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self._block_size:
+            self._stage(bytes(self._buffer[:self._block_size]))
+            del self._buffer[:self._block_size]
+        return len(data)
 
-_blob_service_client = BlobServiceClient(
-    account_url=ACCOUNT_URL,
-    credential=ACCOUNT_KEY,   # 👈 this is your storage account key
-)
+    def _stage(self, chunk):
+        if self._blocks is None:
+            self._blocks = get_store().block_writer(self._path, self._content_type)
+        self._blocks.stage(chunk)
 
-def _get_blob_client(path: str):
-    return _blob_service_client.get_blob_client(container=CONTAINER_NAME, blob=path)
+    def commit(self):
+        if self._blocks is None:
+            get_store().put(self._path, bytes(self._buffer), self._content_type)
+        else:
+            if self._buffer:
+                self._stage(bytes(self._buffer))
+            self._blocks.commit()
+        self._buffer = bytearray()
 
+@timed("blob_upload")
 def save_match_data_to_adls(match_data, filename, foldername=MATCH_DATA_FOLDER):
+    """
+    Uploads a league/month of matches in the format set by MATCH_OUTPUT_FORMAT /
+    MATCH_OUTPUT_COMPRESSION, streaming serialized output straight into blocks.
+    """
     try:
-        json_data = json.dumps(match_data, indent=2, ensure_ascii=False)
-        path = f"{foldername}/{filename}.json"
-        blob_client = _get_blob_client(path)
-        blob_client.upload_blob(json_data.encode("utf-8"), overwrite=True)
-        logger.info(f"Match data uploaded to ADLS: {path}")
+        path = f"{foldername}/{filename}{output_extension()}"
+        writer = _BlockBlobWriter(path, output_content_type())
+        write_match_data(match_data, writer)
+        writer.commit()
+        get_metrics().incr("bytes_uploaded", writer.bytes_written)
+        logger.info(f"Match data uploaded to ADLS: {path} ({writer.bytes_written} bytes)")
         return True
     except Exception as e:
         logger.error(f"Error uploading match data: {e}")
         return False
 
+@timed("part_upload")
+def save_match_part(match_data, path):
+    """
+    Uploads one checkpoint batch as uncompressed ndjson at `path`, whatever the
+    configured output format. Returns True on success.
+    """
+    try:
+        buffer = io.BytesIO()
+        write_match_data(match_data, buffer, fmt="ndjson", compression="none")
+        get_store().put(path, buffer.getvalue(), output_content_type("ndjson", "none"))
+        get_metrics().incr("bytes_uploaded", buffer.tell())
+        logger.info(f"Match part uploaded to ADLS: {path} ({buffer.tell()} bytes)")
+        return True
+    except Exception as e:
+        logger.error(f"Error uploading match part {path}: {e}")
+        return False
+
+def download_match_parts(paths):
+    """
+    The match dicts of each part blob written by save_match_part, in order,
+    downloaded concurrently. Errors propagate.
+    """
+    parts = []
+    for result in get_store().get_many(paths):
+        if isinstance(result, Exception):
+            raise result
+        parts.append(read_ndjson(result[0]))
+    return parts
+
+@timed("registry_download")
 def get_json_from_adls():
     try:
-        blob_client = _get_blob_client(BLOB_MATCH_ID_PATH)
-        downloader = blob_client.download_blob()
-        data = downloader.readall().decode("utf-8")
-        return json.loads(data)
+        data, _etag = get_store().get(BLOB_MATCH_ID_PATH)
+        return json.loads(data.decode("utf-8"))
     except Exception as e:
         logger.error(f"Error fetching JSON from ADLS: {e}")
         return None
 
+def merge_registries(current, updated):
+    """Union of two MATCH_ID.json documents; entries in `updated` win."""
+    merged = {**(current or {}), **updated}
+    merged["identifiers"] = {
+        **(current or {}).get("identifiers", {}),
+        **updated.get("identifiers", {}),
+    }
+    return merged
+
+@timed("registry_update")
 def update_json_in_adls(updated_dict):
+    """
+    Writes the match-ID registry with an ETag-conditioned upload.
+
+    If another run changed the blob since we read it, the two versions are
+    merged and the write retried, so neither run's identifiers are lost.
+    """
+    from azure.core.exceptions import ResourceExistsError, ResourceModifiedError
+
     if not updated_dict:
         logger.error("Attempted to update ADLS with empty JSON data.")
         return False
+    for attempt in range(1, REGISTRY_UPDATE_RETRIES + 1):
+        try:
+            current, etag = download_json_with_etag(BLOB_MATCH_ID_PATH)
+            merged = merge_registries(current, updated_dict)
+            upload_json(BLOB_MATCH_ID_PATH, merged, etag=etag, if_missing=etag is None)
+            logger.info(f"JSON updated in ADLS: {CONTAINER_NAME}/{BLOB_MATCH_ID_PATH}")
+            return True
+        except (ResourceModifiedError, ResourceExistsError):
+            logger.warning(f"Match identifiers changed concurrently (attempt {attempt}), merging and retrying")
+            time.sleep(random.uniform(0, 0.2 * attempt))
+        except Exception as e:
+            logger.error(f"Error updating JSON in ADLS: {e}")
+            return False
+    logger.error(f"Gave up updating match identifiers after {REGISTRY_UPDATE_RETRIES} conflicting attempts")
+    return False
+
+@contextmanager
+def run_lock(wait_seconds=RUN_LOCK_WAIT_SECONDS, lease_seconds=RUN_LOCK_LEASE_SECONDS):
+    """
+    Holds a blob lease on RUN_LOCK_BLOB_PATH for the duration of a scrape run.
+
+    The lease is renewed in the background and expires on its own if the
+    process dies. Raises RuntimeError if another run still holds it after
+    `wait_seconds`.
+    """
+    from azure.core.exceptions import HttpResponseError, ResourceExistsError
+
+    store = get_store()
     try:
-        json_data = json.dumps(updated_dict, indent=2, ensure_ascii=False)
-        blob_client = _get_blob_client(BLOB_MATCH_ID_PATH)
-        blob_client.upload_blob(json_data.encode("utf-8"), overwrite=True)
-        logger.info(f"JSON updated in ADLS: {CONTAINER_NAME}/{BLOB_MATCH_ID_PATH}")
-        return True
-    except Exception as e:
-        logger.error(f"Error updating JSON in ADLS: {e}")
-        return False
+        store.put(RUN_LOCK_BLOB_PATH, b"", if_missing=True)
+    except ResourceExistsError:
+        pass
+
+    deadline = time.monotonic() + wait_seconds
+    while True:
+        try:
+            lease = store.acquire_lease(RUN_LOCK_BLOB_PATH, lease_seconds)
+            break
+        except HttpResponseError as e:
+            if e.status_code != 409 or time.monotonic() >= deadline:
+                raise RuntimeError(f"Could not acquire run lock {RUN_LOCK_BLOB_PATH}: {e}") from e
+            time.sleep(min(5.0, max(0.0, deadline - time.monotonic())))
+
+    stop = threading.Event()
+
+    def renew():
+        while not stop.wait(lease_seconds / 3):
+            try:
+                lease.renew()
+            except Exception as e:
+                logger.error(f"Failed to renew run lock lease: {e}")
+
+    renewer = threading.Thread(target=renew, name="run-lock-renewal", daemon=True)
+    renewer.start()
+    logger.info(f"Acquired run lock {RUN_LOCK_BLOB_PATH}")
+    try:
+        yield lease
+    finally:
+        stop.set()
+        renewer.join()
+        try:
+            lease.release()
+        except Exception as e:
+            logger.warning(f"Failed to release run lock lease: {e}")
@@ -0,0 +1,291 @@
+"""
+Multi-month backfills: plan the whole range once, then work through one queue.
+
+Running process_games_for_months over a season re-reads the listing for each
+league/month as it goes and checks every page against the registry
+separately. A backfill instead:
+
+  1. loads the match registry once,
+  2. fetches every fixture listing in the range up front (concurrently, through
+     fetch_many's per-host limits),
+  3. dedupes match IDs across the whole range and against the registry,
+  4. queues the remaining (league, month) units in priority order and runs
+     them on the league worker pool, each committing its own output file and
+     registry deltas as in process_games.
+
+The plan and each finished unit are written to a checkpoint file, so a killed
+backfill resumes with the same queue and skips units already done. Listings
+that failed to fetch are retried on resume.
+
+Usage:
+    python -m core_function.backfill 2024-08 2025-05 [--leagues "English Premiership" ...]
+        [--checkpoint backfill.json] [--order size|oldest|newest] [--workers N] [--fresh]
+"""
+import os
+import json
+import logging
+import argparse
+import datetime
+import functools
+import threading
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+
+from .web_utils import fetch_many, make_soup
+from .azure_storage import run_lock
+from .match_registry import MatchRegistry
+from .match_checkpoint import compact_leftover_parts
+from .metrics import start_run, get_metrics, labelled, log_summary, write_metrics
+from .extract_game_data import extract_match_identifiers
+from .process_games import (
+    process_match_ids, run_unit, log_results, flush_registry, LEAGUE_MAX_WORKERS, LEAGUE_UNIT_TIMEOUT,
+)
+from .models import leagues as ALL_LEAGUES
+
+logger = logging.getLogger()
+
+BACKFILL_CHECKPOINT_PATH = os.environ.get("BACKFILL_CHECKPOINT_PATH", "backfill_checkpoint.json")
+CHECKPOINT_VERSION = 1
+
+# Queue orders. "size" puts the largest units first, so the worker pool
+# doesn't finish on one long unit while the others sit idle.
+ORDERS = ("size", "oldest", "newest")
+
+# Units in these states don't need running again on resume. A re-run can't fix
+# aggregates_failed (its matches are already registered); its
+# aggregates_pending matches are replayed with core_function.aggregate_store
+DONE_STATUSES = ("ok", "no_new_matches", "aggregates_failed")
+
+
+def month_range(start, end):
+    """Every YYYY-MM from start to end inclusive."""
+    year, month = map(int, start.split("-"))
+    end_year, end_month = map(int, end.split("-"))
+    months = []
+    while (year, month) <= (end_year, end_month):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def listing_url(league_url, month):
+    return f"{league_url}/{month}?filter=results"
+
+
+def fetch_listings(units, league_urls):
+    """
+    {(league, month): [match ids]} for each unit, with None where the listing
+    couldn't be fetched. Listings are fetched concurrently and parsed as they arrive.
+    """
+    metrics = get_metrics()
+    listings = {}
+    with closing(fetch_many(listing_url(league_urls[league], month) for league, month in units)) as fetched:
+        for league, month in units:
+            with labelled(league=league, month=month):
+                with metrics.span("listing_fetch_wait"):
+                    html, ok = next(fetched)
+                if not ok:
+                    logger.error(f"Failed to fetch league data: {listing_url(league_urls[league], month)}")
+                    listings[(league, month)] = None
+                    continue
+                with metrics.span("listing_parse"):
+                    listings[(league, month)] = extract_match_identifiers(make_soup(html))
+    return listings
+
+
+def plan_backfill(listings, registry, order="size", seen=None):
+    """
+    Turns listings into a work queue of {"league", "month", "match_ids"} units.
+
+    A match ID is queued once across the whole range (the first listing it
+    appears in, oldest month first) and only if the registry doesn't have it.
+    `seen` carries IDs already queued by an earlier plan of the same backfill.
+    """
+    if order not in ORDERS:
+        raise ValueError(f"Unknown backfill order: {order}")
+    seen = set() if seen is None else seen
+    queue = []
+    listed = known = duplicates = 0
+    for (league, month), match_ids in sorted(listings.items(), key=lambda item: (item[0][1], item[0][0])):
+        if match_ids is None:
+            continue
+        pending = []
+        for match_id in match_ids:
+            listed += 1
+            if match_id in registry:
+                known += 1
+            elif match_id in seen:
+                duplicates += 1
+            else:
+                seen.add(match_id)
+                pending.append(match_id)
+        if pending:
+            queue.append({"league": league, "month": month, "match_ids": pending})
+
+    if order == "size":
+        queue.sort(key=lambda unit: len(unit["match_ids"]), reverse=True)
+    elif order == "newest":
+        queue.reverse()
+
+    logger.info(
+        f"Backfill plan: {listed} listed, {known} already in the registry, {duplicates} duplicate(s), "
+        f"{sum(len(u['match_ids']) for u in queue)} match(es) queued in {len(queue)} unit(s)"
+    )
+    return queue
+
+
+def _unit_key(league, month):
+    return f"{league}|{month}"
+
+
+class Checkpoint:
+    """The backfill plan and finished units, rewritten (atomically) after every unit."""
+
+    def __init__(self, path, state):
+        self.path = path
+        self.state = state
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load_or_create(cls, path, start, end, league_names, fresh=False):
+        if os.path.exists(path) and not fresh:
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            if (state.get("start"), state.get("end"), state.get("leagues")) != (start, end, league_names):
+                raise ValueError(
+                    f"Checkpoint {path} is for {state.get('start')}..{state.get('end')} "
+                    f"{state.get('leagues')}; use --fresh or another --checkpoint"
+                )
+            logger.info(f"Resuming backfill from {path}: {len(state['done'])} unit(s) finished")
+            return cls(path, state)
+        return cls(path, {
+            "version": CHECKPOINT_VERSION,
+            "start": start,
+            "end": end,
+            "leagues": league_names,
+            "created_at": datetime.datetime.utcnow().isoformat(timespec="seconds"),
+            "queue": None,
+            "listing_failures": [],
+            "done": {},
+        })
+
+    def save(self):
+        with self._lock:
+            text = json.dumps(self.state, indent=2)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, self.path)
+
+    def is_done(self, unit):
+        result = self.state["done"].get(_unit_key(unit["league"], unit["month"]))
+        return bool(result) and result["status"] in DONE_STATUSES
+
+    def record(self, result):
+        with self._lock:
+            self.state["done"][_unit_key(result["league"], result["month"])] = result
+        self.save()
+
+
+def _plan(checkpoint, registry, league_urls, months, order):
+    """Builds the queue on a fresh checkpoint, or retries failed listings on resume."""
+    state = checkpoint.state
+    if state["queue"] is None:
+        units = [(league, month) for month in months for league in league_urls]
+        seen = set()
+    else:
+        units = [tuple(unit) for unit in state["listing_failures"]]
+        seen = {match_id for unit in state["queue"] for match_id in unit["match_ids"]}
+        if units:
+            logger.info(f"Retrying {len(units)} fixture listing(s) that failed last time")
+
+    listings = fetch_listings(units, league_urls) if units else {}
+    queue = plan_backfill(listings, registry, order, seen)
+    state["queue"] = (state["queue"] or []) + queue
+    state["listing_failures"] = [list(unit) for unit, ids in listings.items() if ids is None]
+    checkpoint.save()
+
+
+def run_backfill(start, end, league_names=None, checkpoint_path=BACKFILL_CHECKPOINT_PATH, order="size",
+                 max_workers=LEAGUE_MAX_WORKERS, unit_timeout=LEAGUE_UNIT_TIMEOUT, fresh=False):
+    """
+    Backfills every listed match from `start` to `end` (YYYY-MM, inclusive) for
+    `league_names` (default: all leagues in models.leagues). Returns the result rows.
+    """
+    league_names = list(league_names or ALL_LEAGUES)
+    unknown = [name for name in league_names if name not in ALL_LEAGUES]
+    if unknown:
+        raise ValueError(f"Unknown league(s): {', '.join(unknown)}")
+    league_urls = {name: ALL_LEAGUES[name] for name in league_names}
+    checkpoint = Checkpoint.load_or_create(checkpoint_path, start, end, league_names, fresh)
+
+    with run_lock():
+        metrics = start_run()
+        try:
+            # One registry snapshot for planning and for every unit
+            registry = MatchRegistry()
+            with metrics.span("registry_load"):
+                if not registry.load():
+                    return []
+            with metrics.span("compact_leftover_parts"):
+                compact_leftover_parts(registry)
+
+            _plan(checkpoint, registry, league_urls, month_range(start, end), order)
+
+            todo = [unit for unit in checkpoint.state["queue"] if not checkpoint.is_done(unit)]
+            logger.info(f"Backfill: {len(todo)} of {len(checkpoint.state['queue'])} unit(s) to run")
+
+            def work(unit, deadline, result):
+                # Anything committed before a kill is in the registry by now
+                pending = [m for m in unit["match_ids"] if m not in registry]
+                result["listed"] = len(unit["match_ids"])
+                process_match_ids(metrics, registry, unit["league"], unit["month"], pending, deadline, result)
+
+            def run_and_record(unit):
+                result = run_unit(metrics, unit["league"], unit["month"], unit_timeout, functools.partial(work, unit))
+                checkpoint.record(result)
+                return result
+
+            with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="backfill") as executor:
+                results = list(executor.map(run_and_record, todo))
+
+            flush_registry(metrics, registry, results)
+            with metrics.span("registry_compact"):
+                registry.compact_if_needed()
+
+            log_results(results)
+            if checkpoint.state["listing_failures"]:
+                logger.warning(
+                    f"{len(checkpoint.state['listing_failures'])} fixture listing(s) failed; "
+                    f"re-run with the same checkpoint to retry them"
+                )
+            return results
+        finally:
+            log_summary(metrics)
+            write_metrics(metrics)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill match data for a range of months.")
+    parser.add_argument("start", help="First month, YYYY-MM")
+    parser.add_argument("end", help="Last month, YYYY-MM (inclusive)")
+    parser.add_argument("--leagues", nargs="+", help="League names from models.leagues (default: all)")
+    parser.add_argument("--checkpoint", default=BACKFILL_CHECKPOINT_PATH, help="Checkpoint file to create or resume")
+    parser.add_argument("--order", choices=ORDERS, default="size", help="Queue priority")
+    parser.add_argument("--workers", type=int, default=LEAGUE_MAX_WORKERS, help="Units run at once")
+    parser.add_argument("--unit-timeout", type=float, default=LEAGUE_UNIT_TIMEOUT, help="Seconds per unit")
+    parser.add_argument("--fresh", action="store_true", help="Ignore an existing checkpoint and plan again")
+    args = parser.parse_args(argv)
+
+    results = run_backfill(args.start, args.end, args.leagues, args.checkpoint, args.order,
+                           args.workers, args.unit_timeout, args.fresh)
+    failed = [
+        r for r in results
+        if r["status"] not in DONE_STATUSES or r.get("aggregates_pending") or r.get("unrecorded")
+    ]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    raise SystemExit(main())
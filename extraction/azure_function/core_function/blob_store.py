@@ -0,0 +1,478 @@
+"""
+Blob storage backends behind azure_storage.
+
+All blob I/O goes through a BlobStore. Its primitives are coroutines, run on a
+single event loop in a background thread, so the synchronous callers (the
+league worker threads, the registry, the run lock) share one pool of
+connections, and bulk operations (get_many / delete_many, and the block
+uploads of a streamed file) run side by side instead of one round trip at a
+time. STORAGE_MAX_CONCURRENCY bounds the blob operations in flight for one
+call; BLOB_TRANSFER_CONCURRENCY is the max_concurrency of a single chunked
+download and the number of blocks one upload stages at once.
+
+STORAGE_BACKEND picks the store:
+  azure  - azure.storage.blob.aio, from AZURE_STORAGE_CONNECTION_STRING (e.g.
+           Azurite's "UseDevelopmentStorage=true") or AZURE_STORAGE_ACCOUNT_URL
+           (or AZURE_STORAGE_ACCOUNT_NAME) and AZURE_STORAGE_ACCOUNT_KEY (default)
+  local  - files under STORAGE_LOCAL_ROOT/<container>/, for tests and local runs
+
+The loader (loader/raw_json_loader.py) uses this module too, through
+create_store(); it has no imports from the rest of core_function, so the
+loader image copies it on its own.
+
+Both raise the azure.core exceptions azure_storage expects
+(ResourceNotFoundError, ResourceExistsError, ResourceModifiedError).
+
+The azure SDK (and aiohttp under it) is imported when the first store is
+created, not with this module, and get_store() keeps that store for the life
+of the worker process, so warm invocations reuse its connections. close_store()
+closes it (the aio client's session, then the loop); get_store() registers it
+with atexit, so the worker doesn't exit with the session and connector open.
+"""
+import os
+import atexit
+import uuid
+import base64
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "azure")
+STORAGE_LOCAL_ROOT = os.environ.get("STORAGE_LOCAL_ROOT", ".blob_store")
+STORAGE_MAX_CONCURRENCY = int(os.environ.get("STORAGE_MAX_CONCURRENCY", "16"))
+BLOB_TRANSFER_CONCURRENCY = int(os.environ.get("BLOB_TRANSFER_CONCURRENCY", "4"))
+CONTAINER_NAME = os.environ.get("AZURE_CONTAINER_NAME", "raw")
+
+
+class _LoopThread:
+    """An event loop running forever in a daemon thread."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="blob-store", daemon=True)
+        self._thread.start()
+
+    def submit(self, coro):
+        """Schedules `coro` on the loop; returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def close(self, timeout=5):
+        """Stops the loop, waits for its thread and closes it."""
+        if self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            self.loop.close()
+
+
+class Lease:
+    """Synchronous handle on a blob lease held through a BlobStore."""
+
+    def __init__(self, store, handle):
+        self._store = store
+        self._handle = handle
+
+    def renew(self):
+        self._store.run(self._store._renew_lease(self._handle))
+
+    def release(self):
+        self._store.run(self._store._release_lease(self._handle))
+
+
+class BlobStore:
+    """
+    Synchronous facade over a backend's async primitives. Subclasses implement
+    _get, _put, _list, _delete, _stage_block, _commit_blocks and the lease
+    coroutines; everything else is shared.
+    """
+
+    def __init__(self, container=CONTAINER_NAME, max_concurrency=STORAGE_MAX_CONCURRENCY,
+                 transfer_concurrency=BLOB_TRANSFER_CONCURRENCY):
+        self.container = container
+        self.max_concurrency = max(1, max_concurrency)
+        self.transfer_concurrency = max(1, transfer_concurrency)
+        self._runner = _LoopThread()
+
+    def submit(self, coro):
+        return self._runner.submit(coro)
+
+    def run(self, coro):
+        return self.submit(coro).result()
+
+    def close(self):
+        """Closes the backend's connections and stops the loop; the store can't be used after."""
+        if self._runner.loop.is_closed():
+            return
+        try:
+            self.run(self._close())
+        except Exception as e:
+            logger.warning(f"Failed to close the blob store cleanly: {e}")
+        finally:
+            self._runner.close()
+
+    async def _close(self):
+        pass
+
+    # ---- single blobs ----
+
+    def get(self, path):
+        """(bytes, etag) of a blob; ResourceNotFoundError if it doesn't exist."""
+        return self.run(self._get(path))
+
+    def put(self, path, data, content_type=None, etag=None, if_missing=False):
+        """
+        Writes `data` and returns the new etag. With `etag`, only if the blob is
+        unchanged (ResourceModifiedError otherwise); with `if_missing`, only if
+        it doesn't exist yet (ResourceExistsError otherwise).
+        """
+        return self.run(self._put(path, data, content_type, etag, if_missing))
+
+    def list(self, prefix):
+        return self.run(self._list(prefix))
+
+    def list_properties(self, prefix):
+        """[{"name", "etag", "last_modified"}] for every blob under `prefix`, by name."""
+        return self.run(self._list_properties(prefix))
+
+    def get_future(self, path):
+        """Starts get(path) on the loop; returns a concurrent.futures.Future of (bytes, etag)."""
+        return self.submit(self._get(path))
+
+    def delete(self, path):
+        """Deletes a blob; a missing blob is not an error."""
+        self.run(self._delete(path))
+
+    def acquire_lease(self, path, lease_seconds):
+        """A Lease on `path`; ResourceExistsError (status 409) while someone else holds it."""
+        return Lease(self, self.run(self._acquire_lease(path, lease_seconds)))
+
+    # ---- many blobs at once ----
+
+    async def _bounded(self, fn, items):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def one(item):
+            async with semaphore:
+                try:
+                    return await fn(item)
+                except Exception as e:
+                    return e
+
+        return await asyncio.gather(*(one(item) for item in items))
+
+    def get_many(self, paths):
+        """
+        [(bytes, etag) or the exception raised] for each path, in order,
+        with up to max_concurrency downloads in flight.
+        """
+        return self.run(self._bounded(self._get, list(paths)))
+
+    def delete_many(self, paths):
+        """Deletes the blobs concurrently; returns [None or the exception raised] in order."""
+        return self.run(self._bounded(self._delete, list(paths)))
+
+    # ---- streamed uploads ----
+
+    def block_writer(self, path, content_type=None):
+        return BlockWriter(self, path, content_type)
+
+
+class BlockWriter:
+    """
+    Stages blocks of one blob without waiting on each: up to the store's
+    transfer_concurrency stage_block calls are in flight, and commit() waits
+    for them before committing the block list in order.
+    """
+
+    def __init__(self, store, path, content_type=None):
+        self._store = store
+        self._path = path
+        self._content_type = content_type
+        self._prefix = uuid.uuid4().hex
+        self._block_ids = []
+        self._in_flight = []
+
+    def stage(self, data):
+        block_id = f"{self._prefix}-{len(self._block_ids):06d}"
+        self._block_ids.append(block_id)
+        if len(self._in_flight) >= self._store.transfer_concurrency:
+            self._in_flight.pop(0).result()
+        self._in_flight.append(self._store.submit(self._store._stage_block(self._path, block_id, data)))
+
+    def commit(self):
+        for future in self._in_flight:
+            future.result()
+        self._in_flight = []
+        self._store.run(self._store._commit_blocks(self._path, self._block_ids, self._content_type))
+
+
+class AzureBlobStore(BlobStore):
+    """azure.storage.blob.aio, with one service client on the store's loop."""
+
+    def __init__(self, connection_string=None, account_url=None, account_key=None, **kwargs):
+        super().__init__(**kwargs)
+        self._connection_string = connection_string
+        self._account_url = account_url
+        self._account_key = account_key
+        self._service = None
+
+    def _client(self):
+        # Created lazily, on the loop thread the aio client belongs to
+        if self._service is None:
+            from azure.storage.blob.aio import BlobServiceClient
+            if self._connection_string:
+                self._service = BlobServiceClient.from_connection_string(self._connection_string)
+            else:
+                self._service = BlobServiceClient(account_url=self._account_url, credential=self._account_key)
+        return self._service
+
+    def _blob(self, path):
+        return self._client().get_blob_client(container=self.container, blob=path)
+
+    async def _close(self):
+        # Closes the client's aiohttp session along with its connector
+        if self._service is not None:
+            service, self._service = self._service, None
+            await service.close()
+
+    async def _get(self, path):
+        downloader = await self._blob(path).download_blob(max_concurrency=self.transfer_concurrency)
+        return await downloader.readall(), downloader.properties.etag
+
+    async def _put(self, path, data, content_type, etag, if_missing):
+        from azure.core import MatchConditions
+        from azure.storage.blob import ContentSettings
+
+        kwargs = {"max_concurrency": self.transfer_concurrency}
+        if content_type:
+            kwargs["content_settings"] = ContentSettings(content_type=content_type)
+        if etag:
+            kwargs.update(etag=etag, match_condition=MatchConditions.IfNotModified)
+        result = await self._blob(path).upload_blob(data, overwrite=not if_missing, **kwargs)
+        return result.get("etag")
+
+    async def _list(self, prefix):
+        container = self._client().get_container_client(self.container)
+        return [blob.name async for blob in container.list_blobs(name_starts_with=prefix)]
+
+    async def _list_properties(self, prefix):
+        container = self._client().get_container_client(self.container)
+        return [
+            {"name": blob.name, "etag": blob.etag, "last_modified": blob.last_modified}
+            async for blob in container.list_blobs(name_starts_with=prefix)
+        ]
+
+    async def _delete(self, path):
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            await self._blob(path).delete_blob()
+        except ResourceNotFoundError:
+            pass
+
+    async def _stage_block(self, path, block_id, data):
+        await self._blob(path).stage_block(block_id=_b64(block_id), data=data)
+
+    async def _commit_blocks(self, path, block_ids, content_type):
+        from azure.storage.blob import BlobBlock, ContentSettings
+
+        await self._blob(path).commit_block_list(
+            [BlobBlock(block_id=_b64(block_id)) for block_id in block_ids],
+            content_settings=ContentSettings(content_type=content_type) if content_type else None,
+        )
+
+    async def _acquire_lease(self, path, lease_seconds):
+        return await self._blob(path).acquire_lease(lease_duration=lease_seconds)
+
+    async def _renew_lease(self, lease):
+        await lease.renew()
+
+    async def _release_lease(self, lease):
+        await lease.release()
+
+
+def _b64(block_id):
+    return base64.b64encode(block_id.encode()).decode()
+
+
+class LocalBlobStore(BlobStore):
+    """
+    Blobs as files under root/<container>/. Etags, conditional writes, staged
+    blocks and leases behave like Azure's within one process. File operations
+    run on the loop thread, which also makes each conditional write atomic.
+    Etags are content hashes: an mtime has too coarse a granularity to tell two
+    quick writes of the same size apart.
+    """
+
+    def __init__(self, root=STORAGE_LOCAL_ROOT, **kwargs):
+        super().__init__(**kwargs)
+        self.root = os.path.join(root, self.container)
+        self._blocks_root = os.path.join(root, ".blocks", self.container)
+        self._leases = {}   # path -> (lease id, expires at)
+
+    def _file(self, path):
+        return os.path.join(self.root, *path.split("/"))
+
+    @staticmethod
+    def _etag(data):
+        return f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+
+    def _file_etag(self, file_path):
+        with open(file_path, "rb") as f:
+            return self._etag(f.read())
+
+    async def _get(self, path):
+        from azure.core.exceptions import ResourceNotFoundError
+
+        file_path = self._file(path)
+        try:
+            with open(file_path, "rb") as f:
+                data = f.read()
+            return data, self._etag(data)
+        except FileNotFoundError:
+            raise ResourceNotFoundError(f"The specified blob does not exist: {path}")
+
+    def _write(self, path, data):
+        file_path = self._file(path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp = f"{file_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, file_path)
+        return self._etag(data)
+
+    async def _put(self, path, data, content_type, etag, if_missing):
+        from azure.core.exceptions import ResourceExistsError, ResourceModifiedError
+
+        file_path = self._file(path)
+        exists = os.path.exists(file_path)
+        if if_missing and exists:
+            raise ResourceExistsError(f"The specified blob already exists: {path}")
+        if etag and (not exists or self._file_etag(file_path) != etag):
+            raise ResourceModifiedError(f"The condition specified using HTTP conditional header(s) is not met: {path}")
+        return self._write(path, bytes(data))
+
+    async def _list(self, prefix):
+        names = []
+        for directory, _dirs, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                blob_name = os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, "/")
+                if blob_name.startswith(prefix):
+                    names.append(blob_name)
+        return sorted(names)
+
+    async def _list_properties(self, prefix):
+        from datetime import datetime, timezone
+
+        blobs = []
+        for name in await self._list(prefix):
+            file_path = self._file(name)
+            blobs.append({
+                "name": name,
+                "etag": self._file_etag(file_path),
+                "last_modified": datetime.fromtimestamp(os.stat(file_path).st_mtime, timezone.utc),
+            })
+        return blobs
+
+    async def _delete(self, path):
+        try:
+            os.remove(self._file(path))
+        except FileNotFoundError:
+            pass
+
+    def _block_dir(self, path):
+        return os.path.join(self._blocks_root, hashlib.sha1(path.encode()).hexdigest())
+
+    async def _stage_block(self, path, block_id, data):
+        directory = self._block_dir(path)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, block_id), "wb") as f:
+            f.write(data)
+
+    async def _commit_blocks(self, path, block_ids, content_type):
+        directory = self._block_dir(path)
+        data = bytearray()
+        for block_id in block_ids:
+            with open(os.path.join(directory, block_id), "rb") as f:
+                data += f.read()
+        self._write(path, bytes(data))
+        for block_id in block_ids:
+            os.remove(os.path.join(directory, block_id))
+
+    async def _acquire_lease(self, path, lease_seconds):
+        from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+
+        if not os.path.exists(self._file(path)):
+            raise ResourceNotFoundError(f"The specified blob does not exist: {path}")
+        held = self._leases.get(path)
+        if held and held[1] > time.monotonic():
+            error = ResourceExistsError(f"There is already a lease present: {path}")
+            error.status_code = 409
+            raise error
+        lease_id = uuid.uuid4().hex
+        self._leases[path] = (lease_id, time.monotonic() + lease_seconds)
+        return (path, lease_id, lease_seconds)
+
+    async def _renew_lease(self, lease):
+        path, lease_id, lease_seconds = lease
+        if self._leases.get(path, (None,))[0] == lease_id:
+            self._leases[path] = (lease_id, time.monotonic() + lease_seconds)
+
+    async def _release_lease(self, lease):
+        path, lease_id, _ = lease
+        if self._leases.get(path, (None,))[0] == lease_id:
+            del self._leases[path]
+
+
+def create_store(container=CONTAINER_NAME):
+    """A new BlobStore for STORAGE_BACKEND on `container`; the caller closes it."""
+    if STORAGE_BACKEND == "local":
+        logger.info(f"Using local blob store under {os.path.abspath(STORAGE_LOCAL_ROOT)}")
+        return LocalBlobStore(container=container)
+    if STORAGE_BACKEND == "azure":
+        connection_string = os.environ.get("AZURE_STORAGE_CONNECTION_STRING")
+        account_url = os.environ.get("AZURE_STORAGE_ACCOUNT_URL")
+        account_name = os.environ.get("AZURE_STORAGE_ACCOUNT_NAME")
+        account_key = os.environ.get("AZURE_STORAGE_ACCOUNT_KEY")
+        if not account_url and account_name:
+            account_url = f"https://{account_name}.blob.core.windows.net"
+        if not (connection_string or (account_url and account_key)):
+            raise RuntimeError(
+                "Set AZURE_STORAGE_CONNECTION_STRING, or AZURE_STORAGE_ACCOUNT_URL (or _NAME) and "
+                "AZURE_STORAGE_ACCOUNT_KEY (or STORAGE_BACKEND=local)"
+            )
+        return AzureBlobStore(connection_string, account_url, account_key, container=container)
+    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """The process-wide BlobStore for STORAGE_BACKEND, created on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = create_store()
+            atexit.register(close_store)
+        return _store
+
+
+def close_store():
+    """Closes the process-wide store, if one was created; the next get_store() makes a new one."""
+    global _store
+    with _store_lock:
+        store, _store = _store, None
+    if store is not None:
+        store.close()
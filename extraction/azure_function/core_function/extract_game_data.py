@@ -1,6 +1,9 @@
-import re
 import unicodedata
-from .extract_player import generate_player_dictionaries
+from .extract_player import generate_team_sheets
+from .match_model import Match
+from .metrics import timed
+from .markup import active_markup, class_regex, HIDDEN_GOAL_MINUTES_RE
+from .page_index import build_page_index, first
 import logging
 logger = logging.getLogger()
 # ----------------------------------------------
@@ -17,6 +20,11 @@ def clean_text(text):
 # ----------------------------------------------
 #  1. core_function Data Extraction Functions
 # ----------------------------------------------
+# Match-page getters read from a page index (see page_index.py). GetGameData
+# builds the index once and shares it; called on their own they build one.
+
+def _index_for(soup, page_index):
+    return page_index if page_index is not None else build_page_index(soup)
 
 
 def extract_match_identifiers(soup_object):
@@ -36,17 +44,17 @@ def extract_match_identifiers(soup_object):
 
 
 
-def get_match_played_on_date(soup):
+def get_match_played_on_date(soup, page_index=None):
     """Extract the match played-on date."""
-    played_on = soup.find('time', class_='ssrcss-1hjuztf-Date ejf0oom1')
+    played_on = first(_index_for(soup, page_index), "played_on")
     return clean_text(played_on.text) if played_on else None
 
 
-def get_venue(soup):
+def get_venue(soup, page_index=None):
     """Extract the match venue."""
     try:
-        # Find any div whose class name ends with 'Venue'
-        venue_element = soup.find('div', class_=re.compile(r'Venue$'))
+        # First div whose class name ends with 'Venue'
+        venue_element = first(_index_for(soup, page_index), "venue")
         if not venue_element:
             return None
 
@@ -61,65 +69,57 @@ def get_venue(soup):
         return None
 
 
-def get_attendance(soup):
+def get_attendance(soup, page_index=None):
     """Extract attendance numbers from the match."""
-    attendance_element = soup.find('div', class_='ssrcss-13d7g0c-AttendanceValue')
+    attendance_element = first(_index_for(soup, page_index), "attendance")
     return clean_text(attendance_element.text.split("Attendance:")[-1].strip()) if attendance_element else None
 
 
-def get_home_team_name(soup):
+def get_home_team_name(soup, page_index=None):
     """Extracts the home team's name, handling missing elements safely."""
-    home_team_container = soup.find('div', class_='ssrcss-bon2fo-WithInlineFallback-TeamHome')
+    home_team_container = first(_index_for(soup, page_index), "home_team")
 
     # Check if the container exists
     if home_team_container:
-        home_team_name = home_team_container.find('span', class_='ssrcss-1p14tic-DesktopValue')
+        home_team_name = home_team_container.find('span', class_=active_markup().team_name_class)
         if home_team_name:
             return home_team_name.text  # Keep the original extraction logic
 
     return None
 
 
-def get_home_score(soup):
+def get_home_score(soup, page_index=None):
     """Extract home team's score."""
-    home_score_element = soup.find('div', class_='ssrcss-qsbptj-HomeScore')
+    home_score_element = first(_index_for(soup, page_index), "home_score")
 
     return clean_text(home_score_element.text) if home_score_element else None
 
-def get_away_score(soup):
+def get_away_score(soup, page_index=None):
     """Extract away team's score."""
-    away_score_element = soup.find('div', class_='ssrcss-fri5a2-AwayScore')
+    away_score_element = first(_index_for(soup, page_index), "away_score")
     return clean_text(away_score_element.text) if away_score_element else None
 
 
-def get_away_team_name(soup):
+def get_away_team_name(soup, page_index=None):
     """Extract the away team name."""
-    away_team_container = soup.find('div', class_='ssrcss-nvj22c-WithInlineFallback-TeamAway')
+    away_team_container = first(_index_for(soup, page_index), "away_team")
     if away_team_container:
-        away_team_name = away_team_container.find('span', class_='ssrcss-1p14tic-DesktopValue')
+        away_team_name = away_team_container.find('span', class_=active_markup().team_name_class)
         if away_team_name:
             return away_team_name.text  # Keep the original extraction logic
 
     return None
 
 
-
-
-HOME_POSSESSION_CLASS = "ssrcss-wtr58o-Value emwj40c0"
-AWAY_POSSESSION_CLASS = "ssrcss-1exmi76-Value emwj40c0"
-
-def get_possession(soup):
+def get_possession(soup, page_index=None):
     """Extract possession statistics."""
     try:
-        all_values = soup.find_all(
-            "div",
-            class_=[HOME_POSSESSION_CLASS, AWAY_POSSESSION_CLASS],
-        )
+        all_values = _index_for(soup, page_index).get("possession", [])
 
         if len(all_values) < 2:
             logger.warning(
-                f"Expected 2 possession values, found {len(all_values)}. "
-                f"Classes used: {HOME_POSSESSION_CLASS}, {AWAY_POSSESSION_CLASS}"
+                "Expected 2 possession values, found %d. Classes used: %s",
+                len(all_values), ", ".join(active_markup().classes_for("possession")),
             )
             return None, None
 
@@ -139,12 +139,12 @@ def get_possession(soup):
 def extract_goal_events(soup, event_type_class):
     """Extract goal events for home and away teams."""
     goals_data = {}
-    key_events_div = soup.find('div', class_=re.compile(f".*{event_type_class}.*"))
+    key_events_div = soup.find('div', class_=class_regex(event_type_class))
 
     if not key_events_div:
         return goals_data
 
-    event_items = key_events_div.find_all('li', class_=re.compile(".*StyledAction.*"))
+    event_items = key_events_div.find_all('li', class_=class_regex("StyledAction"))
 
     for item in event_items:
         player_span = item.find('span', role='text')
@@ -157,7 +157,7 @@ def extract_goal_events(soup, event_type_class):
         if hidden_span:
             hidden_text = hidden_span.get_text(separator=', ', strip=True)
             if "Goal" in hidden_text:
-                goal_times = re.findall(r'(\d+)(?: minutes(?: plus (\d+))?)?', hidden_text)
+                goal_times = HIDDEN_GOAL_MINUTES_RE.findall(hidden_text)
                 goals_data[player_name] = [f"{minute}' +{extra}" if extra else f"{minute}'" for minute, extra in
                                            goal_times]
 
@@ -166,7 +166,7 @@ def extract_goal_events(soup, event_type_class):
 
 def extract_players_and_assists(soup, searchString):
     """Extract assists and associated times from the match report."""
-    container = soup.find('div', class_=re.compile(searchString))
+    container = soup.find('div', class_=class_regex(searchString))
     if not container:
         return {}
 
@@ -191,13 +191,13 @@ def extract_players_and_assists(soup, searchString):
 
     return player_data
 
-def get_formations(soup):
+def get_formations(soup, page_index=None):
     """
     Returns (home_formation, away_formation) or (None, None) if not found.
     """
     try:
-        # Find all elements that hold the formation text
-        formation_elems = soup.find_all(class_=re.compile(r'TeamDetailsValue-FormationValue'))
+        # All elements that hold the formation text
+        formation_elems = _index_for(soup, page_index).get("formations", [])
 
         home_form = formation_elems[0].get_text(strip=True) if len(formation_elems) > 0 else None
         away_form = formation_elems[1].get_text(strip=True) if len(formation_elems) > 1 else None
@@ -212,35 +212,38 @@ def _extract_manager_from_details(details_block):
     if not details_block:
         return None
 
+    markup = active_markup()
     # Each detail row
-    rows = details_block.find_all(class_=re.compile(r'Detail'))
+    rows = details_block.find_all(class_=markup.team_details_row)
     for row in rows:
-        label = row.find(class_=re.compile(r'TeamDetailsLabel'))
+        label = row.find(class_=markup.team_details_label)
         if not label:
             continue
         if "Manager" in label.get_text(strip=True):
-            value = row.find(class_=re.compile(r'TeamDetailsValue'))
+            value = row.find(class_=markup.team_details_value)
             if value:
                 return clean_text(value.get_text(strip=True))
     return None
 
 
-def get_managers(soup):
+def get_managers(soup, page_index=None):
     """
     Returns [home_manager, away_manager] using stable BBC data-testid hooks.
     """
     try:
-        def extract_manager(testid: str):
-            node = soup.find(attrs={"data-testid": testid})
+        page_index = _index_for(soup, page_index)
+
+        def extract_manager(field: str):
+            node = first(page_index, field)
             if not node:
                 return None
 
             # manager name is in the value span
-            value = node.find(class_=re.compile(r"TeamDetailsValue"))
+            value = node.find(class_=active_markup().team_details_value)
             return clean_text(value.get_text(strip=True)) if value else clean_text(node.get_text(strip=True))
 
-        home_manager = extract_manager("match-lineups-home-manager")
-        away_manager = extract_manager("match-lineups-away-manager")
+        home_manager = extract_manager("home_manager")
+        away_manager = extract_manager("away_manager")
 
         return [home_manager, away_manager]
 
@@ -251,41 +254,45 @@ def get_managers(soup):
 # ----------------------------------------------
 # 3. Master Function: GetGameData
 # ----------------------------------------------
+@timed("extract")
 def GetGameData(soup,league,bbcKey):
     """Extracts all key match details from the given BeautifulSoup object, including players."""
     if not soup:
         return {"error": "Invalid Soup Object"}
 
-    home_possession, away_possession = get_possession(soup)
-    home_formation, away_formation = get_formations(soup)
-    home_manager, away_manager = get_managers(soup)
+    return extract_match(soup, league, bbcKey).to_json()
 
-    # Extract players (this includes lineup, subs, goals, and assists)
-    player_data = generate_player_dictionaries(soup)
-
-    match_data = {
-        "match_id": bbcKey,
-        "played_on": get_match_played_on_date(soup),
-        "venue": get_venue(soup),
-        "attendance": get_attendance(soup),
-        "League_Name": league,
-        "home_team": {
-            "formation" : home_formation,
-            "manager": home_manager,
-            "name": get_home_team_name(soup),
-            "score": get_home_score(soup),
-            "possession": home_possession,
-            "players": player_data[0]  # Home team players with goals, assists, subs
-        },
-        "away_team": {
-            "formation": away_formation,
-            "manager": away_manager,
-            "name": get_away_team_name(soup),
-            "score": get_away_score(soup),
-            "possession": away_possession,
-            "players": player_data[1]  # Away team players with goals, assists, subs
-        }
-    }
-
-    return match_data
 
+def extract_match(soup, league, bbcKey):
+    """Same as GetGameData, but returns the Match model instead of the output dict."""
+    # One walk over the document; every getter below reads from this index
+    page_index = build_page_index(soup)
+
+    home_possession, away_possession = get_possession(soup, page_index)
+    home_formation, away_formation = get_formations(soup, page_index)
+    home_manager, away_manager = get_managers(soup, page_index)
+
+    # Extract players (this includes lineup, subs, goals, and assists)
+    home_team, away_team = generate_team_sheets(soup, page_index)
+
+    home_team.formation = home_formation
+    home_team.manager = home_manager
+    home_team.name = get_home_team_name(soup, page_index)
+    home_team.score = get_home_score(soup, page_index)
+    home_team.possession = home_possession
+
+    away_team.formation = away_formation
+    away_team.manager = away_manager
+    away_team.name = get_away_team_name(soup, page_index)
+    away_team.score = get_away_score(soup, page_index)
+    away_team.possession = away_possession
+
+    return Match(
+        match_id=bbcKey,
+        played_on=get_match_played_on_date(soup, page_index),
+        venue=get_venue(soup, page_index),
+        attendance=get_attendance(soup, page_index),
+        league_name=league,
+        home_team=home_team,
+        away_team=away_team,
+    )
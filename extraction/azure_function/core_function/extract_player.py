@@ -1,71 +1,101 @@
 
-import re
+import os
 from typing import Any
 
 import unicodedata
 import logging
 
-# Setup logging configuration
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+from .page_index import build_page_index, first
+from .markup import (
+    active_markup, class_regex, ASSIST_RE, GOAL_DESC_RE, HIDDEN_GOAL_MINUTES_RE,
+    SUBSTITUTION_TEXT_RE, TIME_IN_TEXTBLOCK_RE,
+)
+from .match_model import Card, GoalEvent, PlayerAppearance, Substitution, TeamSheet
 
-def return_player_lists(soup):
+# Module logger; handlers and the root level are left to whoever runs us
+# (Azure Functions host, app.py, the CLIs). Detail is DEBUG, once per page.
+logger = logging.getLogger(__name__)
+
+# Quiet mode drops everything below ERROR from extraction, for batch
+# re-extraction where per-player warnings are noise
+EXTRACTION_QUIET = os.environ.get("EXTRACTION_QUIET", "").lower() in ("1", "true", "yes")
+
+
+def set_quiet(quiet=True):
+    """Turns extraction quiet mode on or off for this process."""
+    logger.setLevel(logging.ERROR if quiet else logging.NOTSET)
+
+
+set_quiet(EXTRACTION_QUIET)
+
+def return_player_lists(soup, page_index=None):
     """
     Returns [home_starters, home_subs, away_starters, away_subs]
     Assumes exactly:
       - 2 TeamPlayers sections (starters)
       - 2 SubstitutesSection sections (subs)
     """
-    logging.info("Entering function: return_player_lists")
 
-    root = soup.select_one('div[data-testid="styled-match-lineup"]')
+    if page_index is None:
+        page_index = build_page_index(soup)
+    markup = active_markup()
+    root = first(page_index, "lineup")
     if not root:
-        logging.error("styled-match-lineup not found")
+        logger.error("styled-match-lineup not found")
         return None
 
     main_section = root.find("section")
     if not main_section:
-        logging.error("Main lineup section not found")
+        logger.error("Main lineup section not found")
         return None
 
     # --- Starters ---
-    starters = main_section.select('section[class*="TeamPlayers"]')
+    starters = markup.select("starters_section", main_section)
     if len(starters) < 2:
-        logging.error(f"Expected 2 TeamPlayers (starters), found {len(starters)}")
+        logger.error("Expected 2 TeamPlayers (starters), found %d", len(starters))
         return None
 
-    home_starters_ul = starters[0].select_one('ul[data-testid="player-list"]')
-    away_starters_ul = starters[1].select_one('ul[data-testid="player-list"]')
+    home_starters_ul = markup.select_one("player_list", starters[0])
+    away_starters_ul = markup.select_one("player_list", starters[1])
 
     # --- Subs ---
-    subs_sections = main_section.select('section[class*="SubstitutesSection"]')
+    subs_sections = markup.select("subs_section", main_section)
     if len(subs_sections) < 2:
-        logging.error(f"Expected 2 SubstitutesSection (subs), found {len(subs_sections)}")
+        logger.error("Expected 2 SubstitutesSection (subs), found %d", len(subs_sections))
         return None
 
-    home_subs_ul = subs_sections[0].select_one('ul[data-testid="player-list"]')
-    away_subs_ul = subs_sections[1].select_one('ul[data-testid="player-list"]')
+    home_subs_ul = markup.select_one("player_list", subs_sections[0])
+    away_subs_ul = markup.select_one("player_list", subs_sections[1])
 
     if not all([home_starters_ul, home_subs_ul, away_starters_ul, away_subs_ul]):
-        logging.error("One or more player lists missing")
+        logger.error("One or more player lists missing")
         return None
 
     return [home_starters_ul, home_subs_ul, away_starters_ul, away_subs_ul]
 
 
 def clean_text(text):
-    logging.info("Entering function: clean_text")
     try:
         if text:
             text = unicodedata.normalize("NFKC", text).strip()
             return text.encode("utf-8").decode("utf-8")
         return None
     except Exception as e:
-        logging.error(f"Error in clean_text: {e}")
+        logger.error("Error in clean_text: %s", e)
         return None
 
 def player_extraction_from_list(player_items):
-    logging.info("Entering function: player_extraction_from_list")
     players_data = {}
+    # Compiled once per set; looked up here rather than per player
+    css = active_markup().css
+    player_name_css = css["player_name"]
+    captain_css = css["captain_marker"]
+    shirt_number_css = css["shirt_number"]
+    yellow_card_css = css["yellow_card"]
+    red_card_css = css["red_card"]
+    substitutions_css = css["substitutions"]
+    substitution_css = css["substitution"]
+    visible_text_css = css["visible_text"]
 
     try:
         for player_item in player_items:
@@ -75,16 +105,12 @@ def player_extraction_from_list(player_items):
             # ----------------------------
             #name_span = player_item.select_one('span[class*="PlayerName"]')
             #player_name = name_span.get_text(strip=True) if name_span else "Unknown"
-            name_span = player_item.select_one(
-                'span[class*="-PlayerName"]:not([class*="Wrapper"])'
-            )
+            name_span = player_name_css.select_one(player_item)
             player_name = name_span.get_text(strip=True) if name_span else "Unknown"
             # ----------------------------
             # 2. Captain detection (STRUCTURAL, SEPARATE)
             # ----------------------------
-            captain_marker = player_item.select_one(
-                'span[role="text"] > span[aria-hidden="true"]'
-            )
+            captain_marker = captain_css.select_one(player_item)
             is_captain = bool(
                 captain_marker and captain_marker.get_text(strip=True) == "(c)"
             )
@@ -92,9 +118,7 @@ def player_extraction_from_list(player_items):
             # ----------------------------
             # 3. Shirt number
             # ----------------------------
-            shirt_number_div = player_item.select_one(
-                'div[aria-hidden="true"][class*="ShirtNumber"]'
-            )
+            shirt_number_div = shirt_number_css.select_one(player_item)
             shirt_number = (
                 shirt_number_div.get_text(strip=True)
                 if shirt_number_div else "N/A"
@@ -103,34 +127,33 @@ def player_extraction_from_list(player_items):
             # ----------------------------
             # 4. Cards
             # ----------------------------
-            yellow_cards = []
-            red_cards = []
+            cards = []
 
-            for card in player_item.select('img[src*="yellowcard"]'):
+            for card in yellow_card_css.select(player_item):
                 minute = card.find_next('span', {'aria-hidden': 'true'})
                 if minute:
-                    yellow_cards.append(minute.get_text(strip=True))
+                    cards.append(Card("yellow", minute.get_text(strip=True)))
 
-            for card in player_item.select('img[src*="redcard"], img[src*="second-yellow-card"]'):
+            for card in red_card_css.select(player_item):
                 minute = card.find_next('span', {'aria-hidden': 'true'})
                 if minute:
-                    red_cards.append(minute.get_text(strip=True))
+                    cards.append(Card("red", minute.get_text(strip=True)))
 
             # ----------------------------
             # 5. Substitutions
             # ----------------------------
             substitutions = []
-            sub_container = player_item.select_one('span[class*="PlayerSubstitutes"]')
+            sub_container = substitutions_css.select_one(player_item)
 
             if sub_container:
-                for wrapper in sub_container.select('span[class*="Wrapper"]'):
-                    visible = wrapper.select_one('span[aria-hidden="true"]')
+                for wrapper in substitution_css.select(sub_container):
+                    visible = visible_text_css.select_one(wrapper)
                     sub_text = (
                         visible.get_text(" ", strip=True)
                         if visible else wrapper.get_text(" ", strip=True)
                     )
 
-                    match = re.search(r"(.+?)\s+(\d+'(?:\+\d+)?)$", sub_text)
+                    match = SUBSTITUTION_TEXT_RE.search(sub_text)
                     if match:
                         replaced_by = match.group(1).strip()
                         raw_time = match.group(2).replace("'", "")
@@ -141,81 +164,70 @@ def player_extraction_from_list(player_items):
                             base = raw_time.split("+", 1)[0]
                             sub_time = int(base) if base.isdigit() else 0
 
-                        substitutions.append({
-                            "playerName": player_name,
-                            "WasSubstituted": True,
-                            "SubstitutionTime": sub_time,
-                            "ReplacedBy": replaced_by
-                        })
+                        substitutions.append(Substitution(player_name, sub_time, replaced_by))
 
             # ----------------------------
             # 6. Store player (KEYED BY NAME – as per your current design)
             # ----------------------------
-            players_data[player_name] = {
-                "substitutions_info": substitutions,
-                "RedCardMinutes": red_cards,
-                "RedCards": len(red_cards),
-                "YellowCardMinutes": yellow_cards,
-                "YellowCards": len(yellow_cards),
-                "is_captain": is_captain,
-                "ShirtNumber": shirt_number
-            }
+            players_data[player_name] = PlayerAppearance(
+                name=player_name,
+                shirt_number=shirt_number,
+                is_captain=is_captain,
+                cards=cards,
+                substitutions=substitutions,
+            )
 
         return players_data
 
     except Exception as e:
-        logging.error(
-            f"Error in player_extraction_from_list: {e}",
-            exc_info=True
-        )
+        logger.error("Error in player_extraction_from_list: %s", e, exc_info=True)
         return players_data
 
 
 def starter_sub_player_merge(starters, Subs):
-    logging.info("Entering function: starter_sub_player_merge")
-    import copy
-    try:
-        for subplayer in Subs:
-            if subplayer not in starters:
-                starters[subplayer] = Subs[subplayer]
-                starters[subplayer]['source'] = 'Sub'
-        for startPlayer in starters:
-            if 'source' not in starters[startPlayer]:
-                starters[startPlayer]['source'] = 'Start'
-
-        merged_players = copy.deepcopy(starters)
-        return merged_players
-    except Exception as e:
-        logging.error(f"Error in starter_sub_player_merge: {e}")
-        return starters
-
-def swap_subs_to_starter(subList):
-    logging.info("Entering function: swap_subs_to_starter")
-    try:
-        if len(subList) != 1:
-            for i in range(len(subList)):
-                if i > 0:
-                    subList[i]['playerName'] = subList[i - 1].get('ReplacedBy', 'Unknown')
-        return subList
-    except Exception as e:
-        logging.error(f"Error in swap_subs_to_starter: {e}")
-        return subList
-
+    """
+    One squad dict: starters (source 'Start') followed by subs (source 'Sub').
+    A sub with the same name as a starter is dropped.
+    """
+    merged_players = {}
+    for name, player in starters.items():
+        player.source = 'Start'
+        merged_players[name] = player
+    for name, player in Subs.items():
+        if name not in merged_players:
+            player.source = 'Sub'
+            merged_players[name] = player
+    return merged_players
+
+def substitution_chain(substitutions):
+    """
+    Pairs each substitution with the player who actually went off. BBC lists a
+    chain under the starter ("Maeda 70', Idah 85'"), so after the first one the
+    player going off is whoever came on in the previous substitution.
+    """
+    chain = []
+    for i, sub in enumerate(substitutions):
+        player_off = sub.player_name if i == 0 else substitutions[i - 1].replaced_by
+        chain.append((player_off, sub))
+    return chain
 
 
+def extract_players_and_assists(soup, searchString):
+    try:
+        # Using regex properly to match dynamic classes
+        container = soup.find('div', class_=class_regex(searchString))
+        return parse_assists_container(container)
 
-import re
-import logging
-from bs4 import BeautifulSoup
+    except Exception as e:
+        logger.error("Error in extract_players_and_assists: %s", e)
+        return {}
 
 
-def extract_players_and_assists(soup, searchString):
-    logging.info("Entering function: extract_players_and_assists")
+def parse_assists_container(container):
+    """Returns {player_name: [assist times]} from a GroupedHomeEvent/GroupedAwayEvent block."""
     try:
-        # Using regex properly to match dynamic classes
-        container = soup.find('div', class_=re.compile(searchString))
         if not container:
-            logging.warning("No container found for player assists.")
+            logger.warning("No container found for player assists.")
             return {}
 
         player_data = {}
@@ -227,9 +239,8 @@ def extract_players_and_assists(soup, searchString):
 
         text = container.get_text(strip=True)
 
-        # Regex pattern to extract player name and assist times
-        pattern = r"([\w\s\.\-]+)\s*\(([^)]+)\)"
-        matches = re.findall(pattern, text)
+        # Player name and assist times
+        matches = ASSIST_RE.findall(text)
 
         for player_name, times in matches:
             player_name = player_name.strip()
@@ -243,59 +254,28 @@ def extract_players_and_assists(soup, searchString):
         return player_data
 
     except Exception as e:
-        logging.error(f"Error in extract_players_and_assists: {e}")
+        logger.error("Error in parse_assists_container: %s", e)
         return {}
 
 
-
-
-import logging
-import re
-from bs4 import BeautifulSoup
-
-# Configure logging
-
-
-import logging
-import re
-from bs4 import BeautifulSoup
-
-# Configure logging
-
-import logging
-import re
-from bs4 import BeautifulSoup
-
-# Configure logging
-
-
-import logging
-import re
-from bs4 import BeautifulSoup
-
-# Configure loggingWARNING - Goal scorer J. Bryan not found in AwayTeamProcessed.
-
-
-
 def extract_goal_events1(soup, event_type_class):
-    logging.info("Entering function: extract_goal_events")
     goals_data = {}
 
     try:
-        key_events_div = soup.find('div', class_=re.compile(f".*{event_type_class}.*"))
+        key_events_div = soup.find('div', class_=class_regex(event_type_class))
         if not key_events_div:
-            logging.warning(f"No key events found for class {event_type_class}.")
+            logger.warning("No key events found for class %s.", event_type_class)
             return goals_data
 
-        event_items = key_events_div.find_all('li', class_=re.compile(".*StyledAction.*"))
-        logging.info(f"Found {len(event_items)} event items.")
+        event_items = key_events_div.find_all('li', class_=class_regex("StyledAction"))
+        logger.debug("Found %d event items.", len(event_items))
 
         for item in event_items:
             player_span = item.find('span', role='text')
             extra_info_span = item.find('span', class_='ssrcss-1t9po6g-TextBlock e102yuqa0')  # Contains "(26' og)"
 
             if not player_span:
-                logging.warning("Skipping event: No player span found.")
+                logger.debug("Skipping event: No player span found.")
                 continue
 
             player_name = clean_text(player_span.get_text(strip=True))
@@ -304,7 +284,7 @@ def extract_goal_events1(soup, event_type_class):
             is_own_goal = False
             if extra_info_span and 'og' in extra_info_span.get_text().lower():
                 is_own_goal = True  # Flag this as an own goal
-                logging.info(f"Detected own goal for {player_name}")
+                logger.debug("Detected own goal for %s", player_name)
 
             hidden_span = item.find('span', class_='visually-hidden ssrcss-1f39n02-VisuallyHidden e16en2lz0')
 
@@ -312,7 +292,7 @@ def extract_goal_events1(soup, event_type_class):
                 hidden_text = hidden_span.get_text(separator=', ', strip=True)
 
                 if "Goal" in hidden_text or "Own Goal" in hidden_text:
-                    goals = re.findall(r'(\d+)(?: minutes(?: plus (\d+))?)?', hidden_text)
+                    goals = HIDDEN_GOAL_MINUTES_RE.findall(hidden_text)
 
                     goal_times = []
                     for minute, extra in goals:
@@ -328,38 +308,34 @@ def extract_goal_events1(soup, event_type_class):
 
                     goals_data[player_name].extend(goal_times)
                     goal_type = "Own Goal" if is_own_goal else "Goal"
-                    logging.info(f"Recorded {goal_type} for {player_name} at {goal_times}")
+                    logger.debug("Recorded %s for %s at %s", goal_type, player_name, goal_times)
 
-        logging.info(f"Extracted goal data: {goals_data}")
+        logger.debug("Extracted goal data: %s", goals_data)
         return goals_data
 
     except Exception as e:
-        logging.error(f"Error in extract_goal_events: {e}", exc_info=True)
+        logger.error("Error in extract_goal_events: %s", e, exc_info=True)
         return goals_data
 
-import re
-import logging
-from bs4 import BeautifulSoup
 
 def extract_goal_events_v2(soup, event_type_class):
-    logging.info("Entering function: extract_goal_events")
     goals_data = {}
 
     try:
-        key_events_div = soup.find('div', class_=re.compile(f".*{event_type_class}.*"))
+        key_events_div = soup.find('div', class_=class_regex(event_type_class))
         if not key_events_div:
-            logging.warning(f"No key events found for class {event_type_class}.")
+            logger.warning("No key events found for class %s.", event_type_class)
             return goals_data
 
-        event_items = key_events_div.find_all('li', class_=re.compile(".*StyledAction.*"))
-        logging.info(f"Found {len(event_items)} event items.")
+        event_items = key_events_div.find_all('li', class_=class_regex("StyledAction"))
+        logger.debug("Found %d event items.", len(event_items))
 
         for item in event_items:
             player_span = item.find('span', role='text')
             extra_info_spans = item.find_all('span', class_='ssrcss-1t9po6g-TextBlock e102yuqa0')
 
             if not player_span:
-                logging.warning("Skipping event: No player span found.")
+                logger.debug("Skipping event: No player span found.")
                 continue
 
             player_name = player_span.get_text(strip=True)
@@ -377,7 +353,7 @@ def extract_goal_events_v2(soup, event_type_class):
                     continue
 
                 # Extract goal timestamps while checking if each specific goal is a penalty or own goal
-                goal_matches = re.findall(r'(\d+)(?: minutes(?: plus (\d+))?)?', hidden_text)
+                goal_matches = HIDDEN_GOAL_MINUTES_RE.findall(hidden_text)
 
                 goal_times = []
                 for idx, (minute, extra) in enumerate(goal_matches):
@@ -405,17 +381,15 @@ def extract_goal_events_v2(soup, event_type_class):
 
                 goals_data[player_name].extend(goal_times)
 
-        logging.info(f"Extracted goal data: {goals_data}")
+        logger.debug("Extracted goal data: %s", goals_data)
         return goals_data
 
     except Exception as e:
-        logging.error(f"Error in extract_goal_events: {e}")
+        logger.error("Error in extract_goal_events: %s", e)
         return {}
 
 
-
-
-def extract_goal_events_as_events(soup):
+def extract_goal_events_as_events(soup, page_index=None):
     """
     OPTION A (fixed): Use visible time tokens from TextBlock spans (raw-ish),
     and hidden text ONLY as the definitive marker for Goal / Own Goal / Penalty.
@@ -423,17 +397,15 @@ def extract_goal_events_as_events(soup):
     Emits ONE event per timestamp token.
     """
     events = []
-    logging.info("Entering function: extract_goal_events_as_events")
 
-    GOAL_DESC_RE = re.compile(r"^(Goal|Own Goal|Penalty)\b", re.IGNORECASE)
+    if page_index is None:
+        page_index = build_page_index(soup)
 
-    # Parse a time token from a TextBlock chunk like:
-    #   "( 26' )", "(52' pen)", "(49' og)", "(90'+3)"
-    # Accept both ' and ’, allow spaces, allow +extra, allow pen/og
-    TIME_IN_TEXTBLOCK_RE = re.compile(
-        r"(\d+\s*[\'\u2019]\s*(?:\+\s*\d+)?\s*(?:pen|og)?)",
-        re.IGNORECASE
-    )
+    # GOAL_DESC_RE / TIME_IN_TEXTBLOCK_RE and the selectors come precompiled from markup.py
+    css = active_markup().css
+    key_event_css = css["key_event"]
+    event_description_css = css["event_description"]
+    event_time_css = css["event_time"]
 
     def opposite(side: str) -> str:
         return "away" if side == "home" else "home"
@@ -448,7 +420,7 @@ def extract_goal_events_as_events(soup):
 
     def get_event_desc_text(item) -> str:
         # Look for visually-hidden spans whose class contains "VisuallyHidden"
-        for vh in item.select('span[class*="VisuallyHidden"]'):
+        for vh in event_description_css.select(item):
             txt = vh.get_text(" ", strip=True)
             if GOAL_DESC_RE.match(txt):
                 return txt
@@ -461,7 +433,7 @@ def extract_goal_events_as_events(soup):
         """
         tokens = []
 
-        for tb in item.select('span[class*="TextBlock"]'):
+        for tb in event_time_css.select(item):
             txt = tb.get_text(" ", strip=True)
             # txt can include parentheses and spaces, e.g. "( 26' )"
             m = TIME_IN_TEXTBLOCK_RE.search(txt)
@@ -480,14 +452,14 @@ def extract_goal_events_as_events(soup):
                 out.append(t)
         return out
 
-    def parse_side(container_substring: str, container_side: str):
-        block = soup.select_one(f'div[class*="{container_substring}"]')
+    def parse_side(container_field: str, container_side: str):
+        block = first(page_index, container_field)
         if not block:
-            logging.warning(f"[goals] No block found for {container_substring}")
+            logger.warning("[goals] No block found for %s", container_field)
             return
 
-        items = block.select('li[class*="StyledAction"]')
-        logging.info(f"[goals] {container_substring} li_total={len(items)}")
+        items = key_event_css.select(block)
+        logger.debug("[goals] %s li_total=%d", container_field, len(items))
 
         for item in items:
             scorer_span = item.find("span", role="text")
@@ -504,11 +476,13 @@ def extract_goal_events_as_events(soup):
 
             raw_tokens = extract_time_tokens_from_item(item)
             if not raw_tokens:
-                # keep this debug; it’s the only place goals could still drop
-                logging.debug(
-                    f"[goals] NO time tokens | side={container_side} scorer={scorer!r} "
-                    f"desc={desc_text!r} full_text={item.get_text(' ', strip=True)!r}"
-                )
+                # keep this debug; it’s the only place goals could still drop.
+                # Guarded because rendering the item's text isn't free.
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(
+                        "[goals] NO time tokens | side=%s scorer=%r desc=%r full_text=%r",
+                        container_side, scorer, desc_text, item.get_text(" ", strip=True),
+                    )
                 continue
 
             for tok in raw_tokens:
@@ -519,24 +493,22 @@ def extract_goal_events_as_events(soup):
                     "credited_team_side": credited_side
                 })
 
-    parse_side("KeyEventsHome", "home")
-    parse_side("KeyEventsAway", "away")
+    parse_side("home_key_events", "home")
+    parse_side("away_key_events", "away")
 
-    logging.info(f"[goals] TOTAL events emitted={len(events)}")
+    logger.debug("[goals] TOTAL events emitted=%d", len(events))
     return events
 
 
-
 def extract_goal_events(soup, event_type_class):
-    logging.info("Entering function: extract_goal_events")
     goals_data = {}
     try:
-        key_events_div = soup.find('div', class_=re.compile(f".*{event_type_class}.*"))
+        key_events_div = soup.find('div', class_=class_regex(event_type_class))
         if not key_events_div:
-            logging.warning(f"No key events found for class {event_type_class}.")
+            logger.warning("No key events found for class %s.", event_type_class)
             return goals_data
 
-        event_items = key_events_div.find_all('li', class_=re.compile(".*StyledAction.*"))
+        event_items = key_events_div.find_all('li', class_=class_regex("StyledAction"))
 
         for item in event_items:
             player_span = item.find('span', role='text')
@@ -549,7 +521,7 @@ def extract_goal_events(soup, event_type_class):
             if hidden_span:
                 hidden_text = hidden_span.get_text(separator=', ', strip=True)
                 if "Goal" in hidden_text:
-                    goals = re.findall(r'(\d+)(?: minutes(?: plus (\d+))?)?', hidden_text)
+                    goals = HIDDEN_GOAL_MINUTES_RE.findall(hidden_text)
                     goal_times = [f"{minute}' +{extra}" if extra else f"{minute}'" for minute, extra in goals]
 
                     if player_name not in goals_data:
@@ -558,70 +530,64 @@ def extract_goal_events(soup, event_type_class):
 
         return goals_data
     except Exception as e:
-        logging.error(f"Error in extract_goal_events: {e}")
+        logger.error("Error in extract_goal_events: %s", e)
         return goals_data
 
-def process_sub_data(starters, merged):
-    logging.info("Entering function: process_sub_data")
+def process_sub_data(merged):
+    """Fills in substitution, starter and minutes-played fields for a merged squad."""
     try:
-        for player in starters:
-            sub_info = starters[player].get('substitutions_info', [])
-            if sub_info:
-                sortedSubs = swap_subs_to_starter(sub_info)
-                for playerWhoWasSubbed in sortedSubs:
-                    pn = playerWhoWasSubbed['playerName']
-                    ws = playerWhoWasSubbed['WasSubstituted']
-                    sbt = playerWhoWasSubbed['SubstitutionTime']
-                    rb = playerWhoWasSubbed['ReplacedBy']
-
-                    if pn in merged:
-                        merged[pn]['WasSubstituted'] = ws
-                        merged[pn]['SubstitutionTime'] = sbt
-                        merged[pn]['ReplacedBy'] = rb
-                    else:
-                        logging.warning(f"Player {pn} not found in merged data.")
-
-                    if rb in merged:
-                        merged[rb]['WasIntroduced'] = True
-                        merged[rb]['SubbedOnMinute'] = sbt
-                    else:
-                        logging.warning(f"Replacement player {rb} not found in merged data.")
-
-        for player in merged:
-            source = merged[player].get('source', 'Unknown')
-            if source == 'Start':
-                merged[player]['WasStarter'] = True
-                if 'WasSubstituted' not in merged[player]:
-                    merged[player]['WasSubstituted'] = False
-                    merged[player]['MinutesPlayed'] = 98
-                elif merged[player]['WasSubstituted']:
-                    merged[player]['MinutesPlayed'] = merged[player]['SubstitutionTime']
-            elif source == 'Sub':
-                merged[player]['WasStarter'] = False
-                if 'WasIntroduced' not in merged[player]:
-                    merged[player]['WasIntroduced'] = False
-                    merged[player]['MinutesPlayed'] = 0
-                elif merged[player]['WasIntroduced'] and 'WasSubstituted' not in merged[player]:
-                    merged[player]['WasSubstituted'] = False
-                    merged[player]['MinutesPlayed'] = 98 - merged[player]['SubbedOnMinute']
-                elif merged[player]['WasIntroduced'] and merged[player]['WasSubstituted']:
-                    merged[player]['MinutesPlayed'] = merged[player]['SubstitutionTime'] - merged[player]['SubbedOnMinute']
-
-            merged.pop('substitutions_info', None)
-            merged.pop('source', None)
+        for player in list(merged.values()):
+            for pn, sub in substitution_chain(player.substitutions):
+                sbt = sub.substitution_time
+                rb = sub.replaced_by
+
+                if pn in merged:
+                    merged[pn].mark_substituted(sbt, rb)
+                else:
+                    logger.warning("Player %s not found in merged data.", pn)
+
+                if rb in merged:
+                    merged[rb].mark_introduced(sbt)
+                else:
+                    logger.warning("Replacement player %s not found in merged data.", rb)
+
+        for player in merged.values():
+            if player.source == 'Start':
+                player.was_starter = True
+                if player.was_substituted is None:
+                    player.was_substituted = False
+                    player.minutes_played = 98
+                elif player.was_substituted:
+                    player.minutes_played = player.substitution_time
+            elif player.source == 'Sub':
+                player.was_starter = False
+                if player.was_introduced is None:
+                    player.was_introduced = False
+                    player.minutes_played = 0
+                elif player.was_introduced and player.was_substituted is None:
+                    player.was_substituted = False
+                    player.minutes_played = 98 - player.subbed_on_minute
+                elif player.was_introduced and player.was_substituted:
+                    player.minutes_played = player.substitution_time - player.subbed_on_minute
         return merged
     except Exception as e:
-        logging.error(f"Error in process_sub_data: {e}")
+        logger.error("Error in process_sub_data: %s", e)
         return merged
 
-def generate_player_dictionaries(soup):
-    logging.info("Entering function: generate_player_dictionaries")
+def generate_team_sheets(soup, page_index=None):
+    """
+    Returns (home, away) TeamSheets with every squad player's appearance,
+    goals and assists filled in. Empty TeamSheets if the lineup can't be read.
+    """
     try:
-        get_team_lists = return_player_lists(soup)
+        if page_index is None:
+            page_index = build_page_index(soup)
+
+        get_team_lists = return_player_lists(soup, page_index)
 
         if not get_team_lists or len(get_team_lists) != 4:
-            logging.error("Team lists are incomplete or missing.")
-            return [{}, {}]
+            logger.error("Team lists are incomplete or missing.")
+            return TeamSheet(), TeamSheet()
 
         # ---- Extract starters/subs ----
         HomeTeamStarters = player_extraction_from_list(get_team_lists[0])
@@ -630,63 +596,50 @@ def generate_player_dictionaries(soup):
         AwayTeamSubs = player_extraction_from_list(get_team_lists[3])
 
         # ---- Merge + compute minutes/sub info ----
-        HomeFullTeamUnprocessed = starter_sub_player_merge(HomeTeamStarters, HomeTeamSubs)
-        AwayFullTeamUnprocessed = starter_sub_player_merge(AwayTeamStarters, AwayTeamSubs)
-
-        HomeTeamProcessed = process_sub_data(HomeTeamStarters, HomeFullTeamUnprocessed)
-        AwayTeamProcessed = process_sub_data(AwayTeamStarters, AwayFullTeamUnprocessed)
+        home = TeamSheet(players=process_sub_data(starter_sub_player_merge(HomeTeamStarters, HomeTeamSubs)))
+        away = TeamSheet(players=process_sub_data(starter_sub_player_merge(AwayTeamStarters, AwayTeamSubs)))
 
         # ----------------------------------------------------------
         # GOALS (event-first, supports OWN GOALS + PENALTIES)
         # ----------------------------------------------------------
-        goal_events = extract_goal_events_as_events(soup)
-
-        def find_player_team(player_name: str):
-            """Return (team_dict, team_label) where team_label is 'home' or 'away'."""
-            if player_name in HomeTeamProcessed:
-                return HomeTeamProcessed, "home"
-            if player_name in AwayTeamProcessed:
-                return AwayTeamProcessed, "away"
-            return None, None
-
-        unresolved_goal_events = []
-
-        for ev in goal_events:
+        for ev in extract_goal_events_as_events(soup, page_index):
             scorer = ev.get("scorer", "Unknown")
-            team_dict, _ = find_player_team(scorer)
+            goal = GoalEvent(scorer, ev["time_text"], ev["type"], ev["credited_team_side"])
+            player = home.players.get(scorer) or away.players.get(scorer)
 
-            if not team_dict:
-                unresolved_goal_events.append(ev)
+            if player is None:
+                home.unresolved_goal_events.append(goal)
                 continue
 
-            team_dict[scorer].setdefault("Goals", []).append(ev)
+            if player.goals is None:
+                player.goals = []
+            player.goals.append(goal)
 
         # Optional: keep unresolved goals for QA/debugging
-        if unresolved_goal_events:
-            logging.warning(
-                f"{len(unresolved_goal_events)} goal events could not be matched to a player."
+        if home.unresolved_goal_events:
+            logger.warning(
+                "%d goal events could not be matched to a player.", len(home.unresolved_goal_events)
             )
-            HomeTeamProcessed.setdefault("_unresolved_goal_events", []).extend(unresolved_goal_events)
 
         # ----------------------------------------------------------
         # ASSISTS (keep your existing logic as-is)
         # ----------------------------------------------------------
-        HomeAssists = extract_players_and_assists(soup, ".*GroupedHomeEvent e1ojeme81*")
-        for player in HomeAssists:
-            if player in HomeTeamProcessed:
-                HomeTeamProcessed[player]['Assists'] = HomeAssists[player]
-            else:
-                logging.warning(f"Assist provider {player} not found in HomeTeamProcessed.")
-
-        AwayAssists = extract_players_and_assists(soup, ".*GroupedAwayEvent e1ojeme80*")
-        for player in AwayAssists:
-            if player in AwayTeamProcessed:
-                AwayTeamProcessed[player]['Assists'] = AwayAssists[player]
-            else:
-                logging.warning(f"Assist provider {player} not found in AwayTeamProcessed.")
-
-        return [HomeTeamProcessed, AwayTeamProcessed]
+        for team, field, label in ((home, "home_assists", "HomeTeamProcessed"), (away, "away_assists", "AwayTeamProcessed")):
+            assists = parse_assists_container(first(page_index, field))
+            for player in assists:
+                if player in team.players:
+                    team.players[player].assists = assists[player]
+                else:
+                    logger.warning("Assist provider %s not found in %s.", player, label)
+
+        return home, away
 
     except Exception as e:
-        logging.error(f"Error in generate_player_dictionaries: {e}", exc_info=True)
-        return [{}, {}]
+        logger.error("Error in generate_team_sheets: %s", e, exc_info=True)
+        return TeamSheet(), TeamSheet()
+
+
+def generate_player_dictionaries(soup, page_index=None):
+    """[home_players, away_players] as the plain dicts written to the output files."""
+    home, away = generate_team_sheets(soup, page_index)
+    return [home.players_json(), away.players_json()]
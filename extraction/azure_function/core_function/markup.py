@@ -0,0 +1,163 @@
+"""
+Compiled CSS selectors and regexes for BBC match pages, in one place.
+
+Everything that depends on BBC's markup (class names, data-testids, CSS
+selectors) lives in a versioned selector set in MARKUP_VERSIONS. Each set is
+compiled once, at import or on first use, so extractors never re-parse a
+selector or rebuild a regex per page or per player. When BBC changes its
+markup, add a new set and point BBC_MARKUP_VERSION at it (or call
+use_markup() before re-extracting older archived pages).
+
+Text patterns that don't depend on the markup (minute tokens, substitution
+text, assist lists) are plain module-level regexes below.
+"""
+import os
+import re
+from functools import lru_cache
+
+import soupsieve
+
+# version -> markup config. Keys of "css" are the names extractors use.
+MARKUP_VERSIONS = {
+    "2025": {
+        # Page index (see page_index.py)
+        # (tag name, exact class value) -> field
+        "exact_class_fields": {
+            ("time", "ssrcss-1hjuztf-Date ejf0oom1"): "played_on",
+            ("div", "ssrcss-13d7g0c-AttendanceValue"): "attendance",
+            ("div", "ssrcss-bon2fo-WithInlineFallback-TeamHome"): "home_team",
+            ("div", "ssrcss-nvj22c-WithInlineFallback-TeamAway"): "away_team",
+            ("div", "ssrcss-qsbptj-HomeScore"): "home_score",
+            ("div", "ssrcss-fri5a2-AwayScore"): "away_score",
+            ("div", "ssrcss-wtr58o-Value emwj40c0"): "possession",
+            ("div", "ssrcss-1exmi76-Value emwj40c0"): "possession",
+        },
+        # (tag name or None for any tag, class regex, field)
+        "pattern_class_fields": [
+            ("div", r'Venue$', "venue"),
+            (None, r'TeamDetailsValue-FormationValue', "formations"),
+            ("div", ".*GroupedHomeEvent e1ojeme81*", "home_assists"),
+            ("div", ".*GroupedAwayEvent e1ojeme80*", "away_assists"),
+        ],
+        # (tag name, substring of the class attribute, field), as in div[class*="..."]
+        "substring_class_fields": [
+            ("div", "KeyEventsHome", "home_key_events"),
+            ("div", "KeyEventsAway", "away_key_events"),
+        ],
+        # data-testid -> (tag name or None for any tag, field)
+        "testid_fields": {
+            "match-lineups-home-manager": (None, "home_manager"),
+            "match-lineups-away-manager": (None, "away_manager"),
+            "styled-match-lineup": ("div", "lineup"),
+        },
+
+        # Class names read straight off indexed elements
+        "team_name_class": "ssrcss-1p14tic-DesktopValue",
+        "team_details_row": r"Detail",
+        "team_details_label": r"TeamDetailsLabel",
+        "team_details_value": r"TeamDetailsValue",
+
+        "css": {
+            # Lineups
+            "starters_section": 'section[class*="TeamPlayers"]',
+            "subs_section": 'section[class*="SubstitutesSection"]',
+            "player_list": 'ul[data-testid="player-list"]',
+            "player_name": 'span[class*="-PlayerName"]:not([class*="Wrapper"])',
+            "captain_marker": 'span[role="text"] > span[aria-hidden="true"]',
+            "shirt_number": 'div[aria-hidden="true"][class*="ShirtNumber"]',
+            "yellow_card": 'img[src*="yellowcard"]',
+            "red_card": 'img[src*="redcard"], img[src*="second-yellow-card"]',
+            "substitutions": 'span[class*="PlayerSubstitutes"]',
+            "substitution": 'span[class*="Wrapper"]',
+            "visible_text": 'span[aria-hidden="true"]',
+            # Key events
+            "key_event": 'li[class*="StyledAction"]',
+            "event_description": 'span[class*="VisuallyHidden"]',
+            "event_time": 'span[class*="TextBlock"]',
+        },
+    },
+}
+
+DEFAULT_MARKUP_VERSION = "2025"
+BBC_MARKUP_VERSION = os.environ.get("BBC_MARKUP_VERSION", DEFAULT_MARKUP_VERSION)
+
+# ---- Markup-independent text patterns ----
+
+# Key event description in the visually hidden text: "Goal 26 minutes", "Own Goal ..."
+GOAL_DESC_RE = re.compile(r"^(Goal|Own Goal|Penalty)\b", re.IGNORECASE)
+
+# A time token in a TextBlock chunk like "( 26' )", "(52' pen)", "(49' og)", "(90'+3)".
+# Accepts both ' and ’, spaces, +extra and pen/og
+TIME_IN_TEXTBLOCK_RE = re.compile(r"(\d+\s*[\'\u2019]\s*(?:\+\s*\d+)?\s*(?:pen|og)?)", re.IGNORECASE)
+
+# "Maeda 70'" / "Idah 90'+2" under a player who was substituted
+SUBSTITUTION_TEXT_RE = re.compile(r"(.+?)\s+(\d+'(?:\+\d+)?)$")
+
+# "Player Name (12', 45')" entries in an assists block
+ASSIST_RE = re.compile(r"([\w\s\.\-]+)\s*\(([^)]+)\)")
+
+# Minutes in hidden goal text: "26 minutes", "90 minutes plus 3"
+HIDDEN_GOAL_MINUTES_RE = re.compile(r'(\d+)(?: minutes(?: plus (\d+))?)?')
+
+
+class MarkupSet:
+    """One compiled selector set; see MARKUP_VERSIONS for the fields."""
+
+    __slots__ = (
+        "version", "css", "exact_class_fields", "pattern_class_fields",
+        "substring_class_fields", "testid_fields", "team_name_class",
+        "team_details_row", "team_details_label", "team_details_value",
+    )
+
+    def __init__(self, version, config):
+        self.version = version
+        self.css = {name: soupsieve.compile(selector) for name, selector in config["css"].items()}
+        self.exact_class_fields = dict(config["exact_class_fields"])
+        self.pattern_class_fields = [
+            (name, re.compile(pattern), field) for name, pattern, field in config["pattern_class_fields"]
+        ]
+        self.substring_class_fields = list(config["substring_class_fields"])
+        self.testid_fields = dict(config["testid_fields"])
+        self.team_name_class = config["team_name_class"]
+        self.team_details_row = re.compile(config["team_details_row"])
+        self.team_details_label = re.compile(config["team_details_label"])
+        self.team_details_value = re.compile(config["team_details_value"])
+
+    def select(self, name, tag):
+        return self.css[name].select(tag)
+
+    def select_one(self, name, tag):
+        return self.css[name].select_one(tag)
+
+    def classes_for(self, field):
+        """The exact class values filed under a page index field (for log messages)."""
+        return [value for (_tag, value), f in self.exact_class_fields.items() if f == field]
+
+
+@lru_cache(maxsize=None)
+def markup_set(version):
+    """The compiled MarkupSet for `version` (compiled once per process)."""
+    if version not in MARKUP_VERSIONS:
+        raise ValueError(f"Unknown BBC markup version: {version}")
+    return MarkupSet(version, MARKUP_VERSIONS[version])
+
+
+_active = markup_set(BBC_MARKUP_VERSION)
+
+
+def active_markup():
+    """The selector set extractors are currently using."""
+    return _active
+
+
+def use_markup(version):
+    """Switches every extractor in this process to another selector set."""
+    global _active
+    _active = markup_set(version)
+    return _active
+
+
+@lru_cache(maxsize=256)
+def class_regex(fragment):
+    """Compiled `.*fragment.*` class pattern, for the older extractors that take a class fragment."""
+    return re.compile(f".*{fragment}.*")
@@ -0,0 +1,224 @@
+"""
+Checkpointed output for one league/month.
+
+Instead of holding a whole league/month in memory until the end, completed
+matches are committed in small batches: every CHECKPOINT_BATCH_SIZE matches or
+CHECKPOINT_BATCH_SECONDS, whichever comes first, the batch is written as a
+part blob under MATCH_PARTS_PREFIX and its match IDs are recorded in the
+registry. A timeout or crash therefore loses at most the batch in progress.
+
+When the unit finishes, finish() compacts every part of that league/month
+(including parts left behind by an earlier, interrupted run) into the usual
+single output file and deletes them. Parts live outside MATCH_DATA_FOLDER and
+end in ".part", so the loader never picks them up.
+
+A unit that times out or fails leaves its parts behind, and the daily run
+only revisits the current month, so every run (and every backfill) starts by
+compacting whatever parts are left under MATCH_PARTS_PREFIX, whichever unit
+wrote them (compact_leftover_parts).
+"""
+import os
+import time
+import uuid
+import logging
+import datetime
+
+from .azure_storage import (
+    MATCH_DATA_FOLDER,
+    save_match_data_to_adls,
+    save_match_part,
+    download_match_parts,
+    list_blob_names,
+    delete_blobs,
+)
+from .general_utils import generate_file_name
+from .metrics import get_metrics
+
+logger = logging.getLogger()
+
+CHECKPOINT_BATCH_SIZE = int(os.environ.get("CHECKPOINT_BATCH_SIZE", "10"))
+CHECKPOINT_BATCH_SECONDS = float(os.environ.get("CHECKPOINT_BATCH_SECONDS", "60"))
+MATCH_PARTS_PREFIX = os.environ.get("MATCH_PARTS_PREFIX", "PARTS/")
+PART_SUFFIX = ".ndjson.part"
+
+
+class CheckpointWriter:
+    """
+    Collects one league/month's matches and commits them batch by batch.
+
+    `on_commit` is called with the match data of every batch once its part is
+    saved (process_games uses it to update the aggregates) and returns whether
+    it succeeded. Matches it failed on are passed again with the next batch and
+    once more in finish(); those still failing are listed by `unapplied`.
+    """
+
+    def __init__(self, registry, league, stringYearMonth, on_commit=None,
+                 batch_size=CHECKPOINT_BATCH_SIZE, batch_seconds=CHECKPOINT_BATCH_SECONDS,
+                 foldername=MATCH_DATA_FOLDER):
+        self.registry = registry
+        self.league = league
+        self.stringYearMonth = stringYearMonth
+        self.foldername = foldername
+        self.prefix = f"{MATCH_PARTS_PREFIX}{foldername}/{league}_{stringYearMonth}/"
+        self._on_commit = on_commit
+        self._batch_size = max(1, batch_size)
+        self._batch_seconds = batch_seconds
+        self._matches = []      # [(match_id, match_data)]
+        self._errors = []       # [match_id]
+        self._unrecorded = []   # match IDs whose registry delta failed to write
+        self._unapplied = []    # [(match_id, match_data)] on_commit failed on
+        self._batch_started = time.perf_counter()
+        self.committed = 0
+        self.committed_errors = 0
+
+    def add(self, match_id, match_data):
+        self._matches.append((match_id, match_data))
+        self._flush_if_due()
+
+    def add_error(self, match_id):
+        self._errors.append(match_id)
+        self._flush_if_due()
+
+    def _flush_if_due(self):
+        size = len(self._matches) + len(self._errors)
+        if size >= self._batch_size or time.perf_counter() - self._batch_started >= self._batch_seconds:
+            self.flush()
+
+    def flush(self):
+        """
+        Commits the current batch: the part blob first, then the registry delta
+        for exactly its matches. Returns False if the part couldn't be saved;
+        the batch is then kept and retried by the next flush.
+        """
+        metrics = get_metrics()
+        if self._matches:
+            match_data = [data for _, data in self._matches]
+            stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+            path = f"{self.prefix}{stamp}_{uuid.uuid4().hex[:8]}{PART_SUFFIX}"
+            if not save_match_part(match_data, path):
+                return False
+            self._apply(self._matches)
+
+        match_ids = [match_id for match_id, _ in self._matches]
+        for match_id in match_ids:
+            self.registry.mark(match_id, "uploaded")
+        for match_id in self._errors:
+            self.registry.mark(match_id, "error")
+
+        to_record = self._unrecorded + match_ids + self._errors
+        if to_record:
+            with metrics.span("registry_flush"):
+                recorded = self.registry.flush(to_record)
+            if recorded:
+                self._unrecorded = []
+            else:
+                # The registry keeps them pending; include them in the next delta
+                logger.error("Failed to update match identifiers in S3.")
+                self._unrecorded = to_record
+
+        metrics.incr("matches_fetched", len(match_ids))
+        metrics.incr("matches_failed", len(self._errors))
+        self.committed += len(match_ids)
+        self.committed_errors += len(self._errors)
+        self._matches = []
+        self._errors = []
+        self._batch_started = time.perf_counter()
+        return True
+
+    def _apply(self, matches):
+        """Passes committed matches to on_commit, with any it failed on before."""
+        batch = self._unapplied + matches
+        if not (self._on_commit and batch):
+            return
+        self._unapplied = [] if self._on_commit([data for _, data in batch]) else batch
+
+    @property
+    def unrecorded(self):
+        """IDs of committed matches whose registry delta hasn't been written yet."""
+        return list(self._unrecorded)
+
+    @property
+    def unapplied(self):
+        """IDs of committed matches on_commit hasn't succeeded for (yet)."""
+        return [match_id for match_id, _ in self._unapplied]
+
+    def finish(self):
+        """
+        Flushes the last batch and compacts every part of this league/month
+        into one output file. Returns False if anything is left uncommitted
+        (including matches the registry hasn't recorded, see `unrecorded`) or
+        uncompacted; the parts are kept for the next run in that case.
+        """
+        if not self.flush():
+            return False
+        self._apply([])
+        if self._unrecorded:
+            return False
+        with get_metrics().span("compact_parts"):
+            return self.compact()
+
+    def compact(self):
+        part_names = sorted(name for name in list_blob_names(self.prefix) if name.endswith(PART_SUFFIX))
+        if not part_names:
+            logger.info(f"No match data to save for {self.league} {self.stringYearMonth}, skipping S3 save.")
+            return True
+
+        # A part can be re-written after a failed registry update; keep the latest copy of each match
+        matches = {}
+        try:
+            for part in download_match_parts(part_names):
+                for match in part:
+                    matches[str(match.get("match_id"))] = match
+        except Exception as e:
+            logger.error(f"Failed to read match parts under {self.prefix}: {e}")
+            return False
+
+        # Parts of an interrupted run can hold matches whose registry delta was
+        # lost; record them first, or the next run scrapes them into a second file
+        unrecorded = [match_id for match_id in matches if match_id not in self.registry]
+        if unrecorded:
+            for match_id in unrecorded:
+                self.registry.mark(match_id, "uploaded")
+            if not self.registry.flush(unrecorded):
+                logger.error(f"Failed to record {len(unrecorded)} match identifier(s) from {self.prefix}")
+                return False
+
+        filename = generate_file_name(self.league, self.stringYearMonth)
+        if not save_match_data_to_adls(list(matches.values()), filename, self.foldername):
+            logger.error(f"Failed to save match data to S3 for {filename}")
+            return False
+        logger.info(f"SaveWorked {filename}: {len(matches)} match(es) from {len(part_names)} part(s)")
+
+        # A part left behind here would be compacted again next run, duplicating its matches
+        delete_blobs(part_names)
+        return True
+
+
+def compact_leftover_parts(registry):
+    """
+    Compacts the parts of every unit found under MATCH_PARTS_PREFIX into that
+    unit's output file. Run before any unit starts (under the run lock), so all
+    parts found belong to units of earlier runs. Returns the part prefixes that
+    couldn't be compacted; their parts are kept for the next run.
+    """
+    prefixes = sorted({
+        name.rsplit("/", 1)[0] + "/"
+        for name in list_blob_names(MATCH_PARTS_PREFIX)
+        if name.endswith(PART_SUFFIX)
+    })
+    failed = []
+    for prefix in prefixes:
+        # PARTS/{foldername}/{league}_{stringYearMonth}/
+        foldername, _, unit = prefix[len(MATCH_PARTS_PREFIX):-1].rpartition("/")
+        league, _, stringYearMonth = unit.rpartition("_")
+        if not (foldername and league and stringYearMonth):
+            logger.error(f"Unexpected match part prefix {prefix}, leaving it")
+            failed.append(prefix)
+            continue
+        logger.info(f"Compacting parts left by an earlier run of {league} {stringYearMonth}")
+        writer = CheckpointWriter(registry, league, stringYearMonth, foldername=foldername)
+        if not writer.compact():
+            failed.append(prefix)
+    if failed:
+        get_metrics().incr("leftover_parts_failed", len(failed))
+    return failed
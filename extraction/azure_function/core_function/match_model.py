@@ -0,0 +1,191 @@
+"""
+Slotted record classes for one extracted match.
+
+Extraction builds these instead of nested dicts; to_json() produces exactly
+the dict shape (and key order) that GetGameData has always returned, so the
+output files don't change. match_output serialises them directly, so batch
+jobs can hold Match objects and only build dicts while writing.
+"""
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+@dataclass(slots=True)
+class Substitution:
+    player_name: str
+    substitution_time: int
+    replaced_by: str
+
+    def to_json(self):
+        return {
+            "playerName": self.player_name,
+            "WasSubstituted": True,
+            "SubstitutionTime": self.substitution_time,
+            "ReplacedBy": self.replaced_by,
+        }
+
+
+@dataclass(slots=True)
+class Card:
+    colour: str          # "yellow" or "red" (second yellows count as red)
+    minute: str
+
+
+@dataclass(slots=True)
+class GoalEvent:
+    scorer: str
+    time_text: str
+    type: str
+    credited_team_side: str
+
+    def to_json(self):
+        return {
+            "scorer": self.scorer,
+            "time_text": self.time_text,
+            "type": self.type,
+            "credited_team_side": self.credited_team_side,
+        }
+
+
+@dataclass(slots=True)
+class PlayerAppearance:
+    name: str
+    shirt_number: str
+    is_captain: bool
+    cards: list = field(default_factory=list)
+    substitutions: list = field(default_factory=list)
+    source: Optional[str] = None              # "Start" or "Sub"
+
+    # Set while resolving substitutions; None means "not set"
+    was_substituted: Optional[bool] = None
+    substitution_time: Optional[int] = None
+    replaced_by: Optional[str] = None
+    was_introduced: Optional[bool] = None
+    subbed_on_minute: Optional[int] = None
+    # Which of the two events above was recorded first (decides key order)
+    substituted_first: bool = False
+
+    was_starter: Optional[bool] = None
+    minutes_played: Optional[int] = None
+    goals: Optional[list] = None
+    assists: Optional[list] = None
+
+    def mark_substituted(self, substitution_time, replaced_by):
+        if self.was_substituted is None and self.was_introduced is None:
+            self.substituted_first = True
+        self.was_substituted = True
+        self.substitution_time = substitution_time
+        self.replaced_by = replaced_by
+
+    def mark_introduced(self, minute):
+        self.was_introduced = True
+        self.subbed_on_minute = minute
+
+    def minutes(self, colour):
+        return [card.minute for card in self.cards if card.colour == colour]
+
+    def to_json(self):
+        red = self.minutes("red")
+        yellow = self.minutes("yellow")
+        out = {
+            "substitutions_info": [s.to_json() for s in self.substitutions],
+            "RedCardMinutes": red,
+            "RedCards": len(red),
+            "YellowCardMinutes": yellow,
+            "YellowCards": len(yellow),
+            "is_captain": self.is_captain,
+            "ShirtNumber": self.shirt_number,
+        }
+        if self.source is not None:
+            out["source"] = self.source
+
+        # Substitution events, in the order they were recorded
+        substituted = {}
+        if self.was_substituted:
+            substituted = {
+                "WasSubstituted": True,
+                "SubstitutionTime": self.substitution_time,
+                "ReplacedBy": self.replaced_by,
+            }
+        introduced = {}
+        if self.was_introduced:
+            introduced = {"WasIntroduced": True, "SubbedOnMinute": self.subbed_on_minute}
+        if self.substituted_first:
+            out.update(substituted)
+            out.update(introduced)
+        else:
+            out.update(introduced)
+            out.update(substituted)
+
+        # Defaults filled in once all substitutions are known
+        if self.was_starter is not None:
+            out["WasStarter"] = self.was_starter
+        if self.was_introduced is False:
+            out["WasIntroduced"] = False
+        if self.was_substituted is False:
+            out["WasSubstituted"] = False
+        if self.minutes_played is not None:
+            out["MinutesPlayed"] = self.minutes_played
+
+        if self.goals is not None:
+            out["Goals"] = [g.to_json() for g in self.goals]
+        if self.assists is not None:
+            out["Assists"] = self.assists
+        return out
+
+
+@dataclass(slots=True)
+class TeamSheet:
+    players: dict = field(default_factory=dict)     # name -> PlayerAppearance
+    unresolved_goal_events: list = field(default_factory=list)
+    formation: Optional[str] = None
+    manager: Optional[str] = None
+    name: Optional[str] = None
+    score: Optional[str] = None
+    possession: Optional[str] = None
+
+    def players_json(self):
+        out = {name: player.to_json() for name, player in self.players.items()}
+        if self.unresolved_goal_events:
+            # Kept for QA alongside the players, as before
+            out["_unresolved_goal_events"] = [g.to_json() for g in self.unresolved_goal_events]
+        return out
+
+    def to_json(self):
+        return {
+            "formation": self.formation,
+            "manager": self.manager,
+            "name": self.name,
+            "score": self.score,
+            "possession": self.possession,
+            "players": self.players_json(),
+        }
+
+
+@dataclass(slots=True)
+class Match:
+    match_id: str
+    played_on: Optional[str]
+    venue: Optional[str]
+    attendance: Optional[str]
+    league_name: str
+    home_team: TeamSheet
+    away_team: TeamSheet
+
+    def to_json(self):
+        return {
+            "match_id": self.match_id,
+            "played_on": self.played_on,
+            "venue": self.venue,
+            "attendance": self.attendance,
+            "League_Name": self.league_name,
+            "home_team": self.home_team.to_json(),
+            "away_team": self.away_team.to_json(),
+        }
+
+
+def to_json(obj):
+    """json `default=` hook, so model objects can be passed straight to json.dump."""
+    if hasattr(obj, "to_json"):
+        return obj.to_json()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
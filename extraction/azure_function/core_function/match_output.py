@@ -0,0 +1,94 @@
+"""
+Serialization of per-league/month match output files.
+
+MATCH_OUTPUT_FORMAT picks the layout:
+  json     - indented JSON array (the original format, default)
+  compact  - JSON array without whitespace
+  ndjson   - one match per line
+
+MATCH_OUTPUT_COMPRESSION=gzip additionally gzips the file (".gz" suffix).
+
+Checkpoint part files are always uncompressed ndjson, read back with read_ndjson.
+
+Files are written incrementally from json's iterencode, so the full payload
+is never held in memory as one string. `match_data` may hold GetGameData
+dicts or match_model.Match objects; the latter are turned into dicts one at
+a time as they are written.
+"""
+import os
+import json
+import gzip
+
+from .match_model import to_json
+
+MATCH_OUTPUT_FORMAT = os.environ.get("MATCH_OUTPUT_FORMAT", "json")
+MATCH_OUTPUT_COMPRESSION = os.environ.get("MATCH_OUTPUT_COMPRESSION", "none")
+
+OUTPUT_FORMATS = {
+    # format: (extension, content type)
+    "json": (".json", "application/json"),
+    "compact": (".json", "application/json"),
+    "ndjson": (".ndjson", "application/x-ndjson"),
+}
+
+
+def output_extension(fmt=None, compression=None):
+    fmt = fmt or MATCH_OUTPUT_FORMAT
+    compression = compression or MATCH_OUTPUT_COMPRESSION
+    extension = OUTPUT_FORMATS[fmt][0]
+    return extension + ".gz" if compression == "gzip" else extension
+
+
+def output_content_type(fmt=None, compression=None):
+    fmt = fmt or MATCH_OUTPUT_FORMAT
+    compression = compression or MATCH_OUTPUT_COMPRESSION
+    return "application/gzip" if compression == "gzip" else OUTPUT_FORMATS[fmt][1]
+
+
+def iter_match_chunks(match_data, fmt=None):
+    """Yields the serialized output in pieces."""
+    fmt = fmt or MATCH_OUTPUT_FORMAT
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown match output format: {fmt}")
+
+    if fmt == "json":
+        yield from json.JSONEncoder(indent=2, ensure_ascii=False, default=to_json).iterencode(match_data)
+    elif fmt == "compact":
+        yield from json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=to_json).iterencode(match_data)
+    else:
+        encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=to_json)
+        for match in match_data:
+            yield encoder.encode(match)
+            yield "\n"
+
+
+def write_match_data(match_data, fileobj, fmt=None, compression=None):
+    """Streams `match_data` into a binary file-like object in the configured format."""
+    compression = compression or MATCH_OUTPUT_COMPRESSION
+    if compression == "gzip":
+        with gzip.GzipFile(fileobj=fileobj, mode="wb") as gz:
+            _write_chunks(match_data, gz, fmt)
+    elif compression == "none":
+        _write_chunks(match_data, fileobj, fmt)
+    else:
+        raise ValueError(f"Unknown match output compression: {compression}")
+
+
+def _write_chunks(match_data, fileobj, fmt):
+    # iterencode yields many tiny strings; batch them into larger writes
+    pending = []
+    pending_size = 0
+    for chunk in iter_match_chunks(match_data, fmt):
+        pending.append(chunk)
+        pending_size += len(chunk)
+        if pending_size >= 64 * 1024:
+            fileobj.write("".join(pending).encode("utf-8"))
+            pending = []
+            pending_size = 0
+    if pending:
+        fileobj.write("".join(pending).encode("utf-8"))
+
+
+def read_ndjson(data):
+    """Match dicts from uncompressed ndjson bytes."""
+    return [json.loads(line) for line in data.decode("utf-8").splitlines() if line.strip()]
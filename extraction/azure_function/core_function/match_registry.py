@@ -0,0 +1,158 @@
+"""
+Registry of match identifiers we have already processed.
+
+The registry used to be a single KEYS/MATCH_ID.json blob that was downloaded
+and re-uploaded in full for every league and month. It is now:
+
+  - a base snapshot at MATCH_ID_BLOB_PATH, in the original
+    {"identifiers": {match_id: {"status": ..., "version": 2}}} shape, and
+  - an append-only log of small delta blobs under MATCH_ID_DELTA_PREFIX,
+    each holding only the identifiers recorded by one flush.
+
+A run loads the snapshot and deltas once into memory, records new identifiers
+locally, and flush() writes just those as a new delta. compact() folds the
+deltas back into the snapshot, so anything reading MATCH_ID.json directly
+still sees the full registry.
+"""
+import os
+import uuid
+import logging
+import datetime
+import threading
+
+from .azure_storage import (
+    get_json_from_adls,
+    update_json_in_adls,
+    download_json_many,
+    upload_json,
+    list_blob_names,
+    delete_blobs,
+)
+
+logger = logging.getLogger()
+
+MATCH_ID_DELTA_PREFIX = os.environ.get("MATCH_ID_DELTA_PREFIX", "KEYS/MATCH_ID_deltas/")
+MATCH_ID_COMPACT_THRESHOLD = int(os.environ.get("MATCH_ID_COMPACT_THRESHOLD", "50"))
+REGISTRY_VERSION = 2
+
+
+class MatchRegistry:
+    def __init__(self):
+        self.snapshot = None
+        self.identifiers = {}
+        self._pending = {}
+        # Delta blobs (loaded or flushed) not yet folded into the snapshot:
+        # blob name -> the identifiers it holds, in the order they were written
+        self._deltas = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Reads the snapshot and all deltas. Returns False if the snapshot can't be read."""
+        snapshot = get_json_from_adls()
+        if not isinstance(snapshot, dict) or not isinstance(snapshot.get("identifiers"), dict):
+            logger.error("Failed to fetch valid match identifiers from storage")
+            return False
+
+        identifiers = dict(snapshot["identifiers"])
+        delta_names = sorted(list_blob_names(MATCH_ID_DELTA_PREFIX))
+        deltas = {}
+        for name, delta in zip(delta_names, download_json_many(delta_names)):
+            if delta:
+                deltas[name] = delta.get("identifiers", {})
+                identifiers.update(deltas[name])
+
+        with self._lock:
+            self.snapshot = snapshot
+            self.identifiers = identifiers
+            self._deltas = deltas
+        logger.info(f"Loaded {len(identifiers)} match identifiers ({len(delta_names)} delta blob(s))")
+        return True
+
+    def __contains__(self, match_id):
+        return match_id in self.identifiers
+
+    def __len__(self):
+        return len(self.identifiers)
+
+    def mark(self, match_id, status):
+        """Records a match as 'uploaded' or 'error'. Not persisted until flush()."""
+        entry = {"status": status, "version": REGISTRY_VERSION}
+        with self._lock:
+            self.identifiers[match_id] = entry
+            self._pending[match_id] = entry
+
+    @property
+    def pending(self):
+        """IDs marked since the last successful flush of them."""
+        with self._lock:
+            return list(self._pending)
+
+    def flush(self, match_ids=None):
+        """
+        Writes identifiers recorded since the last flush as one new delta blob.
+        With `match_ids`, only those are written, so concurrent league/month
+        units each commit their own delta.
+        """
+        with self._lock:
+            if match_ids is None:
+                pending, self._pending = self._pending, {}
+            else:
+                pending = {m: self._pending.pop(m) for m in match_ids if m in self._pending}
+        if not pending:
+            return True
+
+        stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        name = f"{MATCH_ID_DELTA_PREFIX}{stamp}_{uuid.uuid4().hex[:8]}.json"
+        try:
+            upload_json(name, {"identifiers": pending}, if_missing=True)
+        except Exception as e:
+            logger.error(f"Error writing match identifier delta {name}: {e}")
+            with self._lock:
+                # Keep them for the next flush; newer marks win
+                self._pending = {**pending, **self._pending}
+            return False
+
+        with self._lock:
+            self._deltas[name] = pending
+        logger.info(f"Recorded {len(pending)} match identifier(s) in {name}")
+        return True
+
+    def export(self):
+        """The full registry in the original MATCH_ID.json shape."""
+        with self._lock:
+            exported = dict(self.snapshot or {})
+            exported["identifiers"] = dict(self.identifiers)
+        return exported
+
+    def compact(self):
+        """
+        Folds the deltas this run knows about into the snapshot blob, then deletes them.
+
+        Only the delta entries are written; update_json_in_adls merges them into
+        the current snapshot under an ETag condition, so a concurrent compaction
+        or registry update is never overwritten. Deltas flushed by other units
+        while the merge runs are left for the next compaction.
+        """
+        if not self.flush():
+            return False
+        with self._lock:
+            merged = dict(self._deltas)
+        if not merged:
+            return True
+
+        delta_identifiers = {}
+        for identifiers in merged.values():
+            delta_identifiers.update(identifiers)
+        if not update_json_in_adls({"identifiers": delta_identifiers}):
+            return False
+        delete_blobs(list(merged))
+        with self._lock:
+            for name in merged:
+                self._deltas.pop(name, None)
+        logger.info(f"Compacted {len(merged)} match identifier delta(s) into the snapshot")
+        return True
+
+    def compact_if_needed(self, threshold=MATCH_ID_COMPACT_THRESHOLD):
+        if len(self._deltas) >= threshold:
+            return self.compact()
+        return True
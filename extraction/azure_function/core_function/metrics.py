@@ -0,0 +1,284 @@
+"""
+Lightweight per-run metrics: counters, histograms and timed spans.
+
+Stages of a scrape run are timed with spans, either around a block
+
+    with get_metrics().span("parse"):
+        soup = make_soup(html)
+
+or by decorating a function with @timed("blob_upload"). A span's duration is
+observed in the stage_seconds histogram under its stage plus whatever labels
+are active, so process_games can wrap a league/month in labelled(league=...)
+and every stage underneath is broken down by league without threading
+labels through the storage and extraction code.
+
+Each run starts with start_run(). At the end, summary() gives the
+per-stage / per-league breakdown. write_metrics() exports the run as JSON
+(METRICS_JSON_PATH) and/or Prometheus text format (METRICS_PROM_PATH, for a
+node_exporter textfile collector).
+"""
+import os
+import json
+import math
+import time
+import logging
+import threading
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+logger = logging.getLogger()
+
+METRICS_JSON_PATH = os.environ.get("METRICS_JSON_PATH", "")
+METRICS_PROM_PATH = os.environ.get("METRICS_PROM_PATH", "")
+METRICS_MAX_SPANS = int(os.environ.get("METRICS_MAX_SPANS", "5000"))
+METRICS_PREFIX = "scrape_"
+
+# Prometheus histogram buckets for stage_seconds
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_labels = ContextVar("metrics_labels", default={})
+
+
+def _key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _percentile(ordered, pct):
+    """Nearest-rank percentile of a sorted, non-empty list."""
+    return ordered[max(1, math.ceil(pct / 100 * len(ordered))) - 1]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+        self.counters = {}      # (name, label key) -> number
+        self.histograms = {}    # (name, label key) -> [samples]
+        self.spans = []         # [{"stage", "labels", "start", "seconds", "ok"}], capped
+        self.dropped_spans = 0
+
+    # ---- recording ----
+
+    def incr(self, name, amount=1, **labels):
+        key = (name, _key({**_labels.get(), **labels}))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, _key({**_labels.get(), **labels}))
+        with self._lock:
+            self.histograms.setdefault(key, []).append(value)
+
+    @contextmanager
+    def span(self, stage, **labels):
+        """Times the block as one `stage` span; failures are counted in stage_errors."""
+        labels = {**_labels.get(), **labels, "stage": stage}
+        started = time.perf_counter()
+        ok = True
+        try:
+            yield
+        except BaseException:
+            ok = False
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            key = _key(labels)
+            with self._lock:
+                self.histograms.setdefault(("stage_seconds", key), []).append(seconds)
+                if not ok:
+                    error_key = ("stage_errors", key)
+                    self.counters[error_key] = self.counters.get(error_key, 0) + 1
+                if len(self.spans) < METRICS_MAX_SPANS:
+                    self.spans.append({
+                        "stage": stage,
+                        "labels": {k: v for k, v in key if k != "stage"},
+                        "start": round(started - self._started, 6),
+                        "seconds": round(seconds, 6),
+                        "ok": ok,
+                    })
+                else:
+                    self.dropped_spans += 1
+
+    # ---- reading ----
+
+    def total(self, name, **labels):
+        """Sum over every series of `name` whose labels include `labels` (counter or histogram)."""
+        wanted = set(_key(labels))
+        with self._lock:
+            total = sum(v for (n, k), v in self.counters.items() if n == name and wanted <= set(k))
+            total += sum(sum(s) for (n, k), s in self.histograms.items() if n == name and wanted <= set(k))
+        return total
+
+    def summary(self):
+        """
+        {"elapsed_seconds", "stages": {stage: stats}, "leagues": {league: {stage: stats}},
+        "counters": {name: total}}, where stats are count/total/mean/p50/p95/max seconds.
+        """
+        with self._lock:
+            histograms = {k: list(v) for k, v in self.histograms.items()}
+            counters = dict(self.counters)
+
+        by_stage = {}
+        by_league = {}
+        for (name, key), samples in histograms.items():
+            if name != "stage_seconds":
+                continue
+            labels = dict(key)
+            stage = labels.get("stage")
+            by_stage.setdefault(stage, []).extend(samples)
+            if "league" in labels:
+                by_league.setdefault(labels["league"], {}).setdefault(stage, []).extend(samples)
+
+        def stats(samples):
+            ordered = sorted(samples)
+            total = sum(ordered)
+            return {
+                "count": len(ordered),
+                "total": round(total, 6),
+                "mean": round(total / len(ordered), 6),
+                "p50": round(_percentile(ordered, 50), 6),
+                "p95": round(_percentile(ordered, 95), 6),
+                "max": round(ordered[-1], 6),
+            }
+
+        totals = {}
+        for (name, _key_), value in counters.items():
+            totals[name] = totals.get(name, 0) + value
+
+        return {
+            "elapsed_seconds": round(time.perf_counter() - self._started, 6),
+            "stages": {stage: stats(s) for stage, s in sorted(by_stage.items())},
+            "leagues": {
+                league: {stage: stats(s) for stage, s in sorted(stages.items())}
+                for league, stages in sorted(by_league.items())
+            },
+            "counters": totals,
+        }
+
+    def to_json(self):
+        with self._lock:
+            counters = [{"name": n, "labels": dict(k), "value": v} for (n, k), v in self.counters.items()]
+            spans = list(self.spans)
+            dropped = self.dropped_spans
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "summary": self.summary(),
+            "counters": counters,
+            "spans": spans,
+            "dropped_spans": dropped,
+        }
+
+    def to_prometheus(self):
+        """Prometheus text exposition format (counters and bucketed histograms)."""
+        def label_text(labels):
+            if not labels:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {k: list(v) for k, v in self.histograms.items()}
+
+        lines = []
+        for name in sorted({n for n, _ in counters}):
+            lines.append(f"# TYPE {METRICS_PREFIX}{name}_total counter")
+            for (n, key), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{METRICS_PREFIX}{name}_total{label_text(key)} {value}")
+
+        for name in sorted({n for n, _ in histograms}):
+            lines.append(f"# TYPE {METRICS_PREFIX}{name} histogram")
+            for (n, key), samples in sorted(histograms.items()):
+                if n != name:
+                    continue
+                for bound in STAGE_BUCKETS:
+                    count = sum(1 for s in samples if s <= bound)
+                    lines.append(f"{METRICS_PREFIX}{name}_bucket{label_text(key + (('le', str(bound)),))} {count}")
+                lines.append(f"{METRICS_PREFIX}{name}_bucket{label_text(key + (('le', '+Inf'),))} {len(samples)}")
+                lines.append(f"{METRICS_PREFIX}{name}_sum{label_text(key)} {sum(samples)}")
+                lines.append(f"{METRICS_PREFIX}{name}_count{label_text(key)} {len(samples)}")
+
+        lines.append(f"# TYPE {METRICS_PREFIX}run_started_timestamp_seconds gauge")
+        lines.append(f"{METRICS_PREFIX}run_started_timestamp_seconds {self.started_at.timestamp()}")
+        return "\n".join(lines) + "\n"
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """The metrics of the current run."""
+    return _metrics
+
+
+def start_run():
+    """Starts a fresh set of metrics for a new run and returns it."""
+    global _metrics
+    _metrics = Metrics()
+    return _metrics
+
+
+@contextmanager
+def labelled(**labels):
+    """Adds labels to every metric recorded inside the block (in this thread / task)."""
+    token = _labels.set({**_labels.get(), **labels})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+def timed(stage):
+    """Decorator: each call is a `stage` span in the current run's metrics."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _metrics.span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _write_atomic(path, text):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def write_metrics(metrics=None, json_path=METRICS_JSON_PATH, prom_path=METRICS_PROM_PATH):
+    """Exports a run's metrics to the configured JSON / Prometheus files. Never raises."""
+    metrics = metrics or _metrics
+    for path, render in ((json_path, lambda: json.dumps(metrics.to_json(), indent=2)),
+                         (prom_path, metrics.to_prometheus)):
+        if not path:
+            continue
+        try:
+            _write_atomic(path, render())
+        except Exception as e:
+            logger.error(f"Failed to write metrics to {path}: {e}")
+
+
+def log_summary(metrics=None):
+    """Logs the per-stage breakdown of a run, slowest stages first."""
+    summary = (metrics or _metrics).summary()
+    stages = sorted(summary["stages"].items(), key=lambda item: item[1]["total"], reverse=True)
+    logger.info(f"Run metrics ({summary['elapsed_seconds']:.2f}s): " + ", ".join(
+        f"{stage} {s['total']:.2f}s/{s['count']} (p95 {s['p95'] * 1000:.0f}ms)" for stage, s in stages
+    ))
+    for league, league_stages in summary["leagues"].items():
+        logger.info(f"  {league}: " + ", ".join(
+            f"{stage} {s['total']:.2f}s" for stage, s in league_stages.items()
+        ))
+    if summary["counters"]:
+        logger.info("  counters: " + ", ".join(f"{k}={v}" for k, v in sorted(summary["counters"].items())))
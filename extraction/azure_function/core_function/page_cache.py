@@ -0,0 +1,201 @@
+"""
+On-disk cache of raw page HTML, in front of fetch_html.
+
+Bodies are stored content-addressed (gzip, named by SHA-256) so identical
+pages are kept once; a small SQLite index maps each URL to its body along
+with the ETag/Last-Modified validators BBC sent.
+
+Modes (PAGE_CACHE_MODE):
+  off         - no caching
+  revalidate  - conditional GET with If-None-Match / If-Modified-Since;
+                a 304 is answered from disk (default when PAGE_CACHE_DIR is set)
+  replay      - never touch the network; cache misses are treated as failures
+
+Eviction drops entries older than PAGE_CACHE_MAX_AGE_DAYS and then the least
+recently used ones until the cache is under PAGE_CACHE_MAX_BYTES.
+"""
+import os
+import gzip
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger()
+
+PAGE_CACHE_DIR = os.environ.get("PAGE_CACHE_DIR")
+PAGE_CACHE_MODE = os.environ.get("PAGE_CACHE_MODE", "revalidate" if PAGE_CACHE_DIR else "off")
+PAGE_CACHE_MAX_BYTES = int(os.environ.get("PAGE_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+PAGE_CACHE_MAX_AGE_DAYS = float(os.environ.get("PAGE_CACHE_MAX_AGE_DAYS", "365"))
+
+CACHE_MODES = ("off", "revalidate", "replay")
+
+
+class PageCache:
+    def __init__(self, root, mode="revalidate", max_bytes=PAGE_CACHE_MAX_BYTES, max_age_days=PAGE_CACHE_MAX_AGE_DAYS):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown page cache mode: {mode}")
+        self.root = root
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_days * 86400
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url           TEXT PRIMARY KEY,
+                sha256        TEXT NOT NULL,
+                size          INTEGER NOT NULL,
+                etag          TEXT,
+                last_modified TEXT,
+                fetched_at    REAL NOT NULL,
+                accessed_at   REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS pages_sha256 ON pages (sha256)")
+        self._db.commit()
+        self.evict()
+
+    def _object_path(self, sha256):
+        return os.path.join(self.root, "objects", sha256[:2], f"{sha256}.html.gz")
+
+    def lookup(self, url):
+        """Returns the index entry for a URL as a dict, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT sha256, size, etag, last_modified, fetched_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if not row:
+            return None
+        return dict(zip(("sha256", "size", "etag", "last_modified", "fetched_at"), row))
+
+    def conditional_headers(self, entry):
+        """Validators to send so BBC can answer 304 Not Modified."""
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def read(self, url, entry=None):
+        """Returns the cached HTML for a URL (and marks it recently used), or None."""
+        entry = entry or self.lookup(url)
+        if not entry:
+            return None
+        try:
+            with gzip.open(self._object_path(entry["sha256"]), "rt", encoding="utf-8") as f:
+                html = f.read()
+        except OSError as e:
+            logger.warning(f"Page cache object missing for {url}: {e}")
+            with self._lock:
+                self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+                self._db.commit()
+            return None
+        with self._lock:
+            self._db.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+        return html
+
+    def revalidated(self, url, etag=None, last_modified=None):
+        """
+        Records a 304 for a URL: the cached copy counts as freshly fetched (so
+        age-based eviction keeps it), with any validators the 304 sent.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE pages SET fetched_at = ?, accessed_at = ?, "
+                "etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE url = ?",
+                (now, now, etag, last_modified, url),
+            )
+            self._db.commit()
+
+    def store(self, url, html, etag=None, last_modified=None):
+        """Stores a freshly downloaded page and its validators."""
+        body = html.encode("utf-8")
+        sha256 = hashlib.sha256(body).hexdigest()
+        path = self._object_path(sha256)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp_path, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+
+        now = time.time()
+        with self._lock:
+            previous = self._db.execute("SELECT sha256 FROM pages WHERE url = ?", (url,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (url, sha256, size, etag, last_modified, fetched_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, sha256, os.path.getsize(path), etag, last_modified, now, now),
+            )
+            self._db.commit()
+            if previous and previous[0] != sha256:
+                self._drop_unreferenced([previous[0]])
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Drops expired entries, then least recently used ones until under max_bytes."""
+        with self._lock:
+            cutoff = time.time() - self.max_age_seconds
+            expired = self._db.execute("SELECT url, sha256 FROM pages WHERE fetched_at < ?", (cutoff,)).fetchall()
+            self._db.execute("DELETE FROM pages WHERE fetched_at < ?", (cutoff,))
+
+            evicted = list(expired)
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+            if total > self.max_bytes:
+                for url, sha256, size in self._db.execute(
+                    "SELECT url, sha256, size FROM pages ORDER BY accessed_at"
+                ).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+                    evicted.append((url, sha256))
+                    total -= size
+
+            self._db.commit()
+            self._drop_unreferenced({sha256 for _url, sha256 in evicted})
+
+        if evicted:
+            logger.info(f"Page cache evicted {len(evicted)} page(s)")
+
+    def _drop_unreferenced(self, sha256s):
+        # Objects are shared between URLs with identical bodies; only delete orphans
+        for sha256 in sha256s:
+            still_used = self._db.execute("SELECT 1 FROM pages WHERE sha256 = ? LIMIT 1", (sha256,)).fetchone()
+            if not still_used:
+                try:
+                    os.remove(self._object_path(sha256))
+                except FileNotFoundError:
+                    pass
+
+
+_page_cache = None
+_page_cache_lock = threading.Lock()
+
+
+def get_page_cache():
+    """Returns the process-wide cache configured from the environment, or None when disabled."""
+    global _page_cache
+    if PAGE_CACHE_MODE == "off" or not PAGE_CACHE_DIR:
+        return None
+    with _page_cache_lock:
+        if _page_cache is None:
+            _page_cache = PageCache(PAGE_CACHE_DIR, mode=PAGE_CACHE_MODE)
+        return _page_cache
+
+
+def configure_page_cache(root, mode="revalidate", **kwargs):
+    """Points the process-wide cache somewhere else (e.g. replaying a local archive)."""
+    global _page_cache, PAGE_CACHE_DIR, PAGE_CACHE_MODE
+    with _page_cache_lock:
+        PAGE_CACHE_DIR, PAGE_CACHE_MODE = root, mode
+        _page_cache = PageCache(root, mode=mode, **kwargs) if root and mode != "off" else None
+        return _page_cache
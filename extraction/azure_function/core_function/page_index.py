@@ -0,0 +1,88 @@
+"""
+Single-pass index over a BBC match page.
+
+build_page_index walks the parsed document once and files every element the
+extractors care about under a field name. GetGameData and the player
+extraction then look nodes up in the index instead of each running its own
+soup.find / find_all / select over the whole tree.
+
+Matching follows BeautifulSoup's class_ rules: a class value matches if any
+single class matches or, failing that, the space-joined class string does.
+Which classes and data-testids map to which field comes from the active
+selector set in markup.py.
+"""
+from bs4.element import Tag
+
+from .markup import active_markup
+
+
+def _class_values(tag):
+    """Returns (individual classes, joined class string) for a tag."""
+    classes = tag.get("class")
+    if not classes:
+        return (), None
+    if isinstance(classes, str):
+        return (classes,), classes
+    return classes, " ".join(classes)
+
+
+def _regex_matches(pattern, classes, joined):
+    for value in classes:
+        if pattern.search(value):
+            return True
+    return len(classes) != 1 and pattern.search(joined) is not None
+
+
+def build_page_index(soup):
+    """
+    Walks the document once and returns {field: [matching tags in document order]}.
+    Fields with no matching element are absent.
+    """
+    index = {}
+    markup = active_markup()
+    exact_class_fields = markup.exact_class_fields
+    pattern_class_fields = markup.pattern_class_fields
+    substring_class_fields = markup.substring_class_fields
+    testid_fields = markup.testid_fields
+
+    for node in soup.descendants:
+        if not isinstance(node, Tag):
+            continue
+        name = node.name
+
+        testid = node.get("data-testid")
+        if testid in testid_fields:
+            wanted_name, field = testid_fields[testid]
+            if wanted_name is None or wanted_name == name:
+                index.setdefault(field, []).append(node)
+
+        classes, joined = _class_values(node)
+        if not classes:
+            continue
+
+        for value in classes:
+            field = exact_class_fields.get((name, value))
+            if field:
+                index.setdefault(field, []).append(node)
+                break
+        else:
+            if len(classes) != 1:
+                field = exact_class_fields.get((name, joined))
+                if field:
+                    index.setdefault(field, []).append(node)
+
+        for wanted_name, pattern, field in pattern_class_fields:
+            if (wanted_name is None or wanted_name == name) and _regex_matches(pattern, classes, joined):
+                index.setdefault(field, []).append(node)
+
+        for wanted_name, substring, field in substring_class_fields:
+            if wanted_name == name and substring in joined:
+                index.setdefault(field, []).append(node)
+
+    return index
+
+
+def first(page_index, field):
+    """Returns the first element indexed under `field`, or None."""
+    nodes = page_index.get(field)
+    return nodes[0] if nodes else None
@@ -1,22 +1,37 @@
+import os
+import time
 import logging
-from .web_utils import Generate_Soup
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from .web_utils import Generate_Soup, fetch_many, make_soup
 
 
-from .azure_storage import (
-    get_json_from_adls,
-    update_json_in_adls,
-    save_match_data_to_adls,
-)
+from .azure_storage import run_lock
+from .match_registry import MatchRegistry
+from .match_checkpoint import CheckpointWriter, compact_leftover_parts
+from .aggregate_store import get_aggregate_store
+from .metrics import start_run, labelled, log_summary, write_metrics
 
-
-from .general_utils import generate_file_name
-from .extract_game_data import GetGameData , extract_match_identifiers
+# extract_game_data (and bs4 under it) is imported by the functions that parse,
+# so importing this module stays cheap on a cold start
 
 
 # Set up logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# (league, month) units run side by side; page fetches stay polite through
+# the per-host limits in web_utils, whichever unit they come from
+LEAGUE_MAX_WORKERS = int(os.environ.get("LEAGUE_MAX_WORKERS", "4"))
+# A unit that runs longer than this stops before its next match; batches already
+# committed are kept (see match_checkpoint.py)
+LEAGUE_UNIT_TIMEOUT = float(os.environ.get("LEAGUE_UNIT_TIMEOUT", "900"))
+
+
+class UnitTimeout(Exception):
+    pass
+
+
 def process_games_for_months(months_to_process, leagues):
     """
     Processes match data for a list of given months.
@@ -24,72 +39,260 @@ def process_games_for_months(months_to_process, leagues):
     Args:
         months_to_process (list): A list of YYYY-MM strings representing months to process.
         leagues (dict): Dictionary of leagues and their URLs.
+
+    Each (league, month) is an independent unit on a worker pool with its own
+    output file and registry deltas, so a slow or failing league doesn't hold up
+    or lose the others. Returns one result dict per unit (see _process_league_month).
+
+    Only one run at a time: an overlapping run (e.g. the timer and a manual
+    scrapeHTTP call) fails with RuntimeError while the run lock is held.
     """
-    for stringYearMonth in months_to_process:
-        for league, league_url in leagues.items():
-            try:
-                leagueYearMonth = f"{league_url}/{stringYearMonth}?filter=results"
-                makeCallLeagueYearMonth = Generate_Soup(leagueYearMonth)
-
-                if not makeCallLeagueYearMonth[1]:
-                    logger.error(f"Failed to fetch league data: {leagueYearMonth}")
-                    continue
+    with run_lock():
+        return _process_games_for_months(months_to_process, leagues)
+
+
+def _process_games_for_months(months_to_process, leagues):
+    # Stages are timed as metric spans (see metrics.py); listing fetch, extraction,
+    # registry download/update and blob upload are timed where they are defined.
+    metrics = start_run()
+    try:
+        return _run(metrics, months_to_process, leagues)
+    finally:
+        log_summary(metrics)
+        write_metrics(metrics)
+
+
+def _run(metrics, months_to_process, leagues, max_workers=LEAGUE_MAX_WORKERS, unit_timeout=LEAGUE_UNIT_TIMEOUT):
+    # Loaded once per run and shared by every unit; each unit only writes the identifiers it adds
+    registry = MatchRegistry()
+    with metrics.span("registry_load"):
+        loaded = registry.load()
+    if not loaded:
+        return []
+    with metrics.span("compact_leftover_parts"):
+        compact_leftover_parts(registry)
+
+    units = [
+        (league, league_url, stringYearMonth)
+        for stringYearMonth in months_to_process
+        for league, league_url in leagues.items()
+    ]
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="league") as executor:
+        futures = [
+            executor.submit(
+                run_unit, metrics, league, stringYearMonth, unit_timeout,
+                functools.partial(_process_league_month, metrics, registry, league, league_url, stringYearMonth),
+            )
+            for league, league_url, stringYearMonth in units
+        ]
+        results = [future.result() for future in futures]
+
+    flush_registry(metrics, registry, results)
+    with metrics.span("registry_compact"):
+        registry.compact_if_needed()
+
+    log_results(results)
+    return results
+
+
+def flush_registry(metrics, registry, results):
+    """
+    Writes the identifiers still pending after every unit has stopped (their
+    deltas failed during the run) before the process exits with them; they
+    would otherwise be scraped again next run. Each result's `unrecorded` is
+    narrowed to what is still missing.
+    """
+    with metrics.span("registry_flush"):
+        flushed = registry.flush()
+    pending = set(registry.pending)
+    if not flushed:
+        metrics.incr("registry_flush_failed")
+        logger.error(
+            f"Failed to record {len(pending)} match identifier(s) at the end of the run; "
+            f"their parts are compacted (and recorded) by the next run"
+        )
+    for r in results:
+        if r.get("unrecorded"):
+            r["unrecorded"] = [match_id for match_id in r["unrecorded"] if match_id in pending]
+            if not r["unrecorded"]:
+                r["error"] = "registry delta written at the end of the run"
+    return flushed
+
+
+def run_unit(metrics, league, stringYearMonth, unit_timeout, work):
+    """
+    Runs one (league, month) unit as work(deadline, result), turning any failure
+    into its result row.
+    """
+    started = time.perf_counter()
+    result = {"league": league, "month": stringYearMonth, "status": None,
+              "listed": 0, "fetched": 0, "failed": 0, "error": None, "aggregates_pending": [], "unrecorded": []}
+    with labelled(league=league, month=stringYearMonth):
+        try:
+            work(started + unit_timeout, result)
+        except UnitTimeout:
+            result["status"] = "timeout"
+            result["error"] = f"exceeded {unit_timeout:g}s"
+            metrics.incr("league_months_timed_out")
+            logger.error(f"{league} {stringYearMonth} timed out after {unit_timeout:g}s; committed batches kept")
+        except Exception as e:
+            result["status"] = "error"
+            result["error"] = str(e)
+            metrics.incr("league_months_failed")
+            logger.error(f"Unexpected error in process_games_for_months ({league} {stringYearMonth}): {e}")
+    result["seconds"] = round(time.perf_counter() - started, 2)
+    return result
 
-                id_dictionary = get_json_from_adls()
-                if not isinstance(id_dictionary, dict):
-                    logger.error("Failed to fetch valid match identifiers from storage")
+
+def _check_deadline(deadline):
+    if time.perf_counter() > deadline:
+        raise UnitTimeout()
+
+
+def _process_league_month(metrics, registry, league, league_url, stringYearMonth, deadline, result):
+    """
+    Scrapes one league/month and commits it batch by batch (see process_match_ids).
+    Fills in `result` as it goes; status is ok, no_new_matches, listing_failed,
+    save_failed, registry_failed or aggregates_failed.
+    """
+    from .extract_game_data import extract_match_identifiers
+
+    leagueYearMonth = f"{league_url}/{stringYearMonth}?filter=results"
+    makeCallLeagueYearMonth = Generate_Soup(leagueYearMonth)
+
+    if not makeCallLeagueYearMonth[1]:
+        metrics.incr("league_months_failed")
+        logger.error(f"Failed to fetch league data: {leagueYearMonth}")
+        result["status"] = "listing_failed"
+        return
+
+    returnLeagueYearMonthIds = extract_match_identifiers(makeCallLeagueYearMonth[0])
+    logger.info(f"Match IDs to be processed: {returnLeagueYearMonthIds}")
+
+    pending = [page for page in returnLeagueYearMonthIds if page not in registry]
+    result["listed"] = len(returnLeagueYearMonthIds)
+    metrics.incr("matches_listed", len(returnLeagueYearMonthIds))
+    metrics.incr("matches_already_known", len(returnLeagueYearMonthIds) - len(pending))
+    process_match_ids(metrics, registry, league, stringYearMonth, pending, deadline, result)
+
+
+def process_match_ids(metrics, registry, league, stringYearMonth, pending, deadline, result):
+    """
+    Fetches and extracts the given match IDs of one league/month. Matches are
+    committed in small batches through a CheckpointWriter (part blob plus
+    registry delta) and compacted into one output file once the unit is done.
+    Shared with the backfill planner, which works out `pending` up front.
+    """
+    from .extract_game_data import GetGameData
+
+    writer = CheckpointWriter(registry, league, stringYearMonth, on_commit=functools.partial(_commit_aggregates, metrics))
+    matchURLs = [f"https://www.bbc.co.uk/sport/football/live/{page}" for page in pending]
+
+    # Pages are fetched concurrently but yielded in order; time spent
+    # blocked on the iterator is fetch time, the rest is parsing / extraction.
+    fetched = fetch_many(matchURLs)
+    try:
+        for page, matchURL in zip(pending, matchURLs):
+            _check_deadline(deadline)
+            with metrics.span("match_fetch_wait"):
+                html, ok = next(fetched)
+
+            if ok:
+                logger.info(f"Processing match: {matchURL}")
+                try:
+                    with metrics.span("parse"):
+                        soup = make_soup(html)
+                    match_data = GetGameData(soup, league, page)
+                except Exception as e:
+                    # One bad page shouldn't lose the rest of the league-month
+                    logger.error(f"Failed to extract match data: {matchURL}: {e}")
+                    writer.add_error(page)
                     continue
+                writer.add(page, match_data)
+            else:
+                logger.warning(f"Failed to fetch match data: {matchURL}")
+                writer.add_error(page)
+    except Exception:
+        # Timed out or failed: keep what is already done, the rest is retried next run
+        writer.flush()
+        raise
+    finally:
+        # Cancels the fetches still queued if the unit stopped early
+        fetched.close()
+        result["fetched"] = writer.committed
+        result["failed"] = writer.committed_errors
+        result["aggregates_pending"] = writer.unapplied
+        result["unrecorded"] = writer.unrecorded
+
+    logger.info(
+        f"{league} {stringYearMonth}: {len(pending)} pending, "
+        f"fetch {metrics.total('stage_seconds', stage='match_fetch_wait', league=league, month=stringYearMonth):.2f}s, "
+        f"parse {metrics.total('stage_seconds', stage='parse', league=league, month=stringYearMonth):.2f}s, "
+        f"extract {metrics.total('stage_seconds', stage='extract', league=league, month=stringYearMonth):.2f}s"
+    )
 
-                JSON_LIST = []
-                MATCH_LIST = []
-                ERROR_LIST = []
-                returnLeagueYearMonthIds = extract_match_identifiers(makeCallLeagueYearMonth[0])
-                logger.info(f"Match IDs to be processed: {returnLeagueYearMonthIds}")
-
-                for page in returnLeagueYearMonthIds:
-                    if page not in id_dictionary["identifiers"]:
-                        matchURL = f"https://www.bbc.co.uk/sport/football/live/{page}"
-                        callMatch = Generate_Soup(matchURL)
-
-                        if callMatch[1]:
-                            logger.info(f"Processing match: {matchURL}")
-                            match_data = GetGameData(callMatch[0], league, page)
-                            JSON_LIST.append(match_data)
-                            MATCH_LIST.append(page)
-                        else:
-                            logger.warning(f"Failed to fetch match data: {matchURL}")
-                            ERROR_LIST.append(page)
-                            logger.info(f"Match Data append to Json list")
-
-                # 🔹 Prevent Saving Empty Files 🔹
-                if JSON_LIST:
-                    filename = generate_file_name(league, stringYearMonth)
-                    saveToBucket = save_match_data_to_adls(JSON_LIST, filename)
-
-                    if not saveToBucket:
-                        logger.error(f"Failed to save match data to S3 for {filename}")
-                    else:
-                        logger.info(f"SaveWorked {filename}")
-                else:
-                    logger.info(f"No match data to save for {league} {stringYearMonth}, skipping S3 save.")
-
-                # 🔹 Only Update Identifiers If We Actually Processed Matches 🔹
-                if MATCH_LIST:
-                    for m in MATCH_LIST:
-                        id_dictionary["identifiers"][m] = {"status": "uploaded", "version": 2}
-                if ERROR_LIST:
-                    for m1 in ERROR_LIST:
-                        id_dictionary["identifiers"][m1] = {"status": "error", "version": 2}
-
-
-                success = update_json_in_adls(id_dictionary)
-                if not success:
-                    logger.error("Failed to update match identifiers in S3.")
-                else:
-                    logger.info(f"No new match IDs processed for {league} {stringYearMonth}, skipping identifier update.")
-
-            except Exception as e:
-                logger.error(f"Unexpected error in process_games_for_months: {e}")
+    finished = writer.finish()
+    result["fetched"] = writer.committed
+    result["failed"] = writer.committed_errors
+    result["aggregates_pending"] = writer.unapplied
+    result["unrecorded"] = writer.unrecorded
+    if writer.unapplied:
+        # Saved and registered, so no later run offers them again: replay the
+        # output file into the store (python -m core_function.aggregate_store)
+        metrics.incr("aggregate_matches_failed", len(writer.unapplied))
+        result["error"] = f"{len(writer.unapplied)} match(es) not applied to the aggregate store"
+        logger.error(
+            f"{league} {stringYearMonth}: aggregates not updated for {', '.join(writer.unapplied)}; "
+            f"replay its output file with core_function.aggregate_store"
+        )
+    if writer.unrecorded:
+        # Saved in parts but missing from the registry; the parts are kept and
+        # the next run compacts them, recording what the registry still lacks
+        result["error"] = f"{len(writer.unrecorded)} match(es) not recorded in the registry"
+        logger.error(f"{league} {stringYearMonth}: registry delta not written for {', '.join(writer.unrecorded)}")
+    if writer.unrecorded:
+        result["status"] = "registry_failed"
+    elif not finished:
+        # Whatever was committed stays in its parts; the next run compacts them
+        result["status"] = "save_failed"
+    elif writer.unapplied:
+        result["status"] = "aggregates_failed"
+    elif result["status"] is None:
+        result["status"] = "ok" if pending else "no_new_matches"
 
 
+def _commit_aggregates(metrics, match_data):
+    with metrics.span("aggregates"):
+        return update_aggregates(match_data)
 
+
+def log_results(results):
+    """Logs one line per (league, month) unit, as a table."""
+    logger.info(f"{'league':<28} {'month':<8} {'status':<15} {'listed':>6} {'fetched':>7} {'failed':>6} {'secs':>7}")
+    for r in results:
+        logger.info(
+            f"{r['league']:<28} {r['month']:<8} {r['status']:<15} {r['listed']:>6} {r['fetched']:>7} "
+            f"{r['failed']:>6} {r['seconds']:>7.1f}" + (f"  {r['error']}" if r["error"] else "")
+        )
+
+
+def update_aggregates(match_data):
+    """
+    Applies saved matches to the incremental aggregate store, if one is
+    configured. Returns False if the store couldn't be updated; the
+    CheckpointWriter keeps those matches and offers them again.
+    """
+    try:
+        store = get_aggregate_store()
+        if store is None:
+            return True
+        started = time.perf_counter()
+        new, replayed = store.apply_matches(match_data)
+        logger.info(
+            f"Aggregates updated: {new} new, {replayed} replayed match(es) "
+            f"in {(time.perf_counter() - started) * 1000:.1f}ms"
+        )
+        return True
+    except Exception as e:
+        logger.error(f"Failed to update aggregates: {e}")
+        return False
@@ -0,0 +1,172 @@
+"""
+Offline re-extraction of archived match pages.
+
+When BBC changes its markup we can fix the extractors and re-run them over
+pages we already have, instead of scraping everything again. The source is a
+directory (or .zip archive) laid out as:
+
+    <league>/<YYYY-MM>/<match_id>.html      (or .html.gz)
+
+Pages are parsed on a process pool in chunks. Results come back grouped by
+league and month, and each group is written out as soon as it is complete,
+using the same per-league/month files as process_games_for_months.
+
+Usage:
+    python -m core_function.reprocess ARCHIVE [--output-dir DIR] [--workers N]
+"""
+import os
+import io
+import gzip
+import time
+import logging
+import argparse
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+
+from .web_utils import make_soup
+from .general_utils import generate_file_name
+from .extract_game_data import extract_match
+from .extract_player import set_quiet
+from .match_output import output_extension, write_match_data
+
+logger = logging.getLogger()
+
+REPROCESS_CHUNKSIZE = int(os.environ.get("REPROCESS_CHUNKSIZE", "8"))
+
+
+def _page_key(parts):
+    """Maps (league, period, filename) to (league, period, match_id), or None if it isn't a page."""
+    if len(parts) != 3:
+        return None
+    league, period, name = parts
+    for suffix in (".html.gz", ".html"):
+        if name.endswith(suffix):
+            return league, period, name[:-len(suffix)]
+    return None
+
+
+def list_archived_pages(source):
+    """
+    Returns sorted work items (league, period, match_id, archive, member) for every
+    stored page. `archive` is the zip path, or None when `member` is a file on disk.
+    """
+    items = []
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for member in archive.namelist():
+                key = _page_key(member.strip("/").split("/"))
+                if key:
+                    items.append((*key, source, member))
+    else:
+        for root, _dirs, files in os.walk(source):
+            for name in files:
+                path = os.path.join(root, name)
+                key = _page_key(os.path.relpath(path, source).split(os.sep))
+                if key:
+                    items.append((*key, None, path))
+    items.sort()
+    return items
+
+
+# Each worker process keeps its zip archives open between pages
+_open_archives = {}
+
+
+def _read_page(archive, member):
+    if archive is None:
+        with open(member, "rb") as f:
+            data = f.read()
+    else:
+        if archive not in _open_archives:
+            _open_archives[archive] = zipfile.ZipFile(archive)
+        data = _open_archives[archive].read(member)
+    if member.endswith(".gz"):
+        data = gzip.GzipFile(fileobj=io.BytesIO(data)).read()
+    return data.decode("utf-8")
+
+
+def _extract_page(item):
+    """
+    Process-pool worker: parse one stored page and extract it. Returns the
+    slotted Match model; a league/month group held as models takes roughly
+    half the memory of the equivalent dicts until it is written.
+    """
+    league, period, match_id, archive, member = item
+    try:
+        match_data = extract_match(make_soup(_read_page(archive, member)), league, match_id)
+        return league, period, match_id, match_data
+    except Exception as e:
+        logger.error(f"Failed to re-extract {member}: {e}")
+        return league, period, match_id, None
+
+
+def _save_locally(match_data, filename, output_dir):
+    path = os.path.join(output_dir, f"{filename}{output_extension()}")
+    with open(path, "wb") as f:
+        write_match_data(match_data, f)
+    logger.info(f"Match data written to {path}")
+    return True
+
+
+def reprocess_archived_pages(source, output_dir=None, max_workers=None, chunksize=REPROCESS_CHUNKSIZE, quiet=False):
+    """
+    Re-runs GetGameData over every archived page under `source`.
+
+    Output goes to ADLS via save_match_data_to_adls, or to `output_dir` when
+    given. `quiet` puts extraction logging in quiet mode in the workers.
+    Returns {(league, period): {"matches": n, "errors": [match_ids]}}.
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        save = lambda data, filename: _save_locally(data, filename, output_dir)
+    else:
+        from .azure_storage import save_match_data_to_adls
+        save = save_match_data_to_adls
+
+    items = list_archived_pages(source)
+    logger.info(f"Re-extracting {len(items)} archived page(s) from {source}")
+
+    started = time.perf_counter()
+    summary = {}
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=set_quiet if quiet else None) as executor:
+        results = executor.map(_extract_page, items, chunksize=max(1, chunksize))
+        # Items are sorted, so each league/month arrives as one contiguous run
+        for (league, period), group in groupby(results, key=lambda r: (r[0], r[1])):
+            JSON_LIST = []
+            ERROR_LIST = []
+            for _league, _period, match_id, match_data in group:
+                if match_data is None:
+                    ERROR_LIST.append(match_id)
+                else:
+                    JSON_LIST.append(match_data)
+
+            if JSON_LIST:
+                filename = generate_file_name(league, period)
+                if not save(JSON_LIST, filename):
+                    logger.error(f"Failed to save re-extracted match data for {filename}")
+            summary[(league, period)] = {"matches": len(JSON_LIST), "errors": ERROR_LIST}
+
+    elapsed = time.perf_counter() - started
+    rate = len(items) / elapsed if elapsed else 0.0
+    logger.info(f"Re-extracted {len(items)} page(s) in {elapsed:.1f}s ({rate:.1f} pages/s)")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-run match extraction over archived BBC pages.")
+    parser.add_argument("source", help="Directory or .zip archive laid out as <league>/<YYYY-MM>/<match_id>.html")
+    parser.add_argument("--output-dir", help="Write output files here instead of uploading to ADLS")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunksize", type=int, default=REPROCESS_CHUNKSIZE, help="Pages handed to a worker at a time")
+    parser.add_argument("--quiet", action="store_true", help="Only log extraction errors (see EXTRACTION_QUIET)")
+    args = parser.parse_args(argv)
+
+    summary = reprocess_archived_pages(args.source, args.output_dir, args.workers, args.chunksize, args.quiet)
+    for (league, period), result in summary.items():
+        print(f"{league} {period}: {result['matches']} matches, {len(result['errors'])} errors")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1,10 +1,20 @@
-import requests
+import os
+import time
 import random
-from bs4 import BeautifulSoup as bs
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 import logging
 
+from .page_cache import get_page_cache
+from .metrics import timed
+
 logger = logging.getLogger()
 
+# requests and bs4 are imported on first use rather than here: they are a large
+# share of a cold start, and nothing needs them until the first fetch / parse.
+
 USER_AGENTS = [
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64)',
     'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)',
@@ -12,20 +22,265 @@ USER_AGENTS = [
     'Mozilla/5.0'
 ]
 
-def Generate_Soup(url, max_retries=3, timeout=5):
-    """Fetch and parse HTML with retries and exponential backoff."""
+# Concurrency settings for fetch_many (overridable via app settings)
+FETCH_MAX_WORKERS = int(os.environ.get("FETCH_MAX_WORKERS", "8"))
+FETCH_PER_HOST_LIMIT = int(os.environ.get("FETCH_PER_HOST_LIMIT", "4"))
+FETCH_MIN_INTERVAL = float(os.environ.get("FETCH_MIN_INTERVAL", "0.25"))
+
+# Shared HTTP session settings
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", str(max(FETCH_MAX_WORKERS, FETCH_PER_HOST_LIMIT))))
+HTTP_RETRY_BACKOFF = float(os.environ.get("HTTP_RETRY_BACKOFF", "0.5"))
+HTTP_MAX_RETRY_AFTER = float(os.environ.get("HTTP_MAX_RETRY_AFTER", "30"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _accept_encoding():
+    """Advertise brotli only when a decoder is installed (urllib3 decodes it transparently)."""
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        try:
+            import brotlicffi  # noqa: F401
+        except ImportError:
+            return "gzip, deflate"
+    return "gzip, deflate, br"
+
+
+# HTML parser backend for make_soup: "html.parser" (pure Python, default),
+# "lxml" (C, much faster on large pages) or "html5lib"
+SOUP_PARSER = os.environ.get("SOUP_PARSER", "html.parser")
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _build_session(pool_size):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    # Retries are handled in fetch_html so that backoff and logging stay in one place
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "Accept-Encoding": _accept_encoding(),
+        "Connection": "keep-alive",
+    })
+    return session
+
+
+def get_session():
+    """Returns the process-wide pooled session, so keep-alive connections are reused across a run."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _build_session(HTTP_POOL_SIZE)
+        return _session
+
+
+def configure_session(pool_size=None):
+    """Rebuilds the shared session, e.g. with a larger connection pool for a backfill."""
+    global _session, HTTP_POOL_SIZE
+    with _session_lock:
+        if pool_size:
+            HTTP_POOL_SIZE = pool_size
+        old_session, _session = _session, _build_session(HTTP_POOL_SIZE)
+    if old_session is not None:
+        old_session.close()
+    return _session
+
+
+def _backoff_delay(attempt, retry_after=None):
+    """Exponential backoff with full jitter; a numeric Retry-After header wins when present."""
+    if retry_after:
+        try:
+            return min(float(retry_after), HTTP_MAX_RETRY_AFTER)
+        except ValueError:
+            pass
+    return random.uniform(0, HTTP_RETRY_BACKOFF * 2 ** (attempt - 1))
+
+
+_host_lock = threading.Lock()
+_host_semaphores = {}
+_host_next_slot = {}
+
+
+def _host_slot(host):
+    """Returns the per-host semaphore, creating it on first use."""
+    with _host_lock:
+        if host not in _host_semaphores:
+            _host_semaphores[host] = threading.BoundedSemaphore(FETCH_PER_HOST_LIMIT)
+            _host_next_slot[host] = 0.0
+        return _host_semaphores[host]
+
+
+def _wait_for_turn(host):
+    """Spaces request starts to the same host at least FETCH_MIN_INTERVAL apart."""
+    with _host_lock:
+        now = time.monotonic()
+        start_at = max(now, _host_next_slot[host])
+        _host_next_slot[host] = start_at + FETCH_MIN_INTERVAL
+    delay = start_at - now
+    if delay > 0:
+        time.sleep(delay)
+
+
+def fetch_html(url, max_retries=3, timeout=5):
+    """
+    Fetch a page's HTML with retries. Returns (text, True) or (None, False).
+
+    Timeouts, connection errors, 429 and 5xx responses are retried with
+    jittered exponential backoff; any other failure is returned straight away.
+
+    When the page cache is enabled the request is made conditional on the
+    cached copy's validators, and in replay mode the network is never used.
+    """
+    import requests
+
+    cache = get_page_cache()
+    cached_entry = cache.lookup(url) if cache else None
+    if cache and cache.mode == "replay":
+        html = cache.read(url, cached_entry)
+        if html is None:
+            logger.warning(f"Replay mode: {url} is not in the page cache")
+            return None, False
+        return html, True
+
     headers = {'user-agent': random.choice(USER_AGENTS)}
+    if cache:
+        headers.update(cache.conditional_headers(cached_entry))
+    session = get_session()
     for attempt in range(1, max_retries + 1):
+        retry_after = None
         try:
-            response = requests.get(url, headers=headers, timeout=timeout)
-            response.encoding = 'utf-8'
-            response.raise_for_status()
-            logger.info(f"Successful request to {url}")
-            return bs(response.text, "html.parser"), True
+            response = session.get(url, headers=headers, timeout=timeout)
+            if response.status_code == 304:
+                html = cache.read(url, cached_entry) if cache and cached_entry else None
+                if html is not None:
+                    cache.revalidated(
+                        url,
+                        etag=response.headers.get("ETag"),
+                        last_modified=response.headers.get("Last-Modified"),
+                    )
+                    logger.info(f"Not modified, served from page cache: {url}")
+                    return html, True
+                # Nothing to serve the 304 from (the cached body went missing, or
+                # there never was one); ask again without the validators
+                response.close()
+                logger.warning(f"HTTP 304 from {url} without a cached copy on attempt {attempt}. Retrying...")
+                for header in ("If-None-Match", "If-Modified-Since"):
+                    headers.pop(header, None)
+                cached_entry = None
+                continue
+            if response.status_code in RETRY_STATUSES:
+                retry_after = response.headers.get("Retry-After")
+                response.close()
+                logger.warning(f"HTTP {response.status_code} from {url} on attempt {attempt}. Retrying...")
+            else:
+                response.encoding = 'utf-8'
+                response.raise_for_status()
+                logger.info(f"Successful request to {url}")
+                if cache:
+                    cache.store(
+                        url,
+                        response.text,
+                        etag=response.headers.get("ETag"),
+                        last_modified=response.headers.get("Last-Modified"),
+                    )
+                return response.text, True
         except requests.exceptions.Timeout:
             logger.warning(f"Timeout on attempt {attempt}. Retrying...")
+        except requests.exceptions.ConnectionError as e:
+            logger.warning(f"Connection error on attempt {attempt}: {e}. Retrying...")
         except requests.exceptions.RequestException as e:
             logger.error(f"Request failed: {e}")
             return None, False
+
+        if attempt < max_retries:
+            time.sleep(_backoff_delay(attempt, retry_after))
     logger.error(f"Failed to fetch data after {max_retries} attempts")
     return None, False
+
+
+def polite_fetch_html(url, max_retries=3, timeout=5):
+    """fetch_html, limited to FETCH_PER_HOST_LIMIT in-flight requests per host."""
+    cache = get_page_cache()
+    if cache and cache.mode == "replay":
+        return fetch_html(url, max_retries=max_retries, timeout=timeout)
+    host = urlsplit(url).netloc
+    with _host_slot(host):
+        _wait_for_turn(host)
+        return fetch_html(url, max_retries=max_retries, timeout=timeout)
+
+
+def fetch_many(urls, max_workers=None, window=None):
+    """
+    Fetch several pages concurrently.
+
+    A generator of (text, ok) tuples in the same order as `urls`, so callers
+    can start parsing the first pages while later ones are in flight. URLs are
+    submitted as results are consumed, at most `window` (default twice the
+    workers) ahead of the caller. Closing the generator, or dropping it, cancels
+    the fetches not yet started, so a caller that stops early (a unit past its
+    deadline, an exception) doesn't keep fetching pages nobody will read.
+    """
+    urls = list(urls)
+    if not urls:
+        return
+    workers = min(max_workers or FETCH_MAX_WORKERS, len(urls))
+    window = max(1, window or 2 * workers)
+    remaining = iter(urls)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch")
+    in_flight = deque()
+    try:
+        for url in remaining:
+            in_flight.append(executor.submit(polite_fetch_html, url))
+            if len(in_flight) >= window:
+                break
+        while in_flight:
+            result = in_flight.popleft().result()
+            # Keep the window full before handing the page over
+            url = next(remaining, None)
+            if url is not None:
+                in_flight.append(executor.submit(polite_fetch_html, url))
+            yield result
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+_resolved_parsers = {}
+
+
+def _resolve_parser(parser):
+    """Falls back to html.parser (once, with a warning) if a backend isn't installed."""
+    from bs4 import BeautifulSoup as bs, FeatureNotFound
+
+    if parser not in _resolved_parsers:
+        try:
+            bs("", parser)
+            _resolved_parsers[parser] = parser
+        except FeatureNotFound:
+            logger.warning(f"HTML parser '{parser}' is not installed, falling back to html.parser")
+            _resolved_parsers[parser] = "html.parser"
+    return _resolved_parsers[parser]
+
+
+def make_soup(html, parser=None):
+    """Parse an HTML string into a BeautifulSoup object using the configured backend."""
+    from bs4 import BeautifulSoup as bs
+
+    return bs(html, _resolve_parser(parser or SOUP_PARSER))
+
+
+@timed("listing_fetch")
+def Generate_Soup(url, max_retries=3, timeout=5):
+    """
+    Fetch and parse HTML with retries and exponential backoff. Goes through the
+    same per-host limits as fetch_many, so listing fetches from concurrent
+    league/month units stay polite too.
+    """
+    html, ok = polite_fetch_html(url, max_retries=max_retries, timeout=timeout)
+    if not ok:
+        return None, False
+    return make_soup(html), True
@@ -8,6 +8,10 @@ import azure.functions as func
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# core_function is imported inside main, so indexing the function and parsing
+# the request don't pay for it. Modules, the blob store and the HTTP session
+# are cached in the worker process and reused by every later invocation.
+
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """
     HTTP-triggered Function that runs the scraper.
@@ -35,11 +39,11 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         logger.info(f"Processing matches for period: {period}")
 
         # This is your existing core logic
-        process_games_for_months([period], leagues)
+        results = process_games_for_months([period], leagues)
 
         return func.HttpResponse(
             status_code=200,
-            body=json.dumps({"message": "Scrape completed", "period": period}),
+            body=json.dumps({"message": "Scrape completed", "period": period, "results": results}),
             mimetype="application/json",
         )
 
@@ -0,0 +1,52 @@
+"""
+Helpers for working with a corpus of saved BBC pages.
+
+A corpus is a directory of match pages saved as <match_id>.html (or
+<match_id>.html.gz). Sub-directories are walked, so pages can be grouped
+however is convenient (e.g. by league or month).
+"""
+import gzip
+import math
+import os
+import statistics
+
+
+def iter_pages(corpus_dir):
+    """Yields (match_id, html) for every saved page in the corpus, sorted by path."""
+    paths = []
+    for root, _dirs, files in os.walk(corpus_dir):
+        for name in files:
+            if name.endswith(".html") or name.endswith(".html.gz"):
+                paths.append(os.path.join(root, name))
+
+    for path in sorted(paths):
+        name = os.path.basename(path)
+        if name.endswith(".gz"):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                html = f.read()
+            match_id = name[:-len(".html.gz")]
+        else:
+            with open(path, encoding="utf-8") as f:
+                html = f.read()
+            match_id = name[:-len(".html")]
+        yield match_id, html
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile (0-100) of a non-empty list."""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarise(samples):
+    """Returns mean/p50/p95/max in milliseconds for a list of durations in seconds."""
+    if not samples:
+        return {"n": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+    return {
+        "n": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": statistics.median(samples) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "max_ms": max(samples) * 1000,
+    }
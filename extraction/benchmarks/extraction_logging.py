@@ -0,0 +1,102 @@
+"""
+Measure what extraction logging costs per match on a corpus of saved pages.
+
+GetGameData is timed on every page under three logging setups, each with a
+handler that formats records and writes them to os.devnull:
+
+  debug  - root logger at DEBUG, i.e. everything extraction can log (what
+           the old import-time basicConfig(level=DEBUG) switched on)
+  info   - root logger at INFO, the normal Functions / app.py setting
+  quiet  - INFO, with extraction in quiet mode (EXTRACTION_QUIET / set_quiet)
+
+Parsing happens once up front so only extraction is timed.
+
+Usage (from the repository root):
+    python -m extraction.benchmarks.extraction_logging --corpus path/to/pages [--repeat 3]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+from extraction.azure_function.core_function.web_utils import make_soup
+from extraction.azure_function.core_function.extract_game_data import GetGameData
+from extraction.azure_function.core_function.extract_player import set_quiet
+from extraction.benchmarks.corpus import iter_pages, summarise
+
+MODES = {
+    "debug": (logging.DEBUG, False),
+    "info": (logging.INFO, False),
+    "quiet": (logging.INFO, True),
+}
+
+
+class _CountingHandler(logging.StreamHandler):
+    """Formats and writes every record it gets (like a real handler) and counts them."""
+
+    def __init__(self, stream):
+        super().__init__(stream)
+        self.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+        self.records = 0
+
+    def emit(self, record):
+        self.records += 1
+        super().emit(record)
+
+
+def _time_mode(soups, level, quiet, repeat):
+    root = logging.getLogger()
+    previous_level = root.level
+    with open(os.devnull, "w") as devnull:
+        handler = _CountingHandler(devnull)
+        root.addHandler(handler)
+        root.setLevel(level)
+        set_quiet(quiet)
+        try:
+            samples = []
+            for _ in range(repeat):
+                for match_id, soup in soups:
+                    started = time.perf_counter()
+                    GetGameData(soup, "benchmark", match_id)
+                    samples.append(time.perf_counter() - started)
+        finally:
+            root.removeHandler(handler)
+            root.setLevel(previous_level)
+            set_quiet(False)
+    return samples, handler.records / max(1, repeat * len(soups))
+
+
+def run(corpus_dir, modes, repeat):
+    soups = [(match_id, make_soup(html)) for match_id, html in iter_pages(corpus_dir)]
+    if not soups:
+        print(f"No pages found under {corpus_dir}")
+        return 1
+
+    print(f"{len(soups)} pages x {repeat}")
+    print(f"{'mode':<8} {'mean ms':>9} {'p50 ms':>9} {'max ms':>9} {'records/match':>14}")
+    baseline = None
+    for mode in modes:
+        level, quiet = MODES[mode]
+        samples, records = _time_mode(soups, level, quiet, repeat)
+        stats = summarise(samples)
+        baseline = baseline if baseline is not None else stats["mean_ms"]
+        saving = baseline - stats["mean_ms"]
+        print(
+            f"{mode:<8} {stats['mean_ms']:>9.2f} {stats['p50_ms']:>9.2f} {stats['max_ms']:>9.2f} "
+            f"{records:>14.1f}  ({saving:.2f} ms/match saved vs {modes[0]})"
+        )
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", required=True, help="Directory of saved match pages")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES), help="Logging setups to time")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the corpus per mode")
+    args = parser.parse_args(argv)
+    return run(args.corpus, args.modes, args.repeat)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
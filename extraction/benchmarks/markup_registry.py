@@ -0,0 +1,119 @@
+"""
+Micro-benchmark for the precompiled selector registry (core_function.markup).
+
+For every player <li> in a corpus of saved pages this times the selector and
+regex work player_extraction_from_list does per player two ways:
+
+  strings   - CSS selector strings passed to select()/select_one() and the
+              substitution regex given as a pattern string, as before
+  compiled  - the compiled soupsieve selectors and regexes from the registry
+
+and reports microseconds per player. Both variants must find the same nodes;
+the run exits with status 1 if they don't.
+
+Usage (from the repository root):
+    python -m extraction.benchmarks.markup_registry --corpus path/to/pages [--repeat 20]
+"""
+import argparse
+import logging
+import re
+import sys
+import time
+
+from bs4.element import Tag
+
+from extraction.azure_function.core_function.web_utils import make_soup
+from extraction.azure_function.core_function.extract_player import return_player_lists
+from extraction.azure_function.core_function.markup import active_markup, MARKUP_VERSIONS, SUBSTITUTION_TEXT_RE
+from extraction.azure_function.core_function.page_index import build_page_index
+from extraction.benchmarks.corpus import iter_pages, summarise
+
+SUBSTITUTION_TEXT_PATTERN = r"(.+?)\s+(\d+'(?:\+\d+)?)$"
+
+# Per-player selectors, in the order player_extraction_from_list uses them
+PLAYER_SELECTORS = (
+    "player_name", "captain_marker", "shirt_number", "yellow_card", "red_card", "substitutions",
+)
+
+
+def _player_items(corpus_dir):
+    items = []
+    for _match_id, html in iter_pages(corpus_dir):
+        soup = make_soup(html)
+        lists = return_player_lists(soup, build_page_index(soup))
+        for player_list in lists or []:
+            items.extend(child for child in player_list if isinstance(child, Tag))
+    return items
+
+
+def _with_strings(item, selectors):
+    found = [item.select_one(selectors[name]) for name in PLAYER_SELECTORS]
+    subs = found[-1]
+    if subs is not None:
+        for wrapper in subs.select(selectors["substitution"]):
+            visible = wrapper.select_one(selectors["visible_text"])
+            text = (visible or wrapper).get_text(" ", strip=True)
+            found.append(re.search(SUBSTITUTION_TEXT_PATTERN, text))
+    return found
+
+
+def _with_registry(item, css):
+    found = [css[name].select_one(item) for name in PLAYER_SELECTORS]
+    subs = found[-1]
+    if subs is not None:
+        for wrapper in css["substitution"].select(subs):
+            visible = css["visible_text"].select_one(wrapper)
+            text = (visible or wrapper).get_text(" ", strip=True)
+            found.append(SUBSTITUTION_TEXT_RE.search(text))
+    return found
+
+
+def _same(a, b):
+    return len(a) == len(b) and all(
+        (x.group(0) == y.group(0)) if isinstance(x, re.Match) and isinstance(y, re.Match) else x is y
+        for x, y in zip(a, b)
+    )
+
+
+def run(corpus_dir, repeat):
+    items = _player_items(corpus_dir)
+    if not items:
+        print(f"No player lineups found under {corpus_dir}")
+        return 1
+
+    markup = active_markup()
+    selectors = MARKUP_VERSIONS[markup.version]["css"]
+
+    mismatches = sum(not _same(_with_strings(i, selectors), _with_registry(i, markup.css)) for i in items)
+
+    timings = {}
+    for label, fn, arg in (("strings", _with_strings, selectors), ("compiled", _with_registry, markup.css)):
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for item in items:
+                fn(item, arg)
+            samples.append((time.perf_counter() - started) / len(items))
+        timings[label] = summarise(samples)
+
+    print(f"{len(items)} players x {repeat}, markup set {markup.version}")
+    print(f"{'variant':<10} {'mean us':>9} {'p50 us':>9} {'max us':>9}")
+    for label, stats in timings.items():
+        print(f"{label:<10} {stats['mean_ms'] * 1000:>9.2f} {stats['p50_ms'] * 1000:>9.2f} {stats['max_ms'] * 1000:>9.2f}")
+    saved = (timings["strings"]["mean_ms"] - timings["compiled"]["mean_ms"]) * 1000
+    print(f"saved {saved:.2f} us/player; mismatches: {mismatches}")
+    return 1 if mismatches else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", required=True, help="Directory of saved match pages")
+    parser.add_argument("--repeat", type=int, default=20, help="Passes over all players")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.CRITICAL)
+    return run(args.corpus, args.repeat)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
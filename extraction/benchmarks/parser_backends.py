@@ -0,0 +1,92 @@
+"""
+Compare HTML parser backends for make_soup on a corpus of saved match pages.
+
+For each backend this reports parse time per page, and checks that GetGameData
+produces byte-identical match JSON to the html.parser reference. Exits with
+status 1 if any backend disagrees, so a backend can be vetted before it is
+switched on with SOUP_PARSER. Backends that aren't installed are reported and
+skipped; --require makes one of them mandatory.
+
+The default corpus is the match pages of the regression suite
+(page_corpus/matches, recorded and synthetic), and CI runs this check on it
+for lxml.
+
+Usage (from the repository root):
+    python -m extraction.benchmarks.parser_backends [--corpus path/to/pages] [--require lxml]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup, FeatureNotFound
+
+from extraction.azure_function.core_function.web_utils import make_soup
+from extraction.azure_function.core_function.extract_game_data import GetGameData
+from extraction.benchmarks.corpus import iter_pages, summarise
+
+REFERENCE_PARSER = "html.parser"
+DEFAULT_PARSERS = ["html.parser", "lxml", "html5lib"]
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "page_corpus", "matches")
+
+
+def _match_json(soup, match_id):
+    match_data = GetGameData(soup, "benchmark", match_id)
+    return json.dumps(match_data, indent=2, ensure_ascii=False)
+
+
+def run(corpus_dir, parsers, required=()):
+    pages = list(iter_pages(corpus_dir))
+    if not pages:
+        print(f"No pages found under {corpus_dir}")
+        return 1
+
+    reference = {}
+    for match_id, html in pages:
+        reference[match_id] = _match_json(make_soup(html, REFERENCE_PARSER), match_id)
+
+    failed = False
+    print(f"{len(pages)} pages")
+    print(f"{'parser':<12} {'mean ms':>9} {'p50 ms':>9} {'max ms':>9}  mismatches")
+    for parser in parsers:
+        try:
+            BeautifulSoup("", parser)
+        except FeatureNotFound:
+            print(f"{parser:<12} not installed")
+            failed = failed or parser in required
+            continue
+
+        parse_times = []
+        mismatches = []
+        for match_id, html in pages:
+            started = time.perf_counter()
+            soup = make_soup(html, parser)
+            parse_times.append(time.perf_counter() - started)
+            if _match_json(soup, match_id) != reference[match_id]:
+                mismatches.append(match_id)
+
+        stats = summarise(parse_times)
+        print(
+            f"{parser:<12} {stats['mean_ms']:>9.2f} {stats['p50_ms']:>9.2f} {stats['max_ms']:>9.2f}  "
+            f"{len(mismatches)}{' ' + ', '.join(mismatches[:5]) if mismatches else ''}"
+        )
+        failed = failed or bool(mismatches)
+
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="Directory of saved match pages")
+    parser.add_argument("--parsers", nargs="+", default=DEFAULT_PARSERS, help="Backends to compare")
+    parser.add_argument("--require", nargs="+", default=[], help="Backends that must be installed")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.CRITICAL)
+    return run(args.corpus, args.parsers + [p for p in args.require if p not in args.parsers], args.require)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
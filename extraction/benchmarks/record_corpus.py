@@ -0,0 +1,114 @@
+"""
+Record real BBC pages into the regression corpus.
+
+Fetches a league/month fixture list and (up to --limit of) its match pages,
+trims what extraction never reads (scripts, styles, inline SVG, comments,
+...) and saves them gzipped under the corpus's recorded/ sections:
+
+    <corpus>/fixtures/recorded/<league-slug>_<YYYY-MM>.html.gz
+    <corpus>/matches/recorded/<match_id>.html.gz
+
+A trimmed page is only kept if extraction gives the same output as on the
+page as fetched; otherwise the untrimmed page is saved. Pages come from the
+network, or with --page-cache from a page cache a normal run filled
+(PAGE_CACHE_DIR), and with --replay from that cache alone.
+
+Afterwards review the new expected outputs, bump "version" in corpus.json and
+re-record with `python -m extraction.benchmarks.regression --update`.
+
+Usage (from the repository root):
+    python -m extraction.benchmarks.record_corpus "English Premiership" 2025-02 [--limit 5]
+        [--page-cache DIR [--replay]] [--corpus path/to/corpus]
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import re
+import sys
+
+from bs4 import Comment
+
+from extraction.azure_function.core_function.models import leagues
+from extraction.azure_function.core_function.page_cache import configure_page_cache
+from extraction.azure_function.core_function.web_utils import fetch_html, make_soup
+from extraction.azure_function.core_function.extract_game_data import GetGameData, extract_match_identifiers
+from extraction.benchmarks.regression import DEFAULT_CORPUS
+
+# Elements no extractor reads; most of a saved page's size
+TRIM_TAGS = ("script", "style", "svg", "noscript", "iframe", "link", "meta", "template")
+
+
+def trim_page(html):
+    """The page without TRIM_TAGS elements and comments."""
+    soup = make_soup(html, "html.parser")
+    for tag in soup.find_all(TRIM_TAGS):
+        tag.decompose()
+    for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
+        comment.extract()
+    return str(soup)
+
+
+def _save(path, html):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(html)
+
+
+def _trimmed(html, extract):
+    """The trimmed page if `extract` gives the same output on it, else the page as fetched."""
+    trimmed = trim_page(html)
+    before = json.dumps(extract(make_soup(html)), ensure_ascii=False)
+    return trimmed if json.dumps(extract(make_soup(trimmed)), ensure_ascii=False) == before else html
+
+
+def record(league, month, corpus_dir, limit):
+    """Records one fixture list and up to `limit` of its match pages. Returns the number of pages saved."""
+    slug = re.sub(r"[^a-z0-9]+", "-", league.lower()).strip("-")
+    listing_url = f"{leagues[league]}/{month}?filter=results"
+    html, ok = fetch_html(listing_url)
+    if not ok:
+        print(f"Failed to fetch {listing_url}")
+        return 0
+    _save(
+        os.path.join(corpus_dir, "fixtures", "recorded", f"{slug}_{month}.html.gz"),
+        _trimmed(html, extract_match_identifiers),
+    )
+    saved = 1
+
+    match_ids = extract_match_identifiers(make_soup(html))
+    for match_id in match_ids[:limit]:
+        html, ok = fetch_html(f"https://www.bbc.co.uk/sport/football/live/{match_id}")
+        if not ok:
+            print(f"Failed to fetch match {match_id}, skipped")
+            continue
+        page = _trimmed(html, lambda soup: GetGameData(soup, "corpus", match_id))
+        _save(os.path.join(corpus_dir, "matches", "recorded", f"{match_id}.html.gz"), page)
+        print(f"match {match_id}: {len(html) // 1024} KB -> {len(page) // 1024} KB")
+        saved += 1
+    return saved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("league", choices=sorted(leagues), help="League name from models.leagues")
+    parser.add_argument("month", help="YYYY-MM")
+    parser.add_argument("--limit", type=int, default=5, help="Match pages to record from the fixture list")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="Corpus directory")
+    parser.add_argument("--page-cache", help="Page cache directory to read (and fill) instead of fetching every page")
+    parser.add_argument("--replay", action="store_true", help="Only use --page-cache, never the network")
+    args = parser.parse_args(argv)
+
+    if args.replay and not args.page_cache:
+        parser.error("--replay needs --page-cache")
+    if args.page_cache:
+        configure_page_cache(args.page_cache, mode="replay" if args.replay else "revalidate")
+    logging.disable(logging.CRITICAL)
+    saved = record(args.league, args.month, args.corpus, args.limit)
+    print(f"Saved {saved} page(s) under {args.corpus}; re-record with regression --update")
+    return 0 if saved else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+"""
+Regression and performance suite for extraction over a versioned page corpus.
+
+Corpus layout:
+
+    <corpus>/
+        corpus.json          {"version": "2025-01", "markup_version": "2025"}
+        fixtures/            saved fixture list pages  (*.html / *.html.gz)
+            recorded/        real BBC pages, saved by record_corpus.py
+            synthetic/       hand-built extra cases
+        matches/             saved match pages, named <match_id>.html[.gz]
+            recorded/
+            synthetic/
+        expected/            reference outputs, written by --update
+        baseline.json        reference timings, written by --update
+
+Fixture pages go through extract_match_identifiers; match pages through
+GetGameData, generate_player_dictionaries and extract_goal_events_as_events.
+For each function the suite reports p50/p95 time, and for the run as a whole
+pages/sec (parse + extraction, as the pipeline does it) and peak traced memory
+(measured in a separate pass, since tracemalloc slows everything down).
+
+The run fails (exit status 1) when any output differs from expected/, or when
+pages/sec drops more than --tolerance below the baseline. Record a new
+reference after an intended change with --update.
+
+The corpus under page_corpus/ is the default and is what CI runs. Real pages
+go under recorded/ (python -m extraction.benchmarks.record_corpus fetches,
+trims and saves them); the synthetic/ pages are hand-built from the 2025
+markup with made-up teams and players (a full result with goals, cards and
+substitutions, the same with accented names and entities, a postponed match
+and a fixture list) and cover cases the recorded pages may not. Bump
+"version" in corpus.json when pages are added. The run reports how many
+pages of each source it checked and warns when there are no recorded ones.
+
+Usage (from the repository root):
+    python -m extraction.benchmarks.regression [--corpus path/to/corpus] [--repeat 3] [--update]
+"""
+import argparse
+import difflib
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from extraction.azure_function.core_function.web_utils import make_soup
+from extraction.azure_function.core_function.markup import use_markup, DEFAULT_MARKUP_VERSION
+from extraction.azure_function.core_function.extract_game_data import GetGameData, extract_match_identifiers
+from extraction.azure_function.core_function.extract_player import (
+    generate_player_dictionaries, extract_goal_events_as_events,
+)
+from extraction.benchmarks.corpus import iter_pages, summarise
+
+CORPUS_LEAGUE = "corpus"
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "page_corpus")
+
+# kind -> [(name, function of (soup, page_id))]
+FUNCTIONS = {
+    "fixtures": [
+        ("extract_match_identifiers", lambda soup, _page_id: extract_match_identifiers(soup)),
+    ],
+    "matches": [
+        ("GetGameData", lambda soup, page_id: GetGameData(soup, CORPUS_LEAGUE, page_id)),
+        ("generate_player_dictionaries", lambda soup, _page_id: generate_player_dictionaries(soup)),
+        ("extract_goal_events_as_events", lambda soup, _page_id: extract_goal_events_as_events(soup)),
+    ],
+}
+
+
+def load_corpus(corpus_dir):
+    """
+    Returns (corpus info, [(kind, page_id, html)]); info["sources"] counts the
+    pages per section (recorded, synthetic, or "" for a corpus without sections).
+    """
+    info_path = os.path.join(corpus_dir, "corpus.json")
+    info = {"version": "unversioned", "markup_version": DEFAULT_MARKUP_VERSION}
+    if os.path.exists(info_path):
+        with open(info_path, encoding="utf-8") as f:
+            info.update(json.load(f))
+
+    pages = []
+    sources = {}
+    for kind in FUNCTIONS:
+        kind_dir = os.path.join(corpus_dir, kind)
+        if not os.path.isdir(kind_dir):
+            continue
+        # recorded/ and synthetic/ sections; a corpus without them is one section
+        sections = [name for name in sorted(os.listdir(kind_dir)) if os.path.isdir(os.path.join(kind_dir, name))]
+        for section in sections or [""]:
+            for page_id, html in iter_pages(os.path.join(kind_dir, section)):
+                # expected/ is keyed by page id alone
+                if any(k == kind and p == page_id for k, p, _html in pages):
+                    raise ValueError(f"{kind}/{page_id} is in more than one section of {corpus_dir}")
+                pages.append((kind, page_id, html))
+                sources[section] = sources.get(section, 0) + 1
+    info["sources"] = sources
+    return info, pages
+
+
+def _dump(value):
+    return json.dumps(value, indent=2, ensure_ascii=False, sort_keys=False)
+
+
+def run_pages(pages, repeat):
+    """
+    Times every function on every page. Returns (outputs, timings, elapsed) where
+    outputs is {(kind, page_id): {function: output}} from the first pass and
+    timings is {function or "parse": [seconds]}.
+    """
+    outputs = {}
+    timings = {"parse": []}
+    elapsed = 0.0
+    for attempt in range(repeat):
+        for kind, page_id, html in pages:
+            started = time.perf_counter()
+            soup = make_soup(html)
+            parsed = time.perf_counter()
+            timings["parse"].append(parsed - started)
+            elapsed += parsed - started
+
+            page_outputs = {}
+            for name, fn in FUNCTIONS[kind]:
+                started = time.perf_counter()
+                page_outputs[name] = fn(soup, page_id)
+                took = time.perf_counter() - started
+                timings.setdefault(name, []).append(took)
+                # Throughput counts the work the pipeline does per page
+                if name in ("extract_match_identifiers", "GetGameData"):
+                    elapsed += took
+            if attempt == 0:
+                outputs[(kind, page_id)] = page_outputs
+    return outputs, timings, elapsed
+
+
+def peak_memory(pages):
+    """Peak traced allocation (bytes) while parsing and extracting one page at a time."""
+    tracemalloc.start()
+    try:
+        for kind, page_id, html in pages:
+            soup = make_soup(html)
+            for _name, fn in FUNCTIONS[kind]:
+                fn(soup, page_id)
+            del soup
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _expected_path(corpus_dir, kind, page_id):
+    return os.path.join(corpus_dir, "expected", kind, f"{page_id}.json")
+
+
+def compare_outputs(corpus_dir, outputs, max_diff_lines=20):
+    """Returns a list of (page, message) for outputs that differ from expected/."""
+    failures = []
+    for (kind, page_id), page_outputs in outputs.items():
+        path = _expected_path(corpus_dir, kind, page_id)
+        if not os.path.exists(path):
+            failures.append((f"{kind}/{page_id}", "no expected output (run with --update)"))
+            continue
+        with open(path, encoding="utf-8") as f:
+            expected = f.read()
+        actual = _dump(page_outputs)
+        if actual != expected:
+            diff = difflib.unified_diff(
+                expected.splitlines(), actual.splitlines(), "expected", "actual", lineterm="", n=1
+            )
+            failures.append((f"{kind}/{page_id}", "\n".join(list(diff)[:max_diff_lines])))
+    return failures
+
+
+def write_expected(corpus_dir, outputs):
+    for (kind, page_id), page_outputs in outputs.items():
+        path = _expected_path(corpus_dir, kind, page_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(_dump(page_outputs))
+
+
+def run(corpus_dir, repeat, tolerance, update=False, baseline_path=None):
+    info, pages = load_corpus(corpus_dir)
+    if not pages:
+        print(f"No fixtures/ or matches/ pages found under {corpus_dir}")
+        return 1
+    use_markup(info["markup_version"])
+    baseline_path = baseline_path or os.path.join(corpus_dir, "baseline.json")
+
+    outputs, timings, elapsed = run_pages(pages, repeat)
+    pages_per_sec = len(pages) * repeat / elapsed if elapsed else 0.0
+    peak_mb = peak_memory(pages) / 1024 ** 2
+    functions = {name: summarise(samples) for name, samples in timings.items()}
+
+    print(f"corpus {info['version']} (markup {info['markup_version']}): {len(pages)} pages x {repeat}")
+    print("pages by source: " + ", ".join(f"{name or 'corpus'} {count}" for name, count in info["sources"].items()))
+    if info["sources"] and not info["sources"].get("recorded"):
+        # Synthetic pages only cover the markup as we understood it; real pages catch what we missed
+        print(f"{'::warning::' if os.environ.get('GITHUB_ACTIONS') else 'WARNING: '}"
+              f"no recorded BBC pages in the corpus; record some with extraction.benchmarks.record_corpus")
+    print(f"{'function':<32} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'n':>6}")
+    for name, stats in functions.items():
+        print(f"{name:<32} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['max_ms']:>9.2f} {stats['n']:>6}")
+    print(f"pages/sec {pages_per_sec:.1f}, peak memory {peak_mb:.1f} MB")
+
+    result = {
+        "corpus_version": info["version"],
+        "markup_version": info["markup_version"],
+        "pages": len(pages),
+        "sources": info["sources"],
+        "pages_per_sec": pages_per_sec,
+        "peak_memory_mb": peak_mb,
+        "functions": functions,
+        "python": platform.python_version(),
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+    if update:
+        write_expected(corpus_dir, outputs)
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Wrote expected outputs and baseline {baseline_path}")
+        return 0
+
+    failed = False
+    failures = compare_outputs(corpus_dir, outputs)
+    for page, message in failures:
+        print(f"OUTPUT DIFF {page}\n{message}")
+    failed = failed or bool(failures)
+
+    if not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path}; run with --update to record one")
+        return 1
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("corpus_version") != info["version"]:
+        print(f"Baseline is for corpus {baseline.get('corpus_version')}, not {info['version']}; re-record it")
+        return 1
+
+    floor = baseline["pages_per_sec"] * (1 - tolerance)
+    change = pages_per_sec / baseline["pages_per_sec"] - 1 if baseline["pages_per_sec"] else 0.0
+    print(
+        f"vs baseline: pages/sec {baseline['pages_per_sec']:.1f} -> {pages_per_sec:.1f} ({change:+.1%}), "
+        f"peak memory {baseline['peak_memory_mb']:.1f} -> {peak_mb:.1f} MB"
+    )
+    for name, stats in functions.items():
+        before = baseline["functions"].get(name)
+        if before:
+            print(f"  {name:<30} p95 {before['p95_ms']:.2f} -> {stats['p95_ms']:.2f} ms")
+    if pages_per_sec < floor:
+        print(f"THROUGHPUT REGRESSION: {pages_per_sec:.1f} pages/sec is below {floor:.1f} (tolerance {tolerance:.0%})")
+        failed = True
+
+    print(f"{len(failures)} output diff(s); {'FAILED' if failed else 'OK'}")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="Corpus directory (see layout above)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes over the corpus")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed pages/sec drop vs baseline (fraction)")
+    parser.add_argument("--baseline", help="Baseline file (default: <corpus>/baseline.json)")
+    parser.add_argument("--update", action="store_true", help="Record expected outputs and a new baseline")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.CRITICAL)
+    return run(args.corpus, args.repeat, args.tolerance, args.update, args.baseline)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
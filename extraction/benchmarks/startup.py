@@ -0,0 +1,217 @@
+"""
+Cold-start benchmark for the function entry points.
+
+Every measurement runs in a fresh interpreter, as a cold start does:
+
+  imports  - `python -X importtime -c "import <module>"` for each entry module;
+             reports the module's cumulative import time and the heaviest
+             imports underneath it
+  handler  - time to first byte of scrapeHTTP.handler.main: from the first
+             import in a new process to the HttpResponse being returned, for a
+             real run of one league over the page corpus's fixture list and
+             match pages. The pages are served by the page cache in replay mode
+             and blobs go to a local store (STORAGE_BACKEND=local), so the run
+             takes the production path (first fetch, parse, extraction,
+             checkpoint, compaction) without the network
+
+Medians over --runs. The run fails (exit status 1) when an entry module's import
+or the handler's time to first byte goes over its budget; CI runs it with the
+defaults below.
+
+Usage (from the repository root, with the function's requirements installed):
+    python -m extraction.benchmarks.startup [--runs 5] [--import-budget-ms 250] [--ttfb-budget-ms 1000]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from extraction.benchmarks.corpus import iter_pages
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+FUNCTION_ROOT = os.path.join(REPO_ROOT, "extraction", "azure_function")
+
+# module -> directory it is imported from (the function app root, as the
+# Functions host does, or the repository root for the Lambda entry point)
+ENTRY_MODULES = {
+    "scrapeHTTP.handler": FUNCTION_ROOT,
+    "core_function.process_games": FUNCTION_ROOT,
+    "core_function.azure_storage": FUNCTION_ROOT,
+    "core_function.web_utils": FUNCTION_ROOT,
+    "extraction.app": REPO_ROOT,
+}
+
+PAGE_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "page_corpus")
+# The league the handler run scrapes; the script below narrows models.leagues
+# to it, so the request itself is the production one
+HANDLER_LEAGUE = "English Premiership"
+
+HANDLER_SCRIPT = """
+import time
+started = time.perf_counter()
+import os
+import json
+import azure.functions as func
+from core_function.models import leagues
+from scrapeHTTP.handler import main
+for name in list(leagues):
+    if name != os.environ["STARTUP_BENCHMARK_LEAGUE"]:
+        del leagues[name]
+request = func.HttpRequest(
+    method="POST", url="/api/scrape-matches", headers={},
+    body=json.dumps({"period": os.environ["STARTUP_BENCHMARK_PERIOD"]}).encode(),
+)
+response = main(request)
+elapsed = time.perf_counter() - started
+print(json.dumps({"status": response.status_code, "seconds": elapsed, "body": response.get_body().decode()}))
+"""
+
+
+def _env(cwd, **extra):
+    env = {**os.environ, **extra}
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (cwd, os.environ.get("PYTHONPATH")) if p)
+    # A run-from-package deployment can't keep the bytecode it compiles, so neither do we
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+
+def import_profile(module, cwd):
+    """
+    [(depth, name, self us, cumulative us)] for one fresh `import module`, in
+    -X importtime order (a module's line follows the lines of its imports).
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, env=_env(cwd, STORAGE_BACKEND="local"), capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            depth = (len(name) - len(name.lstrip()) - 1) // 2
+            rows.append((depth, name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def time_imports(module, cwd, runs):
+    """
+    (median cumulative ms, [(package, median ms)]) where packages are the
+    heaviest top-level packages imported on behalf of `module` (interpreter
+    start-up imports such as site are left out).
+    """
+    totals = []
+    packages = {}
+    for _ in range(runs):
+        rows = import_profile(module, cwd)
+        end = max(i for i, row in enumerate(rows) if row[1] == module and row[0] == 0)
+        totals.append(rows[end][3] / 1000)
+        # The module's own imports are the deeper rows directly above its line
+        start = end
+        while start > 0 and rows[start - 1][0] > 0:
+            start -= 1
+        by_package = {}
+        for _depth, name, _self_us, cumulative_us in rows[start:end]:
+            top = name.split(".")[0]
+            by_package[top] = max(by_package.get(top, 0), cumulative_us)
+        for top, cumulative_us in by_package.items():
+            packages.setdefault(top, []).append(cumulative_us / 1000)
+    own_package = module.split(".")[0]
+    heaviest = sorted(
+        ((name, statistics.median(samples)) for name, samples in packages.items() if name != own_package),
+        key=lambda item: item[1], reverse=True,
+    )
+    return statistics.median(totals), heaviest[:5]
+
+
+def seed_page_cache(cache_dir, league_url, corpus_dir=PAGE_CORPUS):
+    """
+    Stores the corpus's first fixture list as `league_url`'s listing and its
+    match pages under their live URLs. Returns the listing's month.
+    """
+    from extraction.azure_function.core_function.page_cache import PageCache
+
+    cache = PageCache(cache_dir)
+    # Recorded listings are named <league-slug>_<YYYY-MM>, synthetic ones <YYYY-MM>
+    page_id, listing = next(iter_pages(os.path.join(corpus_dir, "fixtures")))
+    period = page_id.rsplit("_", 1)[-1]
+    cache.store(f"{league_url}/{period}?filter=results", listing)
+    for match_id, html in iter_pages(os.path.join(corpus_dir, "matches")):
+        cache.store(f"https://www.bbc.co.uk/sport/football/live/{match_id}", html)
+    return period
+
+
+def time_handler(runs, league=HANDLER_LEAGUE):
+    """Median seconds from first import to the handler's response, over fresh processes."""
+    from extraction.azure_function.core_function.models import leagues
+
+    samples = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as root:
+            registry = os.path.join(root, "blobs", "raw", "KEYS", "MATCH_ID.json")
+            os.makedirs(os.path.dirname(registry))
+            with open(registry, "w", encoding="utf-8") as f:
+                json.dump({"identifiers": {}}, f)
+            pages = os.path.join(root, "pages")
+            period = seed_page_cache(pages, leagues[league])
+            proc = subprocess.run(
+                [sys.executable, "-c", HANDLER_SCRIPT],
+                cwd=FUNCTION_ROOT,
+                env=_env(FUNCTION_ROOT, STORAGE_BACKEND="local", STORAGE_LOCAL_ROOT=os.path.join(root, "blobs"),
+                         PAGE_CACHE_DIR=pages, PAGE_CACHE_MODE="replay",
+                         STARTUP_BENCHMARK_LEAGUE=league, STARTUP_BENCHMARK_PERIOD=period,
+                         METRICS_JSON_PATH="", METRICS_PROM_PATH=""),
+                capture_output=True, text=True,
+            )
+        if proc.returncode != 0 or not proc.stdout.strip():
+            raise RuntimeError(f"handler run failed:\n{proc.stderr[-2000:]}")
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        if result["status"] != 200:
+            raise RuntimeError(f"handler returned {result['status']}: {result['body']}")
+        # A run that scraped nothing would only measure imports
+        units = json.loads(result["body"])["results"]
+        if not units or units[0]["status"] != "ok" or not units[0]["fetched"]:
+            raise RuntimeError(f"handler run didn't scrape the corpus: {units}")
+        samples.append(result["seconds"])
+    return statistics.median(samples)
+
+
+def run(runs, import_budget_ms, ttfb_budget_ms):
+    failed = False
+    print(f"{'module':<30} {'import ms':>10}  heaviest imports (cumulative ms)")
+    for module, cwd in ENTRY_MODULES.items():
+        total_ms, heaviest = time_imports(module, cwd, runs)
+        over = total_ms > import_budget_ms
+        failed = failed or over
+        print(
+            f"{module:<30} {total_ms:>10.1f}  "
+            + ", ".join(f"{name} {ms:.1f}" for name, ms in heaviest)
+            + ("  OVER BUDGET" if over else "")
+        )
+
+    ttfb_ms = time_handler(runs) * 1000
+    over = ttfb_ms > ttfb_budget_ms
+    failed = failed or over
+    print(f"handler time to first byte {ttfb_ms:.1f} ms" + ("  OVER BUDGET" if over else ""))
+    print(f"budgets: import {import_budget_ms:.0f} ms, time to first byte {ttfb_budget_ms:.0f} ms; "
+          f"{'FAILED' if failed else 'OK'}")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per measurement")
+    parser.add_argument("--import-budget-ms", type=float, default=250, help="Budget per entry-module import")
+    parser.add_argument("--ttfb-budget-ms", type=float, default=1000, help="Budget for the handler's time to first byte")
+    args = parser.parse_args(argv)
+    return run(args.runs, args.import_budget_ms, args.ttfb_budget_ms)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,15 @@
 import os
+import sys
 import json
-from datetime import datetime
+import atexit
+from datetime import datetime, timezone
+from concurrent.futures import wait, FIRST_COMPLETED
 import logging
-from azure.storage.blob import BlobServiceClient
 from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
 
+from shred import SHRED_TABLES, MATCH_FILE_SUFFIXES, decode_match_file, is_indented, shred_matches
+
 # --- Logging setup ---
 logging.basicConfig(
     level=logging.INFO,
@@ -22,21 +26,55 @@ if os.path.exists(env_path):
 
 ACCOUNT_NAME = os.getenv("AZURE_STORAGE_ACCOUNT_NAME")
 ACCOUNT_KEY = os.getenv("AZURE_STORAGE_ACCOUNT_KEY")
+CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
 
 SQL_SERVER = os.getenv("AZURE_SQL_SERVER")
 SQL_DB = os.getenv("AZURE_SQL_DATABASE")
 SQL_USER = os.getenv("AZURE_SQL_USER")
 SQL_PASSWORD = os.getenv("AZURE_SQL_PASSWORD")
 
-if not all([ACCOUNT_NAME, ACCOUNT_KEY, SQL_SERVER, SQL_DB, SQL_USER, SQL_PASSWORD]):
+# Pipeline tuning: blob downloads in flight, rows per INSERT transaction
+LOADER_MAX_WORKERS = int(os.getenv("LOADER_MAX_WORKERS", "8"))
+LOADER_BATCH_SIZE = int(os.getenv("LOADER_BATCH_SIZE", "50"))
+
+# What gets written: "raw" (stg.raw_files JSON rows), "shredded" (typed
+# stg.shred_* tables, see shred.py) or "both"
+LOADER_MODE = os.getenv("LOADER_MODE", "raw")
+# mode -> the staging targets it writes, each tracked separately in the manifest
+MODE_TARGETS = {"raw": ("raw",), "shredded": ("shredded",), "both": ("raw", "shredded")}
+# Manifest rows recorded before targets were tracked; they could be either
+LEGACY_TARGET = ""
+SHREDDED_DDL_PATH = os.path.join(os.path.dirname(__file__), "sql", "shredded_staging.sql")
+
+# Control table recording which blob versions are already in each staging target
+MANIFEST_TABLE = os.getenv("LOADER_MANIFEST_TABLE", "stg.raw_file_manifest")
+
+# Storage credentials aren't needed for a connection string or STORAGE_BACKEND=local
+storage_configured = CONNECTION_STRING or (ACCOUNT_NAME and ACCOUNT_KEY) or os.getenv("STORAGE_BACKEND") == "local"
+if not (storage_configured and all([SQL_SERVER, SQL_DB, SQL_USER, SQL_PASSWORD])):
     raise RuntimeError("Missing one or more required environment variables.")
 
 
 # ----- Storage connection -----
-blob_service_client = BlobServiceClient(
-    account_url=f"https://{ACCOUNT_NAME}.blob.core.windows.net",
-    credential=ACCOUNT_KEY
-)
+# Blob access is the extraction function's core_function.blob_store: the image
+# copies it next to the loader, a checkout finds it under extraction/azure_function
+FUNCTION_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "extraction", "azure_function")
+if os.path.isdir(FUNCTION_ROOT):
+    sys.path.append(FUNCTION_ROOT)
+
+# Imported after load_dotenv: blob_store reads its settings at import time
+from core_function.blob_store import create_store
+
+_blob_stores = {}
+
+
+def blob_store(container_name: str):
+    """The blob store for a container, created on first use and closed at exit."""
+    if container_name not in _blob_stores:
+        store = create_store(container_name)
+        atexit.register(store.close)
+        _blob_stores[container_name] = store
+    return _blob_stores[container_name]
 
 # ----- SQL connection -----
 
@@ -67,50 +105,229 @@ engine = create_engine(
 )
 
 
+def list_match_blobs(container_name: str, prefix: str):
+    """
+    List match output blobs under the given prefix with the properties the
+    manifest tracks: [{"name", "etag", "last_modified"}].
+    """
+    return [
+        {**b, "last_modified": _utc_naive(b["last_modified"])}
+        for b in blob_store(container_name).list_properties(prefix)
+        if b["name"].endswith(MATCH_FILE_SUFFIXES)
+    ]
+
+
 def list_json_blobs(container_name: str, prefix: str):
     """
-    List all .json blobs under the given prefix (folder-like path).
+    List all match output blobs (.json / .ndjson, optionally .gz) under the given prefix.
     Example prefix: 'uk_football/season_2023_24/'
     """
-    container_client = blob_service_client.get_container_client(container_name)
-    blobs = container_client.list_blobs(name_starts_with=prefix)
-    return [b.name for b in blobs if b.name.endswith(".json")]
+    return [b["name"] for b in list_match_blobs(container_name, prefix)]
+
+
+def _utc_naive(value):
+    # DATETIME2 has no offset; keep everything as naive UTC so comparisons line up
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
 
 
 def download_blob_text(container_name: str, blob_name: str) -> str:
     """
-    Download a blob as text (UTF-8).
+    Download a match output blob as JSON array text (UTF-8).
     """
-    container_client = blob_service_client.get_container_client(container_name)
-    blob_client = container_client.get_blob_client(blob_name)
-    data = blob_client.download_blob().readall()
-    return data.decode("utf-8")
+    data, _etag = blob_store(container_name).get(blob_name)
+    return decode_match_file(blob_name, data)
 
 
 import time
 from sqlalchemy.exc import OperationalError
 
-def insert_raw_file_row(file_name: str, json_text: str, max_retries: int = 3, retry_delay: int = 5):
+INSERT_RAW_FILE_SQL = text("""
+    INSERT INTO stg.raw_files (file_name, json_body, load_timestamp)
+    VALUES (:file_name, :json_body, :load_timestamp)
+""")
+
+
+DELETE_RAW_FILE_SQL = text("DELETE FROM stg.raw_files WHERE file_name = :file_name")
+
+# The file's rows for the targets being written, plus any legacy row they supersede
+DELETE_MANIFEST_SQL = text(f"""
+    DELETE FROM {MANIFEST_TABLE}
+    WHERE blob_name = :blob_name AND target IN (:target, '{LEGACY_TARGET}')
+""")
+
+INSERT_MANIFEST_SQL = text(f"""
+    INSERT INTO {MANIFEST_TABLE} (blob_name, target, etag, last_modified, loaded_at)
+    VALUES (:blob_name, :target, :etag, :last_modified, :loaded_at)
+""")
+
+CREATE_MANIFEST_SQL = text(f"""
+    IF OBJECT_ID('{MANIFEST_TABLE}', 'U') IS NULL
+    CREATE TABLE {MANIFEST_TABLE} (
+        blob_name     NVARCHAR(1024) NOT NULL,
+        target        NVARCHAR(16)   NOT NULL,
+        etag          NVARCHAR(128)  NOT NULL,
+        last_modified DATETIME2      NULL,
+        loaded_at     DATETIME2      NOT NULL,
+        CONSTRAINT PK_raw_file_manifest PRIMARY KEY (blob_name, target)
+    )
+""")
+
+# Manifests created before the target column: keep their rows as legacy
+# (plan_blobs reloads those files once) and re-key the table on (blob_name, target)
+MIGRATE_MANIFEST_SQL = [
+    text(f"""
+        ALTER TABLE {MANIFEST_TABLE}
+        ADD target NVARCHAR(16) NOT NULL CONSTRAINT DF_raw_file_manifest_target DEFAULT '{LEGACY_TARGET}'
+    """),
+    text(f"""
+        DECLARE @pk sysname = (
+            SELECT name FROM sys.key_constraints
+            WHERE parent_object_id = OBJECT_ID('{MANIFEST_TABLE}') AND type = 'PK'
+        );
+        IF @pk IS NOT NULL EXEC('ALTER TABLE {MANIFEST_TABLE} DROP CONSTRAINT ' + @pk)
+    """),
+    text(f"ALTER TABLE {MANIFEST_TABLE} ADD CONSTRAINT PK_raw_file_manifest PRIMARY KEY (blob_name, target)"),
+]
+
+
+def ensure_manifest_table():
+    """Create the ingestion manifest table if it doesn't exist yet, or add its target column."""
+    with engine.begin() as conn:
+        conn.execute(CREATE_MANIFEST_SQL)
+        has_target = conn.execute(text(f"SELECT COL_LENGTH('{MANIFEST_TABLE}', 'target')")).scalar()
+        if has_target is None:
+            logger.info(f"Adding the target column to {MANIFEST_TABLE}")
+            for statement in MIGRATE_MANIFEST_SQL:
+                conn.execute(statement)
+
+
+def load_manifest():
     """
-    Insert one row into stg.raw_files for a single file, with simple retry logic
-    on transient OperationalError (e.g. network / login timeouts).
+    Read the ingestion manifest: {(blob_name, target): (etag, last_modified)}
+    for every blob version already loaded into a staging target ("raw" or
+    "shredded", or LEGACY_TARGET for rows recorded before targets were tracked).
     """
-    insert_sql = text("""
-        INSERT INTO stg.raw_files (file_name, json_body, load_timestamp)
-        VALUES (:file_name, :json_body, :load_timestamp)
-    """)
+    with engine.connect() as conn:
+        result = conn.execute(text(f"SELECT blob_name, target, etag, last_modified FROM {MANIFEST_TABLE}"))
+        return {
+            (name, target): (etag, _utc_naive(last_modified))
+            for name, target, etag, last_modified in result
+        }
 
-    row = {
-        "file_name": file_name,
-        "json_body": json_text,
-        "load_timestamp": datetime.utcnow(),
-    }
+
+def plan_blobs(blobs, manifest, mode=LOADER_MODE):
+    """
+    Split listed blobs against the manifest into (new, changed, unchanged) for
+    the targets `mode` writes.
+
+    A blob is unchanged only if every one of those targets holds a version with
+    its ETag and last-modified time. A blob no target has seen is new; anything
+    else (a changed blob, a target it was never loaded into, a legacy manifest
+    row) is changed, and has its rows in those targets replaced.
+    """
+    targets = MODE_TARGETS.get(mode)
+    if targets is None:
+        raise ValueError(f"Unknown LOADER_MODE: {mode}")
+    new, changed, unchanged = [], [], []
+    for blob in blobs:
+        version = (blob["etag"], blob["last_modified"])
+        loaded = [manifest.get((blob["name"], target)) for target in targets]
+        if all(v == version for v in loaded):
+            unchanged.append(blob)
+        elif all(v is None for v in loaded) and (blob["name"], LEGACY_TARGET) not in manifest:
+            new.append(blob)
+        else:
+            changed.append(blob)
+    return new, changed, unchanged
+
+
+INSERT_SHRED_SQL = {
+    table: text(
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join(':' + c for c in columns)})"
+    )
+    for table, columns in SHRED_TABLES.items()
+}
+
+DELETE_SHRED_SQL = {
+    table: text(f"DELETE FROM {table} WHERE file_name = :file_name")
+    for table in SHRED_TABLES
+}
+
+
+def ensure_shredded_tables():
+    """Create the stg.shred_* tables from sql/shredded_staging.sql if missing, or bring them up to date."""
+    with open(SHREDDED_DDL_PATH, encoding="utf-8") as f:
+        ddl = f.read()
+    statements = [s.strip() for s in ddl.split(";") if "CREATE TABLE" in s or "ALTER TABLE" in s]
+    with engine.begin() as conn:
+        for statement in statements:
+            conn.execute(text(statement))
+
+
+def insert_raw_file_rows(rows, max_retries: int = 3, retry_delay: int = 5, mode: str = "raw"):
+    """
+    Insert a batch of rows into stg.raw_files in one transaction. The engine is
+    created with fast_executemany, so the batch goes to SQL Server as a single
+    parameter array. Retries the whole batch on transient OperationalError.
+
+    With mode "shredded" (or "both") the JSON is parsed here and written to the
+    typed stg.shred_* tables instead of (or as well as) stg.raw_files.
+
+    Rows carrying an "etag" are recorded in the manifest, once per target
+    written, in the same transaction; rows with "replace" set first delete the
+    file's old rows from those targets.
+    """
+    targets = MODE_TARGETS.get(mode)
+    if targets is None:
+        raise ValueError(f"Unknown LOADER_MODE: {mode}")
+    write_raw = "raw" in targets
+    write_shredded = "shredded" in targets
+
+    raw_rows = [
+        {"file_name": r["file_name"], "json_body": r["json_body"], "load_timestamp": r["load_timestamp"]}
+        for r in rows
+    ] if write_raw else []
+    shredded = {}
+    if write_shredded:
+        shredded = {table: [] for table in SHRED_TABLES}
+        for r in rows:
+            shred_matches(json.loads(r["json_body"]), r["file_name"], shredded, is_indented(r["json_body"]))
+    replaced = [{"file_name": r["file_name"]} for r in rows if r.get("replace")]
+    manifest_rows = [
+        {
+            "blob_name": r["file_name"],
+            "target": target,
+            "etag": r["etag"],
+            "last_modified": r.get("last_modified"),
+            "loaded_at": r["load_timestamp"],
+        }
+        for r in rows
+        if r.get("etag")
+        for target in targets
+    ]
 
     attempt = 1
     while True:
         try:
             with engine.begin() as conn:
-                conn.execute(insert_sql, [row])
+                if replaced and write_raw:
+                    conn.execute(DELETE_RAW_FILE_SQL, replaced)
+                if raw_rows:
+                    conn.execute(INSERT_RAW_FILE_SQL, raw_rows)
+                for table, table_rows in shredded.items():
+                    if replaced:
+                        conn.execute(DELETE_SHRED_SQL[table], replaced)
+                    if table_rows:
+                        conn.execute(INSERT_SHRED_SQL[table], table_rows)
+                if manifest_rows:
+                    conn.execute(
+                        DELETE_MANIFEST_SQL,
+                        [{"blob_name": r["blob_name"], "target": r["target"]} for r in manifest_rows],
+                    )
+                    conn.execute(INSERT_MANIFEST_SQL, manifest_rows)
             # success -> break out
             break
 
@@ -119,14 +336,27 @@ def insert_raw_file_row(file_name: str, json_text: str, max_retries: int = 3, re
                 # re-raise after final attempt so your outer try/except can log it
                 raise
 
-            print(
-                f"OperationalError inserting {file_name} (attempt {attempt}/{max_retries}): {e}. "
+            logger.warning(
+                f"OperationalError inserting {len(rows)} file(s) (attempt {attempt}/{max_retries}): {e}. "
                 f"Retrying in {retry_delay} seconds..."
             )
             time.sleep(retry_delay)
             attempt += 1
 
 
+def insert_raw_file_row(file_name: str, json_text: str, max_retries: int = 3, retry_delay: int = 5):
+    """
+    Insert one row into stg.raw_files for a single file, with simple retry logic
+    on transient OperationalError (e.g. network / login timeouts).
+    """
+    row = {
+        "file_name": file_name,
+        "json_body": json_text,
+        "load_timestamp": datetime.utcnow(),
+    }
+    insert_raw_file_rows([row], max_retries=max_retries, retry_delay=retry_delay)
+
+
 def process_blob(container_name: str, blob_name: str):
     """
     Process a single blob:
@@ -141,18 +371,121 @@ def process_blob(container_name: str, blob_name: str):
     print(f"Inserted file {blob_name} into stg.raw_files.")
 
 
+def download_raw_file_row(container_name: str, blob):
+    """
+    Download one blob and shape it as a stg.raw_files row. `blob` is a name, or
+    a listing dict from list_match_blobs (whose etag then goes to the manifest).
+    """
+    if isinstance(blob, str):
+        blob = {"name": blob}
+    return raw_file_row(blob, download_blob_text(container_name, blob["name"]))
+
+
+def raw_file_row(blob, json_text: str):
+    """A stg.raw_files row (plus manifest fields) for a downloaded blob."""
+    return {
+        "file_name": blob["name"],
+        "json_body": json_text,
+        "load_timestamp": datetime.utcnow(),
+        "etag": blob.get("etag"),
+        "last_modified": blob.get("last_modified"),
+        "replace": blob.get("replace", False),
+    }
+
+
+def load_blobs(container_name: str, blobs, max_workers: int = LOADER_MAX_WORKERS,
+               batch_size: int = LOADER_BATCH_SIZE):
+    """
+    Pipelined load: up to `max_workers` + `batch_size` blobs are downloading
+    at once on the blob source's event loop while completed downloads are
+    inserted in batches of `batch_size`, one transaction per batch. At most a
+    couple of batches are held in memory.
+
+    `blobs` are names or list_match_blobs dicts.
+    Returns (files_loaded, bytes_loaded, failed_blob_names).
+    """
+    blobs = list(blobs)
+    window = max_workers + batch_size
+    pending_blobs = iter(blobs)
+    in_flight = {}
+    batch = []
+    loaded_files = 0
+    loaded_bytes = 0
+    failed = []
+
+    def flush():
+        nonlocal batch, loaded_files, loaded_bytes
+        if not batch:
+            return
+        try:
+            insert_raw_file_rows(batch, mode=LOADER_MODE)
+            loaded_files += len(batch)
+            loaded_bytes += sum(len(row["json_body"].encode("utf-8")) for row in batch)
+            logger.info(f"Loaded {len(batch)} file(s) into {LOADER_MODE} staging ({loaded_files}/{len(blobs)})")
+        except Exception as e:
+            logger.exception(f"Error inserting batch of {len(batch)} file(s): {e}")
+            failed.extend(row["file_name"] for row in batch)
+        batch = []
+
+    while True:
+        # Keep the download window full
+        for blob in pending_blobs:
+            blob = {"name": blob} if isinstance(blob, str) else blob
+            in_flight[blob_store(container_name).get_future(blob["name"])] = blob
+            if len(in_flight) >= window:
+                break
+        if not in_flight:
+            break
+
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            blob = in_flight.pop(future)
+            try:
+                data, _etag = future.result()
+                batch.append(raw_file_row(blob, decode_match_file(blob["name"], data)))
+            except Exception as e:
+                logger.exception(f"Error downloading {blob['name']}: {e}")
+                failed.append(blob["name"])
+            if len(batch) >= batch_size:
+                flush()
+    flush()
+
+    return loaded_files, loaded_bytes, failed
+
+
 def main():
     container = os.getenv("ADLS_CONTAINER", "raw")
     prefix = os.getenv("ADLS_PREFIX", "2025_2026")  # default for local testing
 
-    blobs = list_json_blobs(container, prefix)
+    blobs = list_match_blobs(container, prefix)
     logger.info(f"Found {len(blobs)} JSON file(s) under '{prefix}'")
 
-    for blob_name in blobs:
-        try:
-            process_blob(container, blob_name)
-        except Exception as e:
-            logger.exception(f"Error processing {blob_name}: {e}")
+    # Only blob versions not already in the mode's staging targets are downloaded
+    ensure_manifest_table()
+    if LOADER_MODE in ("shredded", "both"):
+        ensure_shredded_tables()
+    new, changed, unchanged = plan_blobs(blobs, load_manifest(), LOADER_MODE)
+    logger.info(
+        f"Manifest: {len(new)} new, {len(changed)} changed, "
+        f"{len(unchanged)} unchanged file(s) skipped"
+    )
+    for blob in unchanged:
+        logger.debug(f"Skipped (already loaded): {blob['name']}")
+    for blob in changed:
+        logger.info(f"Reloading changed file: {blob['name']}")
+        blob["replace"] = True
+
+    started = time.perf_counter()
+    files, size, failed = load_blobs(container, new + changed)
+    elapsed = time.perf_counter() - started or 1e-9
+
+    logger.info(
+        f"Loaded {files} file(s), {size / 1024 ** 2:.1f} MB in {elapsed:.1f}s "
+        f"({files / elapsed:.1f} files/sec, {size / 1024 ** 2 / elapsed:.2f} MB/sec); "
+        f"{len(failed)} failed, {len(unchanged)} skipped"
+    )
+    for blob_name in failed:
+        logger.error(f"Not loaded: {blob_name}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,266 @@
+"""
+Shreds match JSON (as written by the extractor) into flat, typed rows for the
+stg.shred_* staging tables. See sql/shredded_staging.sql for the DDL.
+
+Pure Python with no database or storage imports, so it can be reused outside
+the loader. The conversions mirror what stg_match_results.sql and
+stg_players.sql do with OPENJSON, so dbt gets the same values either way.
+"""
+import gzip
+import json
+from datetime import datetime
+
+# Match output formats written by the extractor (see core_function/match_output.py)
+MATCH_FILE_SUFFIXES = (".json", ".ndjson", ".json.gz", ".ndjson.gz")
+
+# table -> column order used for the INSERT statements
+SHRED_TABLES = {
+    "stg.shred_match": (
+        "file_name", "match_id", "league_name", "played_on", "played_on_text",
+        "venue", "attendance", "was_game_postponed",
+    ),
+    "stg.shred_team_line": (
+        "file_name", "match_id", "playing_as", "team_name", "manager",
+        "formation", "score", "possession",
+    ),
+    "stg.shred_player_appearance": (
+        "file_name", "match_id", "playing_as", "team_name", "player_name",
+        "shirt_number", "shirt_number_int", "started_game", "was_substituted",
+        "was_introduced", "is_captain", "replaced_by", "substitution_time",
+        "yellow_cards", "yellow_card_minutes", "red_cards", "red_card_minutes",
+        "goals_count", "goals_array", "assists_count", "assists_array",
+        "minutes_played", "player_status",
+    ),
+    "stg.shred_goal_event": (
+        "file_name", "match_id", "playing_as", "team_name", "player_name",
+        "event_index", "time_text", "goal_type", "credited_team_side",
+    ),
+    "stg.shred_assist": (
+        "file_name", "match_id", "playing_as", "team_name", "player_name",
+        "event_index", "time_text",
+    ),
+    "stg.shred_card": (
+        "file_name", "match_id", "playing_as", "team_name", "player_name",
+        "card_type", "event_index", "time_text",
+    ),
+}
+
+
+def decode_match_file(blob_name: str, data: bytes) -> str:
+    """
+    Turn a match output file into the JSON array text stored in stg.raw_files.
+
+    Gzipped files are decompressed and NDJSON is rewrapped as an array, so the
+    dbt OPENJSON models see the same shape whatever format was written.
+    """
+    if blob_name.endswith(".gz"):
+        data = gzip.decompress(data)
+        blob_name = blob_name[:-len(".gz")]
+    text = data.decode("utf-8")
+    if blob_name.endswith(".ndjson"):
+        lines = [line for line in text.splitlines() if line.strip()]
+        text = "[" + ",".join(lines) + "]"
+    return text
+
+
+def is_indented(text: str) -> bool:
+    """True for the indented "json" output format (see core_function/match_output.py)."""
+    return text[:2] == "[\n"
+
+
+SIDES = (("home", "home_team"), ("away", "away_team"))
+
+# GOALS_ARRAY in stg_players.sql is STRING_AGG(CONVERT(nvarchar(100), j.value), ',')
+# over OPENJSON(player.value, '$.Goals'): each goal object's JSON text as it
+# appears in the file, cut at 100 characters. In indented files goal objects
+# sit six levels deep (file array, match, team, players, player, Goals).
+GOAL_JSON_DEPTH = 6
+GOAL_JSON_MAX_LENGTH = 100
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value):
+    if value is None:
+        return None
+    try:
+        return int(str(value).replace(",", ""))
+    except ValueError:
+        return None
+
+
+def _to_bit(value):
+    # TRY_CAST(JSON_VALUE(...) AS bit): JSON booleans only, anything else is NULL
+    return value if isinstance(value, bool) else None
+
+
+def _to_text(value):
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _played_on(text):
+    # "Sat 1 Feb 2025" -> date(2025, 2, 1), as TRY_CONVERT(date, SUBSTRING(x, 5, 11), 106)
+    if not text:
+        return None
+    try:
+        return datetime.strptime(text[4:15].strip(), "%d %b %Y").date()
+    except ValueError:
+        return None
+
+
+def _possession(text):
+    value = _to_float(text.replace("%", "")) if isinstance(text, str) else None
+    return value / 100.0 if value is not None else None
+
+
+def _goal_json(goal, indented):
+    if isinstance(goal, (dict, list)):
+        if indented:
+            text = json.dumps(goal, indent=2, ensure_ascii=False).replace("\n", "\n" + "  " * GOAL_JSON_DEPTH)
+        else:
+            text = json.dumps(goal, ensure_ascii=False, separators=(",", ":"))
+    else:
+        text = _to_text(goal)
+    return text[:GOAL_JSON_MAX_LENGTH] if text is not None else None
+
+
+def _joined(values):
+    values = [v for v in values if v is not None]
+    return ",".join(values) if values else None
+
+
+def player_status(started, substituted, introduced):
+    if started is True and substituted is False:
+        return "Played Full Game"
+    if started is True and substituted is True:
+        return "Played Subbed Off"
+    if started is False and introduced is True and substituted is True:
+        return "Played Subbed On and Subbed Off"
+    if started is False and introduced is True and substituted is False:
+        return "Played Subbed On"
+    if started is False and introduced is False:
+        return "Did Not Play"
+    return "Unknown Status"
+
+
+def shred_match(match, file_name=None, tables=None, indented=False):
+    """
+    Appends the rows for one match dict to `tables` ({table: [row dicts]})
+    and returns it. A new dict is created when `tables` is None. `indented`
+    says whether the source file was indented (see is_indented), which
+    goals_array reproduces.
+    """
+    if tables is None:
+        tables = {table: [] for table in SHRED_TABLES}
+    match_id = _to_text(match.get("match_id"))
+    base = {"file_name": file_name, "match_id": match_id}
+
+    scores = []
+    for side, key in SIDES:
+        team = match.get(key)
+        if not isinstance(team, dict):
+            continue
+        team_name = _to_text(team.get("name"))
+        score = _to_float(team.get("score"))
+        scores.append(score)
+        tables["stg.shred_team_line"].append({
+            **base,
+            "playing_as": side,
+            "team_name": team_name,
+            "manager": _to_text(team.get("manager")),
+            "formation": _to_text(team.get("formation")),
+            "score": score,
+            "possession": _possession(team.get("possession")),
+        })
+
+        players = team.get("players")
+        if isinstance(players, dict):
+            for player_name, player in players.items():
+                _shred_player(
+                    tables, {**base, "playing_as": side, "team_name": team_name}, player_name, player, indented
+                )
+
+    played_on_text = _to_text(match.get("played_on"))
+    tables["stg.shred_match"].append({
+        **base,
+        "league_name": _to_text(match.get("League_Name")),
+        "played_on": _played_on(played_on_text),
+        "played_on_text": played_on_text,
+        "venue": _to_text(match.get("venue")),
+        "attendance": _to_int(match.get("attendance")),
+        "was_game_postponed": any(score is None for score in scores),
+    })
+    return tables
+
+
+def _shred_player(tables, team_base, player_name, player, indented=False):
+    if not isinstance(player, dict):
+        return
+    base = {**team_base, "player_name": player_name}
+    goals = player.get("Goals") or []
+    assists = player.get("Assists") or []
+    yellow = player.get("YellowCardMinutes") or []
+    red = player.get("RedCardMinutes") or []
+
+    started = _to_bit(player.get("WasStarter"))
+    substituted = _to_bit(player.get("WasSubstituted"))
+    introduced = _to_bit(player.get("WasIntroduced"))
+    shirt_number = _to_text(player.get("ShirtNumber"))
+
+    tables["stg.shred_player_appearance"].append({
+        **base,
+        "shirt_number": shirt_number,
+        "shirt_number_int": _to_int(shirt_number),
+        "started_game": started,
+        "was_substituted": substituted,
+        "was_introduced": introduced,
+        "is_captain": _to_bit(player.get("is_captain")),
+        "replaced_by": _to_text(player.get("ReplacedBy")),
+        "substitution_time": _to_text(player.get("SubstitutionTime")),
+        "yellow_cards": _to_int(player.get("YellowCards")),
+        "yellow_card_minutes": _joined(_to_text(m) for m in yellow),
+        "red_cards": _to_float(player.get("RedCards")),
+        "red_card_minutes": _joined(_to_text(m) for m in red),
+        "goals_count": len(goals),
+        "goals_array": _joined(_goal_json(g, indented) for g in goals),
+        "assists_count": len(assists),
+        "assists_array": _joined(_to_text(a) for a in assists),
+        "minutes_played": _to_float(player.get("MinutesPlayed")),
+        "player_status": player_status(started, substituted, introduced),
+    })
+
+    for index, goal in enumerate(goals):
+        goal = goal if isinstance(goal, dict) else {"time_text": _to_text(goal)}
+        tables["stg.shred_goal_event"].append({
+            **base,
+            "event_index": index,
+            "time_text": _to_text(goal.get("time_text")),
+            "goal_type": _to_text(goal.get("type")),
+            "credited_team_side": _to_text(goal.get("credited_team_side")),
+        })
+    for index, assist in enumerate(assists):
+        tables["stg.shred_assist"].append({**base, "event_index": index, "time_text": _to_text(assist)})
+    for card_type, minutes in (("yellow", yellow), ("red", red)):
+        for index, minute in enumerate(minutes):
+            tables["stg.shred_card"].append({
+                **base, "card_type": card_type, "event_index": index, "time_text": _to_text(minute),
+            })
+
+
+def shred_matches(matches, file_name=None, tables=None, indented=False):
+    """Shreds a list of match dicts (one output file) into `tables`."""
+    if tables is None:
+        tables = {table: [] for table in SHRED_TABLES}
+    for match in matches:
+        if isinstance(match, dict):
+            shred_match(match, file_name, tables, indented)
+    return tables
@@ -0,0 +1,95 @@
+-- Typed staging tables written by raw_json_loader.py when LOADER_MODE is
+-- "shredded" or "both" (see loader/shred.py). Every row carries the source
+-- blob's file_name so a changed blob's rows can be replaced.
+
+IF OBJECT_ID('stg.shred_match', 'U') IS NULL
+CREATE TABLE stg.shred_match (
+    file_name           NVARCHAR(1024) NOT NULL,
+    match_id            NVARCHAR(64)   NULL,
+    league_name         NVARCHAR(200)  NULL,
+    played_on           DATE           NULL,
+    played_on_text      NVARCHAR(50)   NULL,
+    venue               NVARCHAR(200)  NULL,
+    attendance          INT            NULL,
+    was_game_postponed  BIT            NOT NULL
+);
+
+IF OBJECT_ID('stg.shred_team_line', 'U') IS NULL
+CREATE TABLE stg.shred_team_line (
+    file_name   NVARCHAR(1024) NOT NULL,
+    match_id    NVARCHAR(64)   NULL,
+    playing_as  NVARCHAR(4)    NOT NULL,
+    team_name   NVARCHAR(200)  NULL,
+    manager     NVARCHAR(200)  NULL,
+    formation   NVARCHAR(50)   NULL,
+    score       FLOAT          NULL,
+    possession  FLOAT          NULL
+);
+
+IF OBJECT_ID('stg.shred_player_appearance', 'U') IS NULL
+CREATE TABLE stg.shred_player_appearance (
+    file_name            NVARCHAR(1024) NOT NULL,
+    match_id             NVARCHAR(64)   NULL,
+    playing_as           NVARCHAR(4)    NOT NULL,
+    team_name            NVARCHAR(200)  NULL,
+    player_name          NVARCHAR(200)  NOT NULL,
+    shirt_number         NVARCHAR(20)   NULL,
+    shirt_number_int     INT            NULL,
+    started_game         BIT            NULL,
+    was_substituted      BIT            NULL,
+    was_introduced       BIT            NULL,
+    is_captain           BIT            NULL,
+    replaced_by          NVARCHAR(200)  NULL,
+    substitution_time    NVARCHAR(20)   NULL,
+    yellow_cards         INT            NULL,
+    yellow_card_minutes  NVARCHAR(400)  NULL,
+    red_cards            FLOAT          NULL,
+    red_card_minutes     NVARCHAR(400)  NULL,
+    goals_count          INT            NOT NULL,
+    goals_array          NVARCHAR(MAX)  NULL,
+    assists_count        INT            NOT NULL,
+    assists_array        NVARCHAR(400)  NULL,
+    minutes_played       FLOAT          NULL,
+    player_status        NVARCHAR(40)   NOT NULL
+);
+
+IF OBJECT_ID('stg.shred_goal_event', 'U') IS NULL
+CREATE TABLE stg.shred_goal_event (
+    file_name           NVARCHAR(1024) NOT NULL,
+    match_id            NVARCHAR(64)   NULL,
+    playing_as          NVARCHAR(4)    NOT NULL,
+    team_name           NVARCHAR(200)  NULL,
+    player_name         NVARCHAR(200)  NOT NULL,
+    event_index         INT            NOT NULL,
+    time_text           NVARCHAR(20)   NULL,
+    goal_type           NVARCHAR(20)   NULL,
+    credited_team_side  NVARCHAR(4)    NULL
+);
+
+IF OBJECT_ID('stg.shred_assist', 'U') IS NULL
+CREATE TABLE stg.shred_assist (
+    file_name    NVARCHAR(1024) NOT NULL,
+    match_id     NVARCHAR(64)   NULL,
+    playing_as   NVARCHAR(4)    NOT NULL,
+    team_name    NVARCHAR(200)  NULL,
+    player_name  NVARCHAR(200)  NOT NULL,
+    event_index  INT            NOT NULL,
+    time_text    NVARCHAR(20)   NULL
+);
+
+IF OBJECT_ID('stg.shred_card', 'U') IS NULL
+CREATE TABLE stg.shred_card (
+    file_name    NVARCHAR(1024) NOT NULL,
+    match_id     NVARCHAR(64)   NULL,
+    playing_as   NVARCHAR(4)    NOT NULL,
+    team_name    NVARCHAR(200)  NULL,
+    player_name  NVARCHAR(200)  NOT NULL,
+    card_type    NVARCHAR(6)    NOT NULL,
+    event_index  INT            NOT NULL,
+    time_text    NVARCHAR(20)   NULL
+);
+
+-- goals_array holds whole goal objects, like GOALS_ARRAY on the OPENJSON path;
+-- widen it on tables created when it held only the goal times
+IF COL_LENGTH('stg.shred_player_appearance', 'goals_array') <> -1
+ALTER TABLE stg.shred_player_appearance ALTER COLUMN goals_array NVARCHAR(MAX) NULL;